@@ -0,0 +1,195 @@
+from pathlib import Path
+from typing import Any
+import hashlib
+import json
+import os
+import uuid
+
+from app.ai.pipeline import generation_settings
+from app.database import AI_DATA
+
+
+def generate_key(params: dict[str, Any]) -> str:
+    """
+    Возвращает ключ результата генерации.
+
+    Ключ зависит от всех параметров задачи (описание, режим и seed), 
+    числа шагов и размера изображения для режима, а также от модели и 
+    адаптера, поэтому смена модели или настроек не отдает старые 
+    изображения. Кэшируются только задачи с seed (см. is_cacheable): 
+    без seed каждый запрос должен давать новое изображение.
+
+    Args:
+        params: параметры задачи генерации.
+
+    Returns:
+        Хэш sha256 в шестнадцатеричном виде.
+    """
+
+    data = {
+        **generation_settings(params.get("mode")),
+        **params,
+        "model": AI_DATA["model"],
+        "adapter": AI_DATA["lora_path"],
+    }
+    encoded = json.dumps(data, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(f"generate:{encoded}".encode()).hexdigest()
+
+
+def is_cacheable(params: dict[str, Any]) -> bool:
+    """
+    Проверяет, можно ли взять результат генерации из кэша.
+
+    Args:
+        params: параметры задачи генерации.
+
+    Returns:
+        True - если задан seed, то есть результат повторяем.
+    """
+
+    return params.get("seed") is not None
+
+
+def image_key(image: bytes) -> str:
+    """
+    Возвращает ключ результата удаления фона.
+
+    Args:
+        image: содержимое исходного изображения.
+
+    Returns:
+        Хэш sha256 в шестнадцатеричном виде.
+    """
+
+    return hashlib.sha256(b"remove_bg:" + image).hexdigest()
+
+
+class ResultCache:
+    """
+    Кэш готовых изображений на диске.
+
+    Каждый результат хранится в отдельном файле с именем по ключу,
+    поэтому кэш общий для веб-процессов и процесса app.ai.worker и
+    сохраняется после перезапуска. Время изменения файла обновляется
+    при каждом чтении: когда общий размер превышает max_bytes,
+    удаляются файлы, которые дольше всего не читались (LRU).
+
+    Счетчики metrics ведутся отдельно в каждом процессе.
+    """
+
+    def __init__(self, directory: str | Path, max_bytes: int):
+        """
+        Args:
+            directory: папка кэша.
+            max_bytes: максимальный общий размер файлов. 0 - кэш выключен.
+        """
+
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.metrics = {"hits": 0, "misses": 0, "evictions": 0}
+        self._size: int | None = None
+
+    @property
+    def enabled(self) -> bool:
+        """True - если кэш включен."""
+
+        return self.max_bytes > 0
+
+    def _path(self, key: str) -> Path:
+        """Возвращает путь к файлу результата."""
+
+        return self.directory / f"{key}.png"
+
+    def get(self, key: str) -> bytes | None:
+        """
+        Возвращает результат из кэша.
+
+        Args:
+            key: ключ результата.
+
+        Returns:
+            Содержимое PNG или None, если результата нет.
+        """
+
+        if not self.enabled:
+            return None
+
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            self.metrics["misses"] += 1
+            return None
+
+        self.metrics["hits"] += 1
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """
+        Сохраняет результат и при необходимости удаляет старые.
+
+        Файл записывается во временный и переименовывается, поэтому
+        другой процесс не прочитает его частично.
+
+        Args:
+            key: ключ результата.
+            data: содержимое PNG.
+        """
+
+        if not self.enabled or len(data) > self.max_bytes:
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        temp = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        temp.write_bytes(data)
+        os.replace(temp, path)
+
+        if self._size is None:
+            self._size = sum(size for _, _, size in self._entries())
+        else:
+            self._size += len(data)
+
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _entries(self) -> list[tuple[float, Path, int]]:
+        """Возвращает файлы кэша со временем изменения и размером."""
+
+        entries = []
+        for path in self.directory.glob("*.png"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, path, stat.st_size))
+
+        return entries
+
+    def _evict(self) -> None:
+        """Удаляет самые давно прочитанные файлы, пока кэш не уменьшится."""
+
+        entries = sorted(self._entries())
+        size = sum(entry_size for _, _, entry_size in entries)
+        for _, path, entry_size in entries:
+            if size <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            size -= entry_size
+            self.metrics["evictions"] += 1
+
+        self._size = size
+
+    def clear(self) -> None:
+        """Удаляет все результаты."""
+
+        for _, path, _ in self._entries():
+            path.unlink(missing_ok=True)
+        self._size = 0
+
+
+result_cache = ResultCache(
+    AI_DATA["cache_dir"],
+    AI_DATA["cache_max_mb"] * 1024 * 1024,
+)
@@ -0,0 +1,440 @@
+from PIL import Image
+
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterator
+import hashlib
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+
+from app.database import AI_DATA
+
+
+@dataclass(frozen=True)
+class CpuProfile:
+    """
+    Настройки генерации на CPU.
+
+    Применяются, только если CUDA недоступна.
+    """
+
+    threads: int = 0
+    interop_threads: int = 0
+    channels_last: bool = False
+    bf16: bool = False
+    attention_slicing: bool = False
+
+
+def bf16_supported() -> bool:
+    """True - если процессор выполняет bfloat16 через oneDNN."""
+
+    import torch
+
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+
+class LazyPipeline:
+    """
+    Пайплайн Stable Diffusion, который загружается при первом обращении.
+
+    torch, diffusers и peft импортируются только при загрузке, поэтому
+    процесс, который не генерирует изображения, не тратит время и память
+    на модель. Загрузка выполняется один раз, даже если первые запросы
+    пришли одновременно из нескольких потоков.
+
+    Если fuse_lora включен, LoRA-адаптер объединяется с весами UNet
+    (merge_and_unload), и шаги генерации не выполняют дополнительные 
+    умножения адаптера. Объединенный UNet сохраняется в fused_dir в 
+    формате safetensors, при следующих запусках загружается он, а 
+    базовый UNet и адаптер не загружаются.
+
+    На CPU применяется cpu_profile: число потоков torch, формат памяти
+    channels_last для UNet и VAE, attention slicing и, если процессор
+    поддерживает, вычисления в bfloat16 (autocast в run_pipe).
+    """
+
+    def __init__(
+        self,
+        model: str,
+        lora_path: str,
+        fuse_lora: bool = False,
+        fused_dir: str | None = None,
+        cpu_profile: CpuProfile | None = None,
+    ):
+        """
+        Args:
+            model: название или путь модели Stable Diffusion.
+            lora_path: путь к LoRA-адаптеру UNet.
+            fuse_lora: объединять ли адаптер с весами UNet.
+            fused_dir: папка для объединенных UNet. None - не сохранять.
+            cpu_profile: настройки генерации на CPU.
+        """
+
+        self.model = model
+        self.lora_path = lora_path
+        self.fuse_lora = fuse_lora
+        self.fused_dir = Path(fused_dir) if fused_dir else None
+        self.cpu_profile = cpu_profile or CpuProfile()
+        self.autocast_bf16 = False
+        self.load_seconds: float | None = None
+        self._pipe: Any = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        """True - если модель уже загружена."""
+
+        return self._pipe is not None
+
+    def fused_unet_path(self) -> Path | None:
+        """
+        Возвращает папку объединенного UNet для текущих модели и адаптера.
+
+        Имя папки - хэш названия модели и файлов адаптера, поэтому 
+        при замене адаптера UNet объединяется заново.
+
+        Returns:
+            Путь к папке или None, если сохранение выключено.
+        """
+
+        if self.fused_dir is None:
+            return None
+
+        digest = hashlib.sha256(self.model.encode())
+        for name in ("adapter_config.json", "adapter_model.safetensors"):
+            digest.update((Path(self.lora_path) / name).read_bytes())
+
+        return self.fused_dir / digest.hexdigest()[:32]
+
+    @staticmethod
+    def save_unet(unet: Any, path: Path) -> None:
+        """
+        Сохраняет UNet в формате safetensors.
+
+        UNet записывается во временную папку, которая затем
+        переименовывается, поэтому прерванное сохранение не оставляет
+        неполную папку.
+
+        Args:
+            unet: модель UNet2DConditionModel.
+            path: папка для сохранения.
+        """
+
+        temp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        unet.save_pretrained(temp, safe_serialization=True)
+        try:
+            os.replace(temp, path)
+        except OSError:
+            # Другой процесс уже сохранил тот же UNet.
+            shutil.rmtree(temp, ignore_errors=True)
+
+    def _load(self) -> Any:
+        """Загружает модель, адаптер и планировщик."""
+
+        import torch
+        from diffusers import StableDiffusionPipeline
+        from diffusers import DPMSolverMultistepScheduler
+        from diffusers import UNet2DConditionModel
+        from peft import PeftModel
+
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        dtype = torch.float16 if device == "cuda" else torch.float32
+
+        fused_path = self.fused_unet_path() if self.fuse_lora else None
+        if fused_path is not None and fused_path.exists():
+            unet = UNet2DConditionModel.from_pretrained(
+                fused_path, torch_dtype=dtype
+            )
+            pipe = StableDiffusionPipeline.from_pretrained(
+                self.model, unet=unet, torch_dtype=dtype
+            ).to(device)
+        else:
+            pipe = StableDiffusionPipeline.from_pretrained(
+                self.model,
+                torch_dtype=dtype
+            ).to(device)
+
+            pipe.unet = PeftModel.from_pretrained(pipe.unet, self.lora_path)
+
+            if self.fuse_lora:
+                pipe.unet = pipe.unet.merge_and_unload()
+                if fused_path is not None:
+                    fused_path.parent.mkdir(parents=True, exist_ok=True)
+                    self.save_unet(pipe.unet, fused_path)
+
+        pipe.scheduler = DPMSolverMultistepScheduler.from_config(
+            pipe.scheduler.config
+        )
+
+        if device == "cpu":
+            self._apply_cpu_profile(pipe)
+
+        return pipe
+
+    def _apply_cpu_profile(self, pipe: Any) -> None:
+        """Применяет настройки генерации на CPU."""
+
+        import torch
+
+        profile = self.cpu_profile
+        if profile.threads:
+            torch.set_num_threads(profile.threads)
+        if profile.interop_threads:
+            try:
+                torch.set_num_interop_threads(profile.interop_threads)
+            except RuntimeError:
+                # Потоки уже запущены, число менять поздно.
+                pass
+
+        if profile.channels_last:
+            pipe.unet.to(memory_format=torch.channels_last)
+            pipe.vae.to(memory_format=torch.channels_last)
+
+        if profile.attention_slicing:
+            pipe.enable_attention_slicing()
+
+        self.autocast_bf16 = profile.bf16 and bf16_supported()
+
+    def get(self) -> Any:
+        """
+        Возвращает пайплайн, при необходимости загружая его.
+
+        Returns:
+            Объект StableDiffusionPipeline.
+        """
+
+        if self._pipe is None:
+            with self._lock:
+                if self._pipe is None:
+                    start = time.perf_counter()
+                    self._pipe = self._load()
+                    self.load_seconds = time.perf_counter() - start
+
+        return self._pipe
+
+
+pipeline = LazyPipeline(
+    AI_DATA["model"],
+    AI_DATA["lora_path"],
+    AI_DATA["lora_fuse"],
+    AI_DATA["fused_unet_dir"],
+    CpuProfile(
+        AI_DATA["torch_threads"],
+        AI_DATA["torch_interop_threads"],
+        AI_DATA["channels_last"],
+        AI_DATA["bf16"],
+        AI_DATA["attention_slicing"],
+    ),
+)
+
+
+def generation_settings(mode: str | None) -> dict[str, int]:
+    """
+    Возвращает число шагов и размер изображения для режима генерации.
+
+    Значения по умолчанию берутся из AI_STEPS, AI_WIDTH и AI_HEIGHT,
+    для отдельных режимов их можно заменить в AI_MODE_SETTINGS.
+
+    Args:
+        mode: режим генерации.
+
+    Returns:
+        Словарь с ключами steps, width и height.
+    """
+
+    settings = {
+        "steps": AI_DATA["steps"],
+        "width": AI_DATA["width"],
+        "height": AI_DATA["height"],
+    }
+    settings.update(AI_DATA["mode_settings"].get(mode or "", {}))
+    return settings
+
+
+def run_pipe(
+    prompts: list[str],
+    on_step: Callable[[int, int], None] | None = None,
+    settings: dict[str, int] | None = None,
+    seeds: list[int] | None = None,
+) -> list[Image.Image]:
+    """
+    Генерирует изображения по описаниям одним пакетным вызовом модели.
+
+    Args:
+        prompts: описания изображений.
+        on_step: функция, которая вызывается после каждого шага 
+            с номером шага и общим числом шагов. Исключение из нее 
+            прерывает генерацию.
+        settings: число шагов и размер изображения 
+            (см. generation_settings). None - по умолчанию.
+        seeds: seed генератора шума для каждого описания. С одним 
+            seed и теми же настройками получается то же изображение.
+            None - случайный шум.
+
+    Returns:
+        Сгенерированные изображения в порядке описаний.
+    """
+
+    import torch
+
+    pipe = pipeline.get()
+    kwargs = {}
+    if on_step is not None:
+        def callback(pipe: Any, step: int, timestep: Any, tensors: dict) -> dict:
+            on_step(step + 1, pipe.num_timesteps)
+            return tensors
+
+        kwargs["callback_on_step_end"] = callback
+
+    if seeds is not None:
+        # Генератор на CPU дает один и тот же шум на любом устройстве
+        kwargs["generator"] = [
+            torch.Generator("cpu").manual_seed(seed) for seed in seeds
+        ]
+
+    settings = settings or generation_settings(None)
+    autocast = (
+        torch.autocast("cpu", dtype=torch.bfloat16)
+        if pipeline.autocast_bf16 else nullcontext()
+    )
+
+    with torch.inference_mode(), autocast:
+        return pipe(
+            prompt=prompts,
+            num_inference_steps=settings["steps"],
+            width=settings["width"],
+            height=settings["height"],
+            **kwargs,
+        ).images
+
+
+class RembgSessionPool:
+    """
+    Пул сессий rembg.
+
+    Без сессии rembg.remove при каждом вызове заново загружает модель
+    ONNX. Пул создает сессии при первом обращении и переиспользует их.
+    Одновременно выполняется не больше size удалений фона, остальные
+    потоки ждут свободную сессию.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        size: int = 1,
+        intra_threads: int = 0,
+        inter_threads: int = 0,
+    ):
+        """
+        Args:
+            model: название модели rembg, например u2net или isnet-anime.
+            size: максимальное количество сессий.
+            intra_threads: потоков ONNX Runtime внутри операции. 
+                0 - по умолчанию.
+            inter_threads: потоков ONNX Runtime между операциями. 
+                0 - по умолчанию.
+        """
+
+        self.model = model
+        self.size = size
+        self.intra_threads = intra_threads
+        self.inter_threads = inter_threads
+        self.created = 0
+        self.load_seconds: float | None = None
+        self._idle: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _create(self) -> Any:
+        """
+        Создает сессию rembg с настройками потоков.
+
+        Raises:
+            ValueError - если модель неизвестна.
+        """
+
+        import onnxruntime as ort
+        from rembg.sessions import sessions_class
+
+        session_class = next(
+            (sc for sc in sessions_class if sc.name() == self.model), None
+        )
+        if session_class is None:
+            raise ValueError(f"Неизвестная модель rembg: {self.model}")
+
+        options = ort.SessionOptions()
+        if self.intra_threads:
+            options.intra_op_num_threads = self.intra_threads
+        if self.inter_threads:
+            options.inter_op_num_threads = self.inter_threads
+
+        start = time.perf_counter()
+        session = session_class(self.model, options)
+        self.load_seconds = time.perf_counter() - start
+        return session
+
+    @contextmanager
+    def session(self) -> Iterator[Any]:
+        """
+        Выдает свободную сессию и возвращает ее в пул после использования.
+
+        Yields:
+            Сессия rembg.
+        """
+
+        with self._slots:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    self.created += 1
+                try:
+                    session = self._create()
+                except Exception:
+                    with self._lock:
+                        self.created -= 1
+                    raise
+
+            try:
+                yield session
+            finally:
+                self._idle.put(session)
+
+    def preload(self) -> None:
+        """Создает первую сессию, если ее еще нет."""
+
+        with self.session():
+            pass
+
+
+rembg_sessions = RembgSessionPool(
+    AI_DATA["rembg_model"],
+    AI_DATA["rembg_sessions"],
+    AI_DATA["rembg_intra_threads"],
+    AI_DATA["rembg_inter_threads"],
+)
+
+
+def run_remove(input_image: Image.Image) -> Image.Image:
+    """
+    Удаляет фон изображения.
+
+    Args:
+        input_image: исходное изображение.
+
+    Returns:
+        Изображение без фона.
+    """
+
+    from rembg import remove
+
+    with rembg_sessions.session() as session:
+        return remove(input_image, session=session)
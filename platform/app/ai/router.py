@@ -1,81 +1,294 @@
-from fastapi import APIRouter, Request
-from diffusers import StableDiffusionPipeline, DPMSolverMultistepScheduler
-import torch
-import base64
-from peft import PeftModel
-from io import BytesIO
-from rembg import remove
-from PIL import Image
+from fastapi import APIRouter, Request, Depends, HTTPException
+from fastapi.responses import RedirectResponse, StreamingResponse
 
+from typing import AsyncIterator
 import asyncio
+import json
+import time
+
+from app.ai.cache import generate_key, image_key, is_cacheable, result_cache
+from app.constructor.storage import save_upload, upload_path
+from app.dao.dao_models import AiJobsDAO
+from app.database import AI_DATA
+from app.migration.models import AiJob
+from app.users.auth import TokenClaims, get_api_token_claims
 
 router = APIRouter(prefix='/robot', tags=['Robot'])
 
-device = "cuda" if torch.cuda.is_available() else "cpu"
+# Модель загружена только в процессе app.ai.worker. Маршруты ставят
+# задачу в очередь ai_jobs и читают ее состояние из базы данных.
+# Повторные запросы с тем же seed отдаются из кэша результатов без очереди.
+# Готовые изображения сохраняются в папку загрузок пользователя,
+# клиент получает их URL.
+
+FINISHED = ("done", "failed", "cancelled")
+
+
+async def wait_for_job(job_id: int) -> AiJob | None:
+    """
+    Ждет завершения задачи.
+
+    Args:
+        job_id: id задачи.
+
+    Returns:
+        Завершенная задача или None, если время ожидания истекло.
+    """
+
+    deadline = time.monotonic() + AI_DATA["job_timeout"]
+    while time.monotonic() < deadline:
+        job = await AiJobsDAO.find_status(job_id)
+        if job is None or job.status in FINISHED:
+            return job
+        await asyncio.sleep(AI_DATA["poll_interval"])
+
+    return None
+
+
+def job_response(job: AiJob | None) -> dict:
+    """
+    Формирует ответ по завершенной задаче.
+
+    Args:
+        job: задача или None, если время ожидания истекло.
+
+    Returns:
+        URL изображения или ошибка.
+    """
+
+    if job is None:
+        return {"error": "Generation timed out"}
+    if job.status != "done":
+        return {"error": "Generation failed"}
+
+    return {"url": job.result_url}
+
+
+async def find_user_job(job_id: int, claims: TokenClaims) -> AiJob:
+    """
+    Находит задачу пользователя без изображений.
+
+    Args:
+        job_id: id задачи.
+        claims: данные пользователя.
+
+    Returns:
+        Задача.
+
+    Raises:
+        HTTPException - если задачи нет или она чужая.
+    """
+
+    job = await AiJobsDAO.find_status(job_id)
+    if job is None or job.user_id != claims.user_id:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+
+    return job
+
+
+async def job_state(job: AiJob) -> dict:
+    """
+    Формирует описание состояния задачи.
+
+    Args:
+        job: задача.
+
+    Returns:
+        Словарь с состоянием, прогрессом, местом в очереди и URL 
+        готового изображения.
+    """
+
+    state = {
+        "job_id": job.id,
+        "status": job.status,
+        "progress": job.progress,
+        "total_steps": job.total_steps,
+        "position": None,
+        "error": job.error,
+        "url": job.result_url,
+    }
+    if job.status == "queued":
+        state["position"] = await AiJobsDAO.queue_position(job.id)
+
+    return state
+
+
+async def job_events(job_id: int) -> AsyncIterator[str]:
+    """
+    Отправляет состояние задачи в формате Server-Sent Events.
+
+    Событие progress отправляется при каждом изменении состояния,
+    последнее событие называется по итоговому статусу задачи
+    (done, failed или cancelled).
 
-pipe = StableDiffusionPipeline.from_pretrained(
-    "runwayml/stable-diffusion-v1-5",
-    torch_dtype=torch.float16 if device == "cuda" else torch.float32
-).to(device)
+    Args:
+        job_id: id задачи.
+    """
 
-pipe.unet = PeftModel.from_pretrained(
-    pipe.unet,
-    "./app/ai/lora"
-)
+    last = None
+    while True:
+        job = await AiJobsDAO.find_status(job_id)
+        if job is None:
+            return
 
-pipe.scheduler = DPMSolverMultistepScheduler.from_config(pipe.scheduler.config)
-semaphore = asyncio.Semaphore(1)
+        state = await job_state(job)
+        if state != last:
+            event = job.status if job.status in FINISHED else "progress"
+            yield f"event: {event}\ndata: {json.dumps(state)}\n\n"
+            last = state
 
+        if job.status in FINISHED:
+            return
+        await asyncio.sleep(AI_DATA["poll_interval"])
 
-def run_pipe(prompt):
-    with torch.no_grad():
-        return pipe(prompt).images[0]
 
 @router.post("/generate")
-async def generate_image(request: Request) -> dict:
+async def generate_image(
+    request: Request,
+    claims: TokenClaims = Depends(get_api_token_claims),
+) -> dict:
+    """
+    Ставит задачу генерации в очередь и сразу возвращает ее id.
+
+    Прогресс можно получить через /robot/jobs/{id} или поток
+    /robot/jobs/{id}/events, в итоговом состоянии есть URL готового
+    изображения. Необязательный seed (целое от 0 до 2^63 - 1) делает
+    результат повторяемым: если изображение с таким seed уже есть в 
+    кэше, задача сразу создается выполненной. Без seed каждый запрос 
+    дает новое изображение.
+    """
+
     data = await request.json()
 
     prompt = data.get("prompt")
     if not prompt:
         return {"error": "No prompt provided"}
-    
+
     mode = data.get("mode")
     if mode == "background":
         prompt += ", wide landscape, 16:9"
     elif mode == "character":
         prompt += ", character, full body"
 
-    async with semaphore:
-        image = await asyncio.to_thread(run_pipe, prompt)
+    params = {"prompt": prompt, "mode": mode}
+    seed = data.get("seed")
+    if seed is not None:
+        if type(seed) is not int or not 0 <= seed < 2 ** 63:
+            return {"error": "Invalid seed"}
+        params["seed"] = seed
 
-    buffer = BytesIO()
-    image.save(buffer, format="PNG")
+    cached = None
+    if is_cacheable(params):
+        cached = await asyncio.to_thread(result_cache.get, generate_key(params))
+    if cached is not None:
+        url = await save_upload(claims.user_id, cached)
+        job_id = await AiJobsDAO.add_job(
+            "generate", params, user_id=claims.user_id, result_url=url
+        )
+        return {"job_id": job_id, "status": "done", "position": None}
+
+    job_id = await AiJobsDAO.add_job(
+        "generate", params, user_id=claims.user_id
+    )
 
     return {
-        "image": base64.b64encode(buffer.getvalue()).decode()
+        "job_id": job_id,
+        "status": "queued",
+        "position": await AiJobsDAO.queue_position(job_id),
     }
 
 
-def run_remove(input_image):
-    return remove(input_image)
+@router.get("/jobs/{job_id}")
+async def get_job(
+    job_id: int,
+    claims: TokenClaims = Depends(get_api_token_claims),
+) -> dict:
+    """Возвращает состояние задачи."""
+
+    return await job_state(await find_user_job(job_id, claims))
+
+
+@router.get("/jobs/{job_id}/events")
+async def get_job_events(
+    job_id: int,
+    claims: TokenClaims = Depends(get_api_token_claims),
+) -> StreamingResponse:
+    """Передает прогресс задачи потоком Server-Sent Events."""
+
+    await find_user_job(job_id, claims)
+
+    return StreamingResponse(
+        job_events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(
+    job_id: int,
+    claims: TokenClaims = Depends(get_api_token_claims),
+) -> RedirectResponse:
+    """Перенаправляет на готовое изображение в папке загрузок."""
+
+    job = await find_user_job(job_id, claims)
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail="Задача не завершена")
+
+    return RedirectResponse(job.result_url)
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(
+    job_id: int,
+    claims: TokenClaims = Depends(get_api_token_claims),
+) -> dict:
+    """
+    Отменяет задачу. Задача в очереди отменяется сразу, выполняемая -
+    после текущего шага генерации.
+    """
+
+    await find_user_job(job_id, claims)
+
+    status = await AiJobsDAO.cancel_job(job_id)
+    if status is None:
+        raise HTTPException(status_code=409, detail="Задача уже завершена")
+
+    return {"job_id": job_id, "status": status}
+
 
 @router.post("/remove-bg")
-async def remove_bg(request: Request):
+async def remove_bg(
+    request: Request,
+    claims: TokenClaims = Depends(get_api_token_claims),
+):
+    """
+    Удаляет фон изображения, которое пользователь уже загрузил.
+
+    Принимает URL загруженного файла и возвращает URL результата.
+    """
+
     data = await request.json()
 
-    image_base64 = data.get("image")
-    if not image_base64:
+    source_url = data.get("url")
+    if not source_url:
         return {"error": "No image provided"}
 
-    image_bytes = base64.b64decode(image_base64)
-
-    input_image = Image.open(BytesIO(image_bytes)).convert("RGBA")
+    try:
+        path = await upload_path(source_url, claims.user_id)
+    except ValueError:
+        return {"error": "Image not found"}
 
-    output = await asyncio.to_thread(run_remove, input_image)
+    source = await asyncio.to_thread(path.read_bytes)
+    cached = await asyncio.to_thread(result_cache.get, image_key(source))
+    if cached is not None:
+        url = await save_upload(claims.user_id, cached)
+        return {"url": url}
 
-    buffer = BytesIO()
-    output.save(buffer, format="PNG")
+    job_id = await AiJobsDAO.add_job(
+        "remove_bg",
+        {"source": source_url},
+        user_id=claims.user_id,
+    )
 
-    return {
-        "image": base64.b64encode(buffer.getvalue()).decode()
-    }
\ No newline at end of file
+    return job_response(await wait_for_job(job_id))
@@ -0,0 +1,450 @@
+"""
+Процесс, который выполняет задачи генерации изображений и удаления
+фона из очереди ai_jobs. Генерация и удаление фона обрабатываются в
+отдельных циклах, чтобы долгий пакет генерации не задерживал быстрые
+задачи удаления фона.
+
+Модель загружается только в этом процессе, поэтому веб-процессов может
+быть сколько угодно, а копия модели в памяти остается одна.
+
+Запуск из папки platform:
+    python -m app.ai.worker
+"""
+
+from PIL import Image
+from sqlalchemy.exc import SQLAlchemyError
+
+from contextlib import asynccontextmanager
+from io import BytesIO
+from typing import AsyncIterator, Callable
+import asyncio
+import secrets
+import time
+
+from app.ai.cache import generate_key, image_key, is_cacheable, result_cache
+from app.ai.pipeline import generation_settings, pipeline, rembg_sessions
+from app.ai.pipeline import run_pipe, run_remove
+from app.constructor.storage import save_upload, upload_path
+from app.dao.dao_models import AiJobsDAO
+from app.database import AI_DATA, async_engine
+from app.migration.models import AiJob
+from app.polling import PollingWorker
+
+
+def to_png(image: Image.Image) -> bytes:
+    """
+    Кодирует изображение в PNG.
+
+    Args:
+        image: изображение.
+
+    Returns:
+        Содержимое файла PNG.
+    """
+
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class JobCancelled(Exception):
+    """Пользователь отменил все задачи пакета во время выполнения."""
+
+
+def process_batch(
+    jobs: list[AiJob],
+    on_step: Callable[[int, int], None] | None = None,
+) -> list[bytes]:
+    """
+    Выполняет пакет задач генерации одним вызовом модели.
+
+    Число шагов и размер изображения определяются режимом первой 
+    задачи, в пакете все задачи с одним режимом.
+
+    Args:
+        jobs: задачи генерации.
+        on_step: функция, которая получает прогресс генерации.
+
+    Returns:
+        Результаты в формате PNG в порядке задач.
+    """
+
+    # Задачи без seed получают случайный
+    seeds = [job.params.get("seed") for job in jobs]
+    seeds = [secrets.randbits(63) if seed is None else seed for seed in seeds]
+
+    images = run_pipe(
+        [job.params["prompt"] for job in jobs],
+        on_step,
+        generation_settings(jobs[0].params.get("mode")),
+        seeds,
+    )
+    return [to_png(image) for image in images]
+
+
+def remove_background(source: bytes) -> bytes:
+    """
+    Удаляет фон изображения.
+
+    Args:
+        source: содержимое исходного изображения.
+
+    Returns:
+        Результат в формате PNG.
+    """
+
+    input_image = Image.open(BytesIO(source)).convert("RGBA")
+    return to_png(run_remove(input_image))
+
+
+class AiJobWorker(PollingWorker):
+    """
+    Базовый обработчик очереди ai_jobs.
+
+    Обработчиков может быть несколько. Забранные задачи заняты на lease
+    секунд, обработчик продлевает срок, пока выполняет их. Задачи с 
+    истекшим сроком (их обработчик остановился) возвращаются в очередь.
+
+    Готовые изображения сохраняются в папку загрузок пользователя,
+    в задаче остается их URL.
+    """
+
+    # На сколько секунд забранные задачи скрываются от других обработчиков
+    lease = 300
+
+    def __init__(self, poll_interval: float):
+        """
+        Args:
+            poll_interval: интервал опроса очереди в секундах.
+        """
+
+        super().__init__(poll_interval)
+        self._next_requeue = 0.0
+
+    async def _requeue_expired(self) -> None:
+        """
+        Возвращает в очередь задачи с истекшим сроком, не чаще раза 
+        в lease / 3 секунд.
+        """
+
+        if time.monotonic() >= self._next_requeue:
+            await AiJobsDAO.requeue_expired()
+            self._next_requeue = time.monotonic() + self.lease / 3
+
+    async def _extend_leases(self, job_ids: list[int]) -> None:
+        """Продлевает срок задач, пока они выполняются."""
+
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await AiJobsDAO.extend_lease(job_ids, self.lease)
+            except Exception as error:
+                print(f"AI worker lease error: {error!r}")
+
+    @asynccontextmanager
+    async def _leased(self, jobs: list[AiJob]) -> AsyncIterator[None]:
+        """Держит задачи занятыми этим обработчиком внутри контекста."""
+
+        task = asyncio.create_task(
+            self._extend_leases([job.id for job in jobs])
+        )
+        try:
+            yield
+        finally:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _finish(
+        self, 
+        job: AiJob, 
+        result: bytes, 
+        key: str | None = None,
+    ) -> None:
+        """
+        Сохраняет результат в папку загрузок пользователя и отмечает 
+        задачу выполненной.
+
+        Args:
+            job: задача.
+            result: изображение PNG.
+            key: ключ для сохранения в кэш. None - не сохранять.
+        """
+
+        try:
+            url = await save_upload(job.user_id, result)
+        except (OSError, SQLAlchemyError) as error:
+            await AiJobsDAO.fail_job(job.id, repr(error))
+            return
+
+        await AiJobsDAO.finish_job(job.id, url)
+        if key is None:
+            return
+
+        try:
+            await asyncio.to_thread(result_cache.put, key, result)
+        except OSError as error:
+            print(f"AI cache error: {error!r}")
+
+
+class InferenceWorker(AiJobWorker):
+    """
+    Обработчик задач генерации из очереди ai_jobs.
+
+    Задачи с одинаковым режимом собираются в пакет до max_batch задач:
+    если в очереди их меньше, обработчик ждет еще batch_window секунд.
+    Пакет выполняется одним вызовом модели, результаты раздаются по 
+    задачам. Результаты генерации с seed сохраняются в кэш, а задачи, 
+    результат которых уже есть в кэше (например, одинаковые запросы, 
+    поставленные одновременно), завершаются без вызова модели.
+
+    Генерация выполняется в отдельном потоке, чтобы цикл событий
+    продолжал работать с базой данных. После каждого шага прогресс 
+    сохраняется во всех задачах пакета. Отмененные задачи пакета 
+    отмечаются после генерации, а если отменены все - генерация 
+    прерывается.
+    """
+
+    log_name = "AI worker"
+
+    def __init__(
+        self,
+        poll_interval: float = 0.5,
+        max_batch: int = 1,
+        batch_window: float = 0,
+    ):
+        """
+        Args:
+            poll_interval: интервал опроса очереди в секундах.
+            max_batch: максимальное число задач в пакете генерации.
+            batch_window: сколько секунд ждать задачи для неполного пакета.
+        """
+
+        super().__init__(poll_interval)
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+
+    @staticmethod
+    def _progress_callback(
+        job_ids: list[int],
+        cancelled: set[int],
+    ) -> Callable[[int, int], None]:
+        """
+        Создает функцию, которая из потока генерации сохраняет прогресс.
+
+        Args:
+            job_ids: id задач пакета.
+            cancelled: множество, в которое добавляются id отмененных задач.
+
+        Returns:
+            Функция, которая вызывает JobCancelled, если отменены 
+            все задачи пакета.
+        """
+
+        loop = asyncio.get_running_loop()
+
+        def on_step(step: int, total: int) -> None:
+            future = asyncio.run_coroutine_threadsafe(
+                AiJobsDAO.update_progress(job_ids, step, total), 
+                loop,
+            )
+            cancelled.update(future.result())
+            if cancelled >= set(job_ids):
+                raise JobCancelled()
+
+        return on_step
+
+    async def _claim_batch(self) -> list[AiJob]:
+        """Забирает из очереди пакет задач генерации с одним режимом."""
+
+        jobs = await AiJobsDAO.claim_jobs(kind="generate", lease=self.lease)
+        if not jobs or self.max_batch <= 1:
+            return jobs
+
+        same_mode = {"mode": jobs[0].params.get("mode")}
+        jobs += await AiJobsDAO.claim_jobs(
+            self.max_batch - len(jobs), "generate", same_mode, self.lease
+        )
+        if len(jobs) < self.max_batch and self.batch_window > 0:
+            await asyncio.sleep(self.batch_window)
+            jobs += await AiJobsDAO.claim_jobs(
+                self.max_batch - len(jobs), "generate", same_mode, self.lease
+            )
+
+        return jobs
+
+    async def _finish_cached(self, jobs: list[AiJob]) -> list[AiJob]:
+        """
+        Завершает задачи генерации, результат которых есть в кэше.
+
+        Args:
+            jobs: задачи из очереди.
+
+        Returns:
+            Задачи, которые нужно выполнить.
+        """
+
+        remaining = []
+        for job in jobs:
+            if not is_cacheable(job.params):
+                remaining.append(job)
+                continue
+            cached = await asyncio.to_thread(
+                result_cache.get, generate_key(job.params)
+            )
+            if cached is None:
+                remaining.append(job)
+            else:
+                await self._finish(job, cached)
+
+        return remaining
+
+    async def _run_batch(self, jobs: list[AiJob]) -> None:
+        """Выполняет пакет задач генерации и сохраняет результаты."""
+
+        jobs = await self._finish_cached(jobs)
+        if not jobs:
+            return
+
+        job_ids = [job.id for job in jobs]
+        cancelled = set()
+        try:
+            results = await asyncio.to_thread(
+                process_batch, 
+                jobs, 
+                self._progress_callback(job_ids, cancelled),
+            )
+        except JobCancelled:
+            results = [None] * len(jobs)
+        except Exception as error:
+            for job_id in job_ids:
+                await AiJobsDAO.fail_job(job_id, repr(error))
+            return
+
+        for job, result in zip(jobs, results):
+            if job.id in cancelled:
+                await AiJobsDAO.mark_cancelled(job.id)
+            else:
+                key = None
+                if is_cacheable(job.params):
+                    key = generate_key(job.params)
+                await self._finish(job, result, key)
+
+    async def run_once(self) -> int:
+        """
+        Выполняет пакет задач генерации.
+
+        Returns:
+            Количество выполненных задач.
+        """
+
+        await self._requeue_expired()
+
+        jobs = await self._claim_batch()
+        if jobs:
+            async with self._leased(jobs):
+                await self._run_batch(jobs)
+
+        return len(jobs)
+
+    def has_more(self, taken: int) -> bool:
+        """Следующая пачка забирается сразу, если в этой были задачи."""
+
+        return taken > 0
+
+
+class RemoveBgWorker(AiJobWorker):
+    """
+    Обработчик задач удаления фона из очереди ai_jobs.
+
+    Работает в своем цикле рядом с InferenceWorker, чтобы задачи 
+    удаления фона не ждали, пока закончится долгий пакет генерации.
+    Задачи выполняются параллельно, не больше concurrency одновременно,
+    на сессиях rembg, которые не используются генерацией. Результаты 
+    сохраняются в кэш по содержимому исходного изображения.
+    """
+
+    log_name = "AI remove_bg worker"
+
+    def __init__(self, poll_interval: float = 0.5, concurrency: int = 1):
+        """
+        Args:
+            poll_interval: интервал опроса очереди в секундах.
+            concurrency: сколько задач выполнять одновременно.
+        """
+
+        super().__init__(poll_interval)
+        self.concurrency = concurrency
+
+    async def _run_job(self, job: AiJob) -> None:
+        """
+        Выполняет задачу удаления фона и сохраняет результат.
+
+        Исходное изображение читается из папки загрузок пользователя
+        по URL из параметра source.
+        """
+
+        try:
+            path = await upload_path(job.params["source"], job.user_id)
+            source = await asyncio.to_thread(path.read_bytes)
+            key = image_key(source)
+            cached = await asyncio.to_thread(result_cache.get, key)
+            if cached is None:
+                result = await asyncio.to_thread(remove_background, source)
+        except Exception as error:
+            await AiJobsDAO.fail_job(job.id, repr(error))
+            return
+
+        if cached is None:
+            await self._finish(job, result, key)
+        else:
+            await self._finish(job, cached)
+
+    async def run_once(self) -> int:
+        """
+        Выполняет задачи удаления фона.
+
+        Returns:
+            Количество выполненных задач.
+        """
+
+        await self._requeue_expired()
+
+        jobs = await AiJobsDAO.claim_jobs(
+            self.concurrency, kind="remove_bg", lease=self.lease
+        )
+        if jobs:
+            async with self._leased(jobs):
+                await asyncio.gather(*(self._run_job(job) for job in jobs))
+
+        return len(jobs)
+
+    def has_more(self, taken: int) -> bool:
+        """Следующие задачи забираются сразу, если в этот раз были задачи."""
+
+        return taken > 0
+
+
+async def main() -> None:
+    worker = InferenceWorker(
+        AI_DATA["poll_interval"],
+        AI_DATA["max_batch"],
+        AI_DATA["batch_window"],
+    )
+    remove_worker = RemoveBgWorker(
+        AI_DATA["poll_interval"],
+        AI_DATA["rembg_sessions"],
+    )
+    if AI_DATA["preload"]:
+        await asyncio.to_thread(pipeline.get)
+        await asyncio.to_thread(rembg_sessions.preload)
+    try:
+        await asyncio.gather(worker.run(), remove_worker.run())
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,13 +1,23 @@
 # app/utils/cleanup.py
-import os
-import json
-from pathlib import Path
 from sqlalchemy import select
 from app.database import async_session_maker
+from app.dao.dao_models import AssetsDAO, UploadSessionsDAO, utc_now
 from app.migration.models import Novell
+from app.constructor.storage import blob_path, novel_urls, url_path
+from app.constructor.storage import session_path, temp_path
+
+from datetime import timedelta
+from pathlib import Path
+import asyncio
+import os
+from sqlalchemy.engine import Row
 
 UPLOAD_DIR = Path("uploads/novels")
 
+# Сколько хранится файл, загруженный, но не сохраненный ни в одной новелле
+UPLOAD_GRACE = timedelta(days=1)
+
+
 async def cleanup_orphan_files():
     async with async_session_maker() as session:
         # Получаем все проекты
@@ -15,21 +25,10 @@ async def cleanup_orphan_files():
         novels = result.scalars().all()
         used_urls = set()
         for novel in novels:
-            data = novel.data or {}
             # Собираем все URL из data (спрайты, фон, музыка)
-            if "sceneSpritesData" in data:
-                for s in data["sceneSpritesData"]:
-                    if s.get("src"):
-                        used_urls.add(s["src"])
-            if data.get("bgImage"):
-                used_urls.add(data["bgImage"])
-            if data.get("audioFile"):
-                used_urls.add(data["audioFile"])
-            if "dialogData" in data:
-                for d in data["dialogData"]:
-                    for s in d.get("sprites", []):
-                        if s.get("src"):
-                            used_urls.add(s["src"])
+            used_urls |= novel_urls(novel.data or {})
+            if novel.preview:
+                used_urls.add(url_path(novel.preview))
         # Удаляем файлы, которые не в used_urls
         for user_dir in UPLOAD_DIR.iterdir():
             if not user_dir.is_dir():
@@ -38,4 +37,112 @@ async def cleanup_orphan_files():
                 # Строим ожидаемый URL
                 file_url = f"/uploads/novels/{user_dir.name}/{file_path.name}"
                 if file_url not in used_urls:
-                    file_path.unlink()  # удаляем файл
\ No newline at end of file
+                    file_path.unlink()  # удаляем файл
+
+    await cleanup_orphan_blobs()
+    await cleanup_upload_sessions()
+
+
+def hide_blob(sha256: str, ext: str) -> list[tuple[Path, Path]]:
+    """
+    Переносит файл и его копии WebP во временную папку.
+
+    Args:
+        sha256: хэш содержимого файла.
+        ext: расширение файла с точкой.
+
+    Returns:
+        Пары (исходный путь, временный путь) перенесенных файлов.
+    """
+
+    path = blob_path(sha256, ext)
+    # Копии WebP (см. app.constructor.variants)
+    paths = [path, *path.parent.glob(f"{sha256}*.webp")]
+    moved = []
+    for source in paths:
+        hidden = temp_path()
+        try:
+            os.replace(source, hidden)
+        except FileNotFoundError:
+            continue
+        moved.append((source, hidden))
+
+    return moved
+
+
+def finish_blobs(
+    moved: dict[str, list[tuple[Path, Path]]],
+    restore: set[str],
+) -> None:
+    """
+    Удаляет перенесенные файлы, а файлы из restore возвращает на место.
+
+    Args:
+        moved: перенесенные файлы по хэшу (см. hide_blob).
+        restore: хэши файлов, которые загрузили заново.
+    """
+
+    for sha256, paths in moved.items():
+        for source, hidden in paths:
+            if sha256 in restore:
+                os.replace(hidden, source)
+            else:
+                hidden.unlink(missing_ok=True)
+
+
+async def remove_blobs(rows: list[Row]) -> None:
+    """
+    Удаляет с диска файлы, записи о которых удалены из базы данных.
+
+    Записи удаляются раньше файлов, поэтому файл мог быть загружен 
+    заново между фиксацией и удалением. Файлы сначала переносятся во 
+    временную папку, и если запись о файле появилась снова, файл 
+    возвращается на место. Если повторная загрузка успела положить 
+    файл сама, возвращается то же самое содержимое.
+    """
+
+    moved = {}
+    for row in rows:
+        moved[row.sha256] = await asyncio.to_thread(
+            hide_blob, row.sha256, row.ext
+        )
+
+    assets = await AssetsDAO.find_assets(list(moved))
+    restore = {
+        row.sha256 for row in rows
+        if row.sha256 in assets and assets[row.sha256].ext == row.ext
+    }
+    await asyncio.to_thread(finish_blobs, moved, restore)
+
+
+async def cleanup_orphan_blobs() -> int:
+    """
+    Удаляет файлы, на которые не ссылается ни одна новелла и которые
+    не загружались дольше UPLOAD_GRACE.
+
+    Returns:
+        Количество удаленных файлов.
+    """
+
+    rows = await AssetsDAO.delete_unused(utc_now() - UPLOAD_GRACE)
+    await remove_blobs(rows)
+
+    return len(rows)
+
+
+async def cleanup_upload_sessions() -> int:
+    """
+    Удаляет загрузки по частям, начатые раньше, чем UPLOAD_GRACE назад,
+    вместе с полученными данными.
+
+    Returns:
+        Количество удаленных загрузок.
+    """
+
+    session_ids = await UploadSessionsDAO.delete_expired(
+        utc_now() - UPLOAD_GRACE
+    )
+    for session_id in session_ids:
+        session_path(session_id).unlink(missing_ok=True)
+
+    return len(session_ids)
@@ -1,42 +1,108 @@
-from fastapi import APIRouter, Request, status, Query
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi import APIRouter, Request, status, Query, Depends
+from fastapi.responses import JSONResponse
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
-from jose.exceptions import ExpiredSignatureError, JWTError
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.templating import Jinja2Templates
 from fastapi import HTTPException
 
-from app.dao.dao_models import NovelsDAO
+from app.database import get_session
+from app.dao.dao_models import NovelsDAO, AssetsDAO
+from app.constructor.storage import novel_urls, parse_blob_url
+from app.constructor.storage import replace_novel_urls
+from app.constructor.variants import variant_urls
+from app.database import VARIANTS_DATA
 from app.constructor.novell_validation import SNovelSave
-from app.users.auth import decode_access_token
-from app.users.router import redirect_message
+from app.users.auth import TokenClaims, get_token_claims
+
+import base64
+import json
+from datetime import datetime
+from typing import Optional
 
 
 router = APIRouter(prefix='/novels', tags=['Novels'])
 
 
+def encode_cursor(created_at: datetime, novel_id: int) -> str:
+    """
+    Кодирует позицию новеллы в непрозрачный курсор.
+
+    Args:
+        created_at: дата создания новеллы.
+        novel_id: id новеллы.
+
+    Returns:
+        Курсор для передачи клиенту.
+    """
+
+    raw = json.dumps([created_at.isoformat(), novel_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Раскодирует курсор, полученный от клиента.
+
+    Args:
+        cursor: курсор.
+
+    Returns:
+        Дата создания и id последней новеллы предыдущей страницы.
+
+    Raises:
+        ValueError - если курсор поврежден или дата в нем с часовым
+            поясом (created_at в базе хранится без него).
+    """
+
+    try:
+        created_at, novel_id = json.loads(base64.urlsafe_b64decode(cursor))
+        created_at = datetime.fromisoformat(created_at)
+        novel_id = int(novel_id)
+    except (TypeError, ValueError) as error:
+        raise ValueError("Некорректный курсор") from error
+
+    if created_at.tzinfo is not None:
+        raise ValueError("Некорректный курсор")
+
+    return created_at, novel_id
+
+
 @router.post("/add_novel/", response_model=None)
 async def add_novel(
-    request: Request,
-    novel_data: SNovelSave
-) -> JSONResponse | RedirectResponse:
-    """Сохраняет новеллу (проект) в базу данных."""
-    
-    token = request.cookies.get("users_access_token")
-    if not token:
-        return redirect_message(
-            url='/auth/login/',
-            message="Пользователь не авторизован.",
-            error=True
-        )
+    novel_data: SNovelSave,
+    claims: TokenClaims = Depends(get_token_claims),
+    session: AsyncSession = Depends(get_session, scope="function"),
+) -> JSONResponse:
+    """
+    Сохраняет новеллу (проект) в базу данных вместе со ссылками 
+    на используемые в ней загруженные файлы.
+
+    Новелла может ссылаться только на файлы, загруженные ее автором,
+    иначе она не сохраняется (400).
+    """
     
+    urls = novel_urls(novel_data.data)
+    if novel_data.preview:
+        urls.add(novel_data.preview)
+    blobs = [parse_blob_url(url) for url in urls]
+    hashes = {blob[0] for blob in blobs if blob is not None}
     try:
-        user_id = decode_access_token(token)
         novel_id = await NovelsDAO.add_novel(
-            user_id=user_id,
+            user_id=claims.user_id,
             title=novel_data.title,
             data=novel_data.data,
-            preview=novel_data.preview
+            preview=novel_data.preview,
+            session=session,
+        )
+        linked = await AssetsDAO.link_novel(
+            claims.user_id, novel_id, sorted(hashes), session=session
         )
+        if linked != hashes:
+            # Исключение откатывает сессию запроса вместе с новеллой
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Новелла ссылается на чужие или несуществующие файлы",
+            )
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -46,20 +112,6 @@ async def add_novel(
                 "id": novel_id
             }
         )
-        
-    except ExpiredSignatureError:
-        return redirect_message(
-            url='/auth/login/',
-            message="Пользователь не авторизован.",
-            error=True
-        )
-    
-    except JWTError:
-        return redirect_message(
-            url='/auth/login/',
-            message="Пользователь не авторизован.",
-            error=True
-        )
     
     except IntegrityError:
         return JSONResponse(
@@ -76,26 +128,10 @@ async def add_novel(
 @router.get("/by_title/{title}/", response_model=None)
 async def get_novel_by_title(
     title: str,
-    request: Request
+    claims: TokenClaims = Depends(get_token_claims),
+    session: AsyncSession = Depends(get_session, scope="function"),
 ):
-    token = request.cookies.get("users_access_token")
-    if not token:
-        return redirect_message(
-            url='/auth/login/',
-            message="Пользователь не авторизован.",
-            error=True
-        )
-    
-    try:
-        user_id = decode_access_token(token)
-    except (ExpiredSignatureError, JWTError):
-        return redirect_message(
-            url='/auth/login/',
-            message="Ошибка авторизации.",
-            error=True
-        )
-    
-    novel = await NovelsDAO.find_by_title(user_id, title)
+    novel = await NovelsDAO.find_by_title(claims.user_id, title, session)
     if not novel:
         return JSONResponse(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -112,20 +148,57 @@ async def get_novel_by_title(
     })
 
 @router.get("/public/")
-async def get_public_novels(skip: int = 0, limit: int = 6):
-    novels, total = await NovelsDAO.find_paginated_all(skip, limit)
+async def get_public_novels(
+    skip: int = 0, 
+    limit: int = 6,
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_session, scope="function"),
+):
+    """
+    Возвращает страницу публичных новелл.
+
+    Если передан cursor (пустая строка - первая страница), то страница 
+    выбирается по курсору и общее количество не считается. Иначе 
+    используются skip и limit.
+
+    В thumbnail возвращается URL уменьшенной копии превью для карточки,
+    если она уже готова, иначе URL самого превью.
+    """
+
+    if cursor is None:
+        novels, total = await NovelsDAO.find_paginated_all(skip, limit, session)
+    else:
+        try:
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Некорректный курсор")
+        novels = await NovelsDAO.find_page_after(limit, after, session)
+        total = None
+
+    next_cursor = None
+    if novels and len(novels) == limit:
+        next_cursor = encode_cursor(novels[-1].created_at, novels[-1].id)
+
+    thumbnails = await variant_urls(
+        [n.preview for n in novels if n.preview],
+        VARIANTS_DATA["card_width"],
+        session,
+    )
+
     return {
         "items": [
             {
                 "id": n.id,
                 "title": n.title,
-                "preview": n.preview
+                "preview": n.preview,
+                "thumbnail": thumbnails.get(n.preview, n.preview),
             }
             for n in novels
         ],
         "total": total,
         "skip": skip,
-        "limit": limit
+        "limit": limit,
+        "next_cursor": next_cursor
     }
 
 
@@ -137,8 +210,23 @@ async def game_page(request: Request, novel_id: int):
     return templates.TemplateResponse("game.html", {"request": request, "novel_id": novel_id})
 
 @router.get("/game/{novel_id}/data")
-async def get_novel_data(novel_id: int):
-    novel = await NovelsDAO.find_by_id(novel_id)
+async def get_novel_data(
+    novel_id: int,
+    width: Optional[int] = Query(None, ge=1, le=8192),
+    session: AsyncSession = Depends(get_session, scope="function"),
+):
+    """
+    Возвращает состояние новеллы для проигрывателя.
+
+    Если передана ширина экрана width, URL изображений заменяются 
+    на самые маленькие готовые копии WebP не уже этой ширины.
+    """
+
+    novel = await NovelsDAO.find_by_id(novel_id, session)
     if not novel:
         raise HTTPException(status_code=404, detail="Новелла не найдена")
-    return novel.data
\ No newline at end of file
+    if width is None:
+        return novel.data
+
+    urls = await variant_urls(novel_urls(novel.data), width, session)
+    return replace_novel_urls(novel.data, urls)
\ No newline at end of file
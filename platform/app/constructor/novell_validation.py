@@ -1,8 +1,14 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Dict, Any, Optional
 
 
 class SNovelSave(BaseModel):
     title: str = "Без названия"
     data: Dict[str, Any]
-    preview: Optional[str]
\ No newline at end of file
+    preview: Optional[str]
+
+
+class SUploadSession(BaseModel):
+    filename: str
+    size: int = Field(ge=0)
+    sha256: str = Field(pattern="^[0-9a-f]{64}$")
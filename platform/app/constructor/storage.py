@@ -0,0 +1,738 @@
+from fastapi import Request, Response
+from fastapi.staticfiles import StaticFiles
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO
+from urllib.parse import urlsplit
+import asyncio
+import copy
+import fcntl
+import hashlib
+import os
+import re
+import uuid
+
+from app.dao.dao_models import AssetsDAO
+
+
+# Файлы, загруженные до хранения по хэшу, лежат в папках пользователей
+UPLOAD_DIR = Path("uploads/novels")
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+
+UPLOAD_URL = "/uploads/novels"
+
+# Каждый файл хранится один раз под именем по хэшу содержимого
+BLOB_DIR = Path("uploads/blobs")
+BLOB_DIR.mkdir(parents=True, exist_ok=True)
+
+BLOB_URL = "/uploads/blobs"
+
+# Временные файлы, недописанные загрузки и файлы перед удалением. Папка
+# на той же файловой системе, что и BLOB_DIR, чтобы переименование 
+# было атомарным, но вне раздаваемых папок.
+TEMP_DIR = Path("uploads/.tmp")
+TEMP_DIR.mkdir(parents=True, exist_ok=True)
+
+
+class UploadTooLarge(Exception):
+    """Файл или запрос больше допустимого размера."""
+
+
+class UploadBusy(Exception):
+    """В файл загрузки по частям сейчас пишет другой запрос."""
+
+
+class OffsetMismatch(Exception):
+    """Часть файла передана не с того смещения, на котором стоит загрузка."""
+
+    def __init__(self, offset: int):
+        """
+        Args:
+            offset: сколько байт файла уже получено.
+        """
+
+        super().__init__(f"Загрузка продолжается со смещения {offset}")
+        self.offset = offset
+
+
+class UploadStaticFiles(StaticFiles):
+    """
+    Раздача загруженных файлов.
+
+    Пути, в которых есть скрытые папки или файлы (с точки в начале 
+    имени), не отдаются, как будто их нет.
+    """
+
+    def lookup_path(self, path: str) -> tuple[str, os.stat_result | None]:
+        if any(part.startswith(".") for part in Path(path).parts):
+            return "", None
+        return super().lookup_path(path)
+
+
+class ImmutableStaticFiles(UploadStaticFiles):
+    """
+    Раздача файлов, которые никогда не меняются.
+
+    Содержимое файла по URL с хэшем всегда одно и то же, поэтому 
+    браузер может кэшировать его бессрочно и не проверять повторно.
+    """
+
+    def file_response(self, *args, **kwargs) -> Response:
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
+def mb(size: int) -> int:
+    """Переводит размер в байтах в мегабайты."""
+
+    return size // (1024 * 1024)
+
+
+def file_ext(filename: str) -> str:
+    """
+    Возвращает расширение имени файла в нижнем регистре.
+
+    Подозрительные расширения (не из букв и цифр или длиннее 10 
+    символов) отбрасываются.
+
+    Args:
+        filename: имя файла от клиента.
+
+    Returns:
+        Расширение с точкой или пустая строка.
+    """
+
+    ext = Path(filename).suffix.lower()
+    return ext if ext[1:].isalnum() and len(ext) <= 10 else ""
+
+
+def blob_path(sha256: str, ext: str) -> Path:
+    """
+    Возвращает путь к файлу по хэшу содержимого.
+
+    Файлы разложены по папкам по первым двум символам хэша, чтобы 
+    в одной папке не было слишком много файлов.
+
+    Args:
+        sha256: хэш содержимого файла.
+        ext: расширение файла с точкой.
+
+    Returns:
+        Путь к файлу.
+    """
+
+    return BLOB_DIR / sha256[:2] / f"{sha256}{ext}"
+
+
+def blob_url(sha256: str, ext: str) -> str:
+    """Возвращает URL файла по хэшу содержимого."""
+
+    return f"{BLOB_URL}/{sha256[:2]}/{sha256}{ext}"
+
+
+def parse_blob_url(url: str) -> tuple[str, str] | None:
+    """
+    Разбирает URL файла, который хранится по хэшу.
+
+    Args:
+        url: URL файла.
+
+    Returns:
+        Хэш содержимого и расширение файла или None, если URL не 
+        указывает на такой файл.
+    """
+
+    url = url_path(url)
+    prefix = f"{BLOB_URL}/"
+    if not url.startswith(prefix):
+        return None
+
+    folder, _, name = url[len(prefix):].partition("/")
+    sha256, ext = name[:64], name[64:]
+    valid = (
+        len(sha256) == 64
+        and all(char in "0123456789abcdef" for char in sha256)
+        and folder == sha256[:2]
+        and (not ext or ext.startswith(".") and ext[1:].isalnum())
+    )
+
+    return (sha256, ext) if valid else None
+
+
+# URL внутри значения CSS, например фон реплики "url(...) center/cover"
+CSS_URL = re.compile(r"""url\((['"]?)(.*?)\1\)""")
+
+
+def url_path(url: str) -> str:
+    """
+    Возвращает путь URL без схемы и хоста.
+
+    Адреса спрайтов клиент сохраняет абсолютными (свойство src 
+    элемента img), остальные - относительными.
+    """
+
+    parts = urlsplit(url)
+    return parts.path if parts.scheme in ("http", "https") else url
+
+
+def novel_fields(data: dict) -> list[tuple[dict, str]]:
+    """
+    Находит поля состояния новеллы, в которых хранятся URL файлов.
+
+    Состояние проекта приходит от клиента, поэтому элементы 
+    неожиданного вида пропускаются.
+
+    Args:
+        data: состояние проекта новеллы.
+
+    Returns:
+        Пары из объекта и ключа поля с непустой строкой.
+    """
+
+    def items(value) -> list[dict]:
+        if not isinstance(value, list):
+            return []
+        return [item for item in value if isinstance(item, dict)]
+
+    # bgImage и audioFile - ключи проектов старого формата
+    fields = [
+        (data, key) 
+        for key in ("currentBg", "currentAudio", "bgImage", "audioFile")
+    ]
+    fields += [(sprite, "src") for sprite in items(data.get("sceneSpritesData"))]
+    for dialog in items(data.get("dialogData")):
+        fields += [(dialog, "bg"), (dialog, "audio")]
+        fields += [(sprite, "src") for sprite in items(dialog.get("sprites"))]
+
+    return [
+        (item, key) for item, key in fields 
+        if item.get(key) and isinstance(item[key], str)
+    ]
+
+
+def field_urls(value: str) -> list[str]:
+    """Возвращает URL из значения поля: самого URL или значения CSS."""
+
+    urls = [match[1] for match in CSS_URL.findall(value)]
+    return urls if "url(" in value else [value]
+
+
+def novel_urls(data: dict) -> set[str]:
+    """
+    Собирает URL файлов, которые используются в новелле.
+
+    Args:
+        data: состояние проекта новеллы.
+
+    Returns:
+        Пути URL спрайтов, фонов и музыки.
+    """
+
+    return {
+        url_path(url)
+        for item, key in novel_fields(data)
+        for url in field_urls(item[key])
+        if url
+    }
+
+
+def replace_novel_urls(data: dict, urls: dict[str, str]) -> dict:
+    """
+    Заменяет URL файлов в состоянии новеллы.
+
+    Args:
+        data: состояние проекта новеллы.
+        urls: новые URL по путям прежних URL (см. novel_urls).
+
+    Returns:
+        Копия состояния с замененными URL.
+    """
+
+    data = copy.deepcopy(data)
+    for item, key in novel_fields(data):
+        for url in field_urls(item[key]):
+            if url and url_path(url) in urls:
+                item[key] = item[key].replace(url, urls[url_path(url)])
+
+    return data
+
+
+def temp_path() -> Path:
+    """
+    Возвращает путь временного файла.
+
+    Временные файлы лежат в TEMP_DIR на той же файловой системе, что и 
+    постоянные, поэтому переименование во время publish атомарное.
+
+    Returns:
+        Путь к временному файлу.
+    """
+
+    TEMP_DIR.mkdir(parents=True, exist_ok=True)
+    return TEMP_DIR / f"{uuid.uuid4().hex}.part"
+
+
+def session_path(session_id: str) -> Path:
+    """
+    Возвращает путь файла загрузки по частям.
+
+    Args:
+        session_id: id загрузки из 32 шестнадцатеричных символов.
+
+    Returns:
+        Путь к файлу в папке временных файлов.
+    """
+
+    TEMP_DIR.mkdir(parents=True, exist_ok=True)
+    return TEMP_DIR / f"{session_id}.session"
+
+
+def file_sha256(path: Path, block_size: int = 1024 * 1024) -> str:
+    """Считает хэш sha256 файла, читая его блоками."""
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while block := file.read(block_size):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def open_part(path: Path) -> BinaryIO:
+    """
+    Открывает файл загрузки по частям и блокирует его (flock).
+
+    Блокировка не ждет: если файл уже заблокирован другим запросом,
+    вызывается UploadBusy. Она снимается при закрытии файла, в том 
+    числе если процесс упал, поэтому соединение с базой данных на 
+    время передачи части не занимается.
+
+    Args:
+        path: файл загрузки.
+
+    Returns:
+        Открытый файл.
+
+    Raises:
+        UploadBusy - если файл заблокирован другим запросом.
+        FileNotFoundError - если файла нет: загрузка завершена или 
+            отменена.
+    """
+
+    file = os.fdopen(os.open(path, os.O_RDWR), "r+b")
+    try:
+        try:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadBusy()
+
+        # Пока запрос ждал, загрузку могли завершить и перенести файл
+        if os.stat(path).st_ino != os.fstat(file.fileno()).st_ino:
+            raise FileNotFoundError(path)
+    except BaseException:
+        file.close()
+        raise
+
+    return file
+
+
+@asynccontextmanager
+async def locked_part(path: Path) -> AsyncIterator[BinaryIO]:
+    """
+    Держит файл загрузки по частям открытым и заблокированным внутри
+    контекста, см. open_part.
+
+    Так запись частей, завершение и отмена одной загрузки не 
+    выполняются одновременно.
+    """
+
+    file = await asyncio.to_thread(open_part, path)
+    try:
+        yield file
+    finally:
+        await asyncio.to_thread(file.close)
+
+
+async def write_chunk(
+    request: Request,
+    file: BinaryIO,
+    offset: int,
+    size: int,
+    chunk_size: int = 1024 * 1024,
+) -> int:
+    """
+    Записывает тело запроса в файл загрузки по частям со смещения offset.
+
+    Файл должен быть заблокирован (см. locked_part). Смещение 
+    сверяется с размером файла уже после блокировки, поэтому повтор 
+    части, которая уже записана, получит OffsetMismatch, а не допишет 
+    данные второй раз.
+
+    Тело пишется на диск порциями по chunk_size байт в пуле потоков.
+    Если соединение оборвется, уже полученные данные остаются в файле, 
+    и загрузку можно продолжить с нового смещения.
+
+    Args:
+        request: запрос с частью файла в теле.
+        file: открытый файл загрузки.
+        offset: смещение части, которое передал клиент.
+        size: полный размер файла в байтах.
+        chunk_size: размер порции записи на диск в байтах.
+
+    Returns:
+        Новое смещение - сколько байт файла получено.
+
+    Raises:
+        OffsetMismatch - если offset не совпадает с размером файла.
+        UploadTooLarge - если данных больше, чем size.
+    """
+
+    pending: list[bytes] = []
+
+    async def flush() -> None:
+        if pending:
+            data = b"".join(pending)
+            pending.clear()
+            await asyncio.to_thread(file.write, data)
+
+    received = await asyncio.to_thread(file.seek, 0, os.SEEK_END)
+    if offset != received:
+        raise OffsetMismatch(received)
+
+    try:
+        pending_size = 0
+        async for data in request.stream():
+            if received + len(data) > size:
+                raise UploadTooLarge(f"Файл больше {size} байт")
+            received += len(data)
+            pending.append(data)
+            pending_size += len(data)
+            if pending_size >= chunk_size:
+                await flush()
+                pending_size = 0
+    finally:
+        # Полученные данные сохраняются, даже если запрос оборвался
+        await flush()
+        await asyncio.to_thread(file.flush)
+
+    return received
+
+
+def place_blob(temp: Path, sha256: str, ext: str) -> None:
+    """
+    Переносит временный файл на постоянное место.
+
+    Если файл с таким содержимым уже есть, он не перезаписывается, 
+    чтобы не менялись его время изменения и ETag.
+
+    Args:
+        temp: временный файл.
+        sha256: хэш содержимого файла.
+        ext: расширение файла с точкой.
+    """
+
+    path = blob_path(sha256, ext)
+    if path.is_file():
+        temp.unlink()
+        return
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(temp, path)
+
+
+async def publish(
+    temp: Path, 
+    user_id: int | None, 
+    sha256: str, 
+    ext: str, 
+    size: int,
+) -> str:
+    """
+    Сохраняет временный файл под именем по хэшу содержимого.
+
+    Сначала в базу данных добавляется ссылка пользователя на файл, 
+    потом файл переносится на место, поэтому очистка (см. 
+    app.constructor.cleenup) не удалит файл, на который только что 
+    сослались. Переименование атомарное, поэтому по URL никогда не 
+    отдается недописанный файл. Если перенести файл не удалось, 
+    добавленные записи удаляются, чтобы они не указывали на 
+    несуществующий файл. Временный файл удаляется в любом случае.
+
+    Args:
+        temp: временный файл.
+        user_id: id пользователя.
+        sha256: хэш содержимого файла.
+        ext: расширение файла с точкой.
+        size: размер файла в байтах.
+
+    Returns:
+        URL для доступа к файлу.
+    """
+
+    try:
+        added = await AssetsDAO.add_upload(sha256, ext, size, user_id)
+    except BaseException:
+        await asyncio.to_thread(temp.unlink, True)
+        raise
+
+    try:
+        await asyncio.to_thread(place_blob, temp, sha256, added.ext)
+    except BaseException:
+        await asyncio.to_thread(temp.unlink, True)
+        await AssetsDAO.discard_upload(sha256, added)
+        raise
+
+    return blob_url(sha256, added.ext)
+
+
+async def save_upload(user_id: int | None, data: bytes, ext: str = ".png") -> str:
+    """
+    Сохраняет файл пользователя.
+
+    Args:
+        user_id: id пользователя.
+        data: содержимое файла.
+        ext: расширение файла с точкой.
+
+    Returns:
+        URL для доступа к файлу.
+    """
+
+    temp = await asyncio.to_thread(temp_path)
+    await asyncio.to_thread(temp.write_bytes, data)
+    sha256 = hashlib.sha256(data).hexdigest()
+
+    return await publish(temp, user_id, sha256, ext, len(data))
+
+
+async def upload_path(url: str, user_id: int) -> Path:
+    """
+    Находит файл пользователя по его URL.
+
+    Args:
+        url: URL файла, который вернула загрузка.
+        user_id: id пользователя.
+
+    Returns:
+        Путь к файлу.
+
+    Raises:
+        ValueError - если URL не указывает на файл этого пользователя.
+    """
+
+    blob = parse_blob_url(url)
+    if blob is not None:
+        sha256, ext = blob
+        asset = await AssetsDAO.find_user_asset(user_id, sha256)
+        if asset is None or asset.ext != ext:
+            raise ValueError(f"Файл не найден: {url}")
+        path = blob_path(sha256, ext)
+    else:
+        prefix = f"{UPLOAD_URL}/{user_id}/"
+        name = url[len(prefix):] if url.startswith(prefix) else ""
+        if not name or "/" in name or "\\" in name or name.startswith("."):
+            raise ValueError(f"Файл не найден: {url}")
+        path = UPLOAD_DIR / str(user_id) / name
+
+    if not path.is_file():
+        raise ValueError(f"Файл не найден: {url}")
+
+    return path
+
+
+class StreamingUpload:
+    """
+    Прием файла из тела запроса multipart/form-data по мере получения.
+
+    Тело запроса разбирается потоково, содержимое поля field пишется во
+    временный файл порциями по chunk_size байт в пуле потоков, поэтому
+    большой файл не блокирует цикл событий и не копируется повторно.
+    Хэш содержимого считается там же, во время записи.
+    Ограничения размера проверяются во время приема: как только файл
+    или весь запрос превышает лимит, прием прерывается, а временный
+    файл удаляется. Остальные поля формы пропускаются.
+    """
+
+    def __init__(
+        self,
+        user_id: int,
+        max_file_size: int,
+        max_request_size: int,
+        chunk_size: int = 1024 * 1024,
+        field: str = "file",
+    ):
+        """
+        Args:
+            user_id: id пользователя.
+            max_file_size: максимальный размер файла в байтах.
+            max_request_size: максимальный размер тела запроса в байтах.
+            chunk_size: размер порции записи на диск в байтах.
+            field: имя поля формы с файлом.
+        """
+
+        self.user_id = user_id
+        self.field = field
+        self.max_file_size = max_file_size
+        self.max_request_size = max_request_size
+        self.chunk_size = chunk_size
+
+        self.ext = ""
+        self.temp: Path | None = None
+        self._file: BinaryIO | None = None
+        self._file_size = 0
+        self._hash = hashlib.sha256()
+        self._pending: list[bytes] = []
+        self._pending_size = 0
+        self._header_field = b""
+        self._headers: dict[bytes, bytes] = {}
+        self._in_file = False
+        self._done = False
+
+    # Обработчики парсера multipart вызываются синхронно из
+    # parser.write, поэтому данные файла копятся в _pending и
+    # записываются на диск после каждой порции тела запроса.
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        name = self._header_field.lower()
+        self._headers[name] = self._headers.get(name, b"") + data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._header_field = b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(
+            self._headers.get(b"content-disposition", b"")
+        )
+        name = options.get(b"name", b"").decode()
+        filename = options.get(b"filename")
+        self._in_file = (
+            name == self.field and filename is not None and not self._done
+        )
+        if self._in_file:
+            self.ext = file_ext(filename.decode(errors="replace"))
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if not self._in_file:
+            return
+
+        self._file_size += end - start
+        if self._file_size > self.max_file_size:
+            raise UploadTooLarge(f"Файл больше {mb(self.max_file_size)} МБ")
+
+        self._pending.append(data[start:end])
+        self._pending_size += end - start
+
+    def _on_part_end(self) -> None:
+        if self._in_file:
+            self._in_file = False
+            self._done = True
+
+    def _write(self, data: bytes) -> None:
+        """Записывает данные файла и добавляет их в хэш."""
+
+        self._hash.update(data)
+        self._file.write(data)
+
+    async def _flush(self, force: bool = False) -> None:
+        """Записывает накопленные данные файла на диск."""
+
+        if not force and self._pending_size < self.chunk_size:
+            return
+
+        if self._file is None:
+            self.temp = await asyncio.to_thread(temp_path)
+            self._file = await asyncio.to_thread(open, self.temp, "wb")
+
+        if self._pending:
+            data = b"".join(self._pending)
+            self._pending.clear()
+            self._pending_size = 0
+            await asyncio.to_thread(self._write, data)
+
+    async def _close(self) -> None:
+        """Закрывает временный файл."""
+
+        if self._file is not None:
+            await asyncio.to_thread(self._file.close)
+            self._file = None
+
+    async def receive(self, request: Request) -> str:
+        """
+        Принимает файл и сохраняет его в папку пользователя.
+
+        Args:
+            request: запрос с телом multipart/form-data.
+
+        Returns:
+            URL для доступа к файлу.
+
+        Raises:
+            UploadTooLarge - если файл или запрос больше допустимого.
+            ValueError - если тело запроса не multipart или в нем нет файла.
+        """
+
+        content_type, options = parse_options_header(
+            request.headers.get("content-type", "")
+        )
+        boundary = options.get(b"boundary")
+        if content_type != b"multipart/form-data" or not boundary:
+            raise ValueError("Ожидается multipart/form-data")
+
+        too_large = UploadTooLarge(
+            f"Запрос больше {mb(self.max_request_size)} МБ"
+        )
+        length = request.headers.get("content-length", "")
+        if length.isdigit() and int(length) > self.max_request_size:
+            raise too_large
+
+        parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+        received = 0
+        try:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > self.max_request_size:
+                    raise too_large
+                try:
+                    parser.write(chunk)
+                except MultipartParseError as error:
+                    raise ValueError(f"Некорректное тело запроса: {error}")
+                await self._flush()
+            parser.finalize()
+
+            if not self._done:
+                raise ValueError("В запросе нет файла")
+
+            await self._flush(force=True)
+            await self._close()
+        except BaseException:
+            await self._close()
+            if self.temp is not None:
+                await asyncio.to_thread(self.temp.unlink, True)
+            raise
+
+        return await publish(
+            self.temp,
+            self.user_id,
+            self._hash.hexdigest(),
+            self.ext,
+            self._file_size,
+        )
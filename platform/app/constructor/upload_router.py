@@ -1,43 +1,275 @@
-import os
-import uuid
-import shutil
-from fastapi import APIRouter, UploadFile, File, Request, HTTPException, status
+from fastapi import APIRouter, Request, Depends, HTTPException, Header, Path
 from fastapi.responses import JSONResponse
-from pathlib import Path
 
-from app.users.auth import decode_access_token
-from jose.exceptions import ExpiredSignatureError, JWTError
+from app.constructor.novell_validation import SUploadSession
+from app.constructor.storage import StreamingUpload, UploadTooLarge
+from app.constructor.storage import OffsetMismatch, UploadBusy, locked_part
+from app.constructor.storage import write_chunk, publish
+from app.constructor.storage import file_ext, file_sha256, session_path
+from app.constructor.variants import variant_worker
+from app.dao.dao_models import UploadSessionsDAO
+from app.database import UPLOAD_DATA
+from app.migration.models import UploadSession
+from app.users.auth import TokenClaims, get_api_token_claims
+
+import asyncio
+import os
+import uuid
 
 router = APIRouter(prefix="/upload", tags=["Upload"])
 
-UPLOAD_DIR = Path("uploads/novels")
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+# id загрузки по частям - uuid4 без дефисов
+SESSION_ID = Path(pattern="^[0-9a-f]{32}$")
 
 @router.post("/file/")
 async def upload_file(
     request: Request,
-    file: UploadFile = File(...),
+    claims: TokenClaims = Depends(get_api_token_claims),
 ):
-    token = request.cookies.get("users_access_token")
-    if not token:
-        raise HTTPException(status_code=401, detail="Not authenticated")
+    """
+    Сохраняет файл из поля file формы multipart/form-data.
 
-    try:
-        user_id = decode_access_token(token)
-    except (ExpiredSignatureError, JWTError):
-        raise HTTPException(status_code=401, detail="Invalid token")
+    Файл пишется на диск по мере получения, размер файла и запроса
+    ограничен UPLOAD_MAX_FILE_MB и UPLOAD_MAX_REQUEST_MB.
+    """
 
-    # Генерируем уникальное имя
-    ext = Path(file.filename).suffix
-    unique_name = f"{uuid.uuid4().hex}{ext}"
-    user_dir = UPLOAD_DIR / str(user_id)
-    user_dir.mkdir(parents=True, exist_ok=True)
-    file_path = user_dir / unique_name
+    upload = StreamingUpload(
+        claims.user_id,
+        UPLOAD_DATA["max_file_size"],
+        UPLOAD_DATA["max_request_size"],
+        UPLOAD_DATA["chunk_size"],
+    )
+    try:
+        file_url = await upload.receive(request)
+    except UploadTooLarge as error:
+        raise HTTPException(status_code=413, detail=str(error))
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
 
-    # Сохраняем файл
-    with file_path.open("wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Копии изображения в WebP делаются в фоне
+    variant_worker.notify()
 
     # Возвращаем URL для доступа к файлу
-    file_url = f"/uploads/novels/{user_id}/{unique_name}"
-    return JSONResponse(content={"url": file_url})
\ No newline at end of file
+    return JSONResponse(content={"url": file_url})
+
+
+def upload_not_found() -> HTTPException:
+    """Ошибка для загрузки, которой нет, она чужая или уже завершена."""
+
+    return HTTPException(status_code=404, detail="Загрузка не найдена")
+
+
+async def get_upload_session(
+    session_id: str = SESSION_ID,
+    claims: TokenClaims = Depends(get_api_token_claims),
+) -> UploadSession:
+    """
+    Находит загрузку по частям текущего пользователя.
+
+    Raises:
+        HTTPException(404) - если загрузки нет или она чужая.
+    """
+
+    upload = await UploadSessionsDAO.find_session(session_id, claims.user_id)
+    if upload is None:
+        raise upload_not_found()
+
+    return upload
+
+
+def received_size(session_id: str) -> int:
+    """Возвращает, сколько байт файла загрузки уже получено."""
+
+    try:
+        return session_path(session_id).stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def offset_conflict(offset: int) -> JSONResponse:
+    """Ответ клиенту, который передает часть файла не с того смещения."""
+
+    return JSONResponse(
+        status_code=409,
+        content={
+            "detail": "Загрузка продолжается с другого смещения",
+            "offset": offset,
+        },
+    )
+
+
+def busy_conflict(session_id: str) -> JSONResponse:
+    """Ответ клиенту, если с загрузкой сейчас работает другой запрос."""
+
+    return JSONResponse(
+        status_code=409,
+        headers={"Retry-After": "1"},
+        content={
+            "detail": "Загрузка занята другим запросом",
+            "offset": received_size(session_id),
+            "busy": True,
+        },
+    )
+
+
+@router.post("/sessions/")
+async def create_upload_session(
+    upload: SUploadSession,
+    claims: TokenClaims = Depends(get_api_token_claims),
+):
+    """
+    Начинает загрузку файла по частям.
+
+    Части передаются запросами PUT /upload/sessions/{id} с заголовком
+    Upload-Offset. После обрыва связи клиент узнает смещение запросом
+    GET /upload/sessions/{id} и продолжает с него. Загрузка 
+    завершается запросом POST /upload/sessions/{id}/complete, файл
+    сверяется с хэшем sha256, который клиент передает здесь.
+
+    Returns:
+        id загрузки, смещение и рекомендуемый размер части в байтах.
+    """
+
+    if upload.size > UPLOAD_DATA["max_file_size"]:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Файл больше {UPLOAD_DATA['max_file_size']} байт",
+        )
+
+    session_id = uuid.uuid4().hex
+    await asyncio.to_thread(session_path(session_id).touch)
+    try:
+        await UploadSessionsDAO.add_session(
+            session_id,
+            claims.user_id,
+            upload.size,
+            file_ext(upload.filename),
+            upload.sha256,
+        )
+    except BaseException:
+        session_path(session_id).unlink(missing_ok=True)
+        raise
+
+    return {
+        "id": session_id,
+        "offset": 0,
+        "chunk_size": UPLOAD_DATA["session_chunk_size"],
+    }
+
+
+@router.get("/sessions/{session_id}")
+async def get_upload_offset(
+    upload: UploadSession = Depends(get_upload_session),
+):
+    """Возвращает, с какого смещения продолжать загрузку."""
+
+    return {
+        "id": upload.id,
+        "offset": received_size(upload.id),
+        "size": upload.size,
+    }
+
+
+@router.put("/sessions/{session_id}")
+async def upload_chunk(
+    request: Request,
+    upload: UploadSession = Depends(get_upload_session),
+    upload_offset: int = Header(ge=0),
+):
+    """
+    Записывает часть файла из тела запроса со смещения Upload-Offset.
+
+    Часть пишется прямо в файл загрузки. Если связь оборвется, 
+    полученные байты сохранятся, и клиент продолжит с нового смещения.
+    Пока пишется часть, файл заблокирован: повтор части, пришедший в 
+    это время, сразу получает 409 (busy) и повторяется позже.
+
+    Returns:
+        Новое смещение.
+    """
+
+    try:
+        async with locked_part(session_path(upload.id)) as file:
+            offset = await write_chunk(
+                request,
+                file,
+                upload_offset,
+                upload.size,
+                UPLOAD_DATA["chunk_size"],
+            )
+    except UploadBusy:
+        return busy_conflict(upload.id)
+    except FileNotFoundError:
+        raise upload_not_found()
+    except OffsetMismatch as error:
+        return offset_conflict(error.offset)
+    except UploadTooLarge as error:
+        raise HTTPException(status_code=413, detail=str(error))
+
+    return {"offset": offset}
+
+
+@router.post("/sessions/{session_id}/complete")
+async def complete_upload(
+    upload: UploadSession = Depends(get_upload_session),
+):
+    """
+    Завершает загрузку по частям.
+
+    Файл сверяется с заявленным размером и хэшем sha256, после чего 
+    сохраняется так же, как файл из /upload/file/. Файл с другим 
+    хэшем удаляется вместе с загрузкой.
+
+    Returns:
+        URL для доступа к файлу.
+    """
+
+    path = session_path(upload.id)
+    try:
+        async with locked_part(path) as file:
+            offset = await asyncio.to_thread(file.seek, 0, os.SEEK_END)
+            if offset != upload.size:
+                return offset_conflict(offset)
+
+            # Загрузку завершает только тот запрос, который ее удалил
+            if not await UploadSessionsDAO.delete_session(upload.id):
+                raise upload_not_found()
+
+            sha256 = await asyncio.to_thread(file_sha256, path)
+            if sha256 != upload.sha256:
+                await asyncio.to_thread(path.unlink, True)
+                return JSONResponse(
+                    status_code=422,
+                    content={"detail": "Хэш файла не совпадает с заявленным"},
+                )
+
+            file_url = await publish(
+                path, upload.user_id, sha256, upload.ext, offset
+            )
+    except UploadBusy:
+        return busy_conflict(upload.id)
+    except FileNotFoundError:
+        raise upload_not_found()
+
+    variant_worker.notify()
+
+    return JSONResponse(content={"url": file_url})
+
+
+@router.delete("/sessions/{session_id}")
+async def cancel_upload(
+    upload: UploadSession = Depends(get_upload_session),
+):
+    """Отменяет загрузку по частям и удаляет полученные данные."""
+
+    path = session_path(upload.id)
+    try:
+        async with locked_part(path):
+            await UploadSessionsDAO.delete_session(upload.id)
+            await asyncio.to_thread(path.unlink, True)
+    except UploadBusy:
+        return busy_conflict(upload.id)
+    except FileNotFoundError:
+        raise upload_not_found()
+
+    return {"message": "Загрузка отменена"}
@@ -0,0 +1,259 @@
+from PIL import Image, ImageOps
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from pathlib import Path
+from typing import Iterable
+import asyncio
+import os
+
+from app.constructor import storage
+from app.constructor.storage import blob_url, parse_blob_url, temp_path
+from app.dao.dao_models import AssetsDAO, utc_now
+from app.database import VARIANTS_DATA
+from app.migration.models import Asset
+from app.polling import PollingWorker
+
+
+# Расширения файлов, для которых делаются копии WebP
+IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".webp", ".bmp"}
+
+
+def variant_path(sha256: str, width: int | None = None) -> Path:
+    """
+    Возвращает путь к копии изображения в формате WebP.
+
+    Копии лежат рядом с исходным файлом, их имена тоже строятся по
+    хэшу, поэтому они кэшируются браузером так же бессрочно.
+
+    Args:
+        sha256: хэш содержимого исходного файла.
+        width: ширина уменьшенной копии. None - копия исходного размера.
+
+    Returns:
+        Путь к копии.
+    """
+
+    suffix = "" if width is None else f"_{width}"
+    return storage.BLOB_DIR / sha256[:2] / f"{sha256}{suffix}.webp"
+
+
+def variant_url(sha256: str, width: int | None = None) -> str:
+    """Возвращает URL копии изображения в формате WebP."""
+
+    suffix = "" if width is None else f"_{width}"
+    return f"{storage.BLOB_URL}/{sha256[:2]}/{sha256}{suffix}.webp"
+
+
+def save_webp(image: Image.Image, path: Path, quality: int) -> None:
+    """Сохраняет изображение в WebP через временный файл."""
+
+    temp = temp_path()
+    try:
+        image.save(temp, "WEBP", quality=quality)
+        os.replace(temp, path)
+    finally:
+        temp.unlink(missing_ok=True)
+
+
+def make_variants(
+    sha256: str,
+    ext: str,
+    widths: list[int],
+    quality: int,
+) -> list[int] | None:
+    """
+    Делает копию изображения в WebP и уменьшенные копии.
+
+    Уменьшенные копии делаются только для ширин меньше исходной.
+    Анимированные изображения не обрабатываются.
+
+    Args:
+        sha256: хэш содержимого файла.
+        ext: расширение файла с точкой.
+        widths: ширины уменьшенных копий.
+        quality: качество WebP от 0 до 100.
+
+    Returns:
+        Ширины сделанных уменьшенных копий или None, если изображение
+        анимированное.
+
+    Raises:
+        OSError - если файл не удалось прочитать или записать.
+        Image.DecompressionBombError - если изображение слишком большое.
+    """
+
+    with Image.open(storage.blob_path(sha256, ext)) as source:
+        if getattr(source, "n_frames", 1) > 1:
+            return None
+
+        # Браузер поворачивает исходный файл по EXIF, в копиях EXIF нет
+        image = ImageOps.exif_transpose(source)
+        alpha = image.mode in ("RGBA", "LA", "PA") or (
+            image.mode == "P" and "transparency" in image.info
+        )
+        image = image.convert("RGBA" if alpha else "RGB")
+
+    if ext != ".webp":
+        save_webp(image, variant_path(sha256), quality)
+
+    done = []
+    for width in sorted(widths):
+        if width >= image.width:
+            break
+        height = max(1, round(image.height * width / image.width))
+        thumbnail = image.resize(
+            (width, height), Image.Resampling.LANCZOS, reducing_gap=3.0
+        )
+        save_webp(thumbnail, variant_path(sha256, width), quality)
+        done.append(width)
+
+    return done
+
+
+def image_url(asset: Asset, width: int | None = None) -> str:
+    """
+    Выбирает URL копии изображения для нужной ширины.
+
+    Args:
+        asset: файл.
+        width: ширина, в которой изображение будет показано.
+            None - исходный размер.
+
+    Returns:
+        URL самой маленькой копии не уже width, копии WebP исходного
+        размера или исходного файла, если копий еще нет.
+    """
+
+    if asset.variants_status != "done":
+        return blob_url(asset.sha256, asset.ext)
+
+    if width is not None:
+        for variant in sorted(asset.variants):
+            if variant >= width:
+                return variant_url(asset.sha256, variant)
+
+    if asset.ext == ".webp":
+        return blob_url(asset.sha256, asset.ext)
+
+    return variant_url(asset.sha256)
+
+
+async def variant_urls(
+    urls: Iterable[str],
+    width: int | None,
+    session: AsyncSession | None = None,
+) -> dict[str, str]:
+    """
+    Подбирает копии изображений для нужной ширины.
+
+    Args:
+        urls: URL файлов.
+        width: ширина, в которой изображения будут показаны.
+        session: сессия запроса.
+
+    Returns:
+        URL копий по исходным URL. URL, которые не указывают на
+        загруженный файл, в словаре нет.
+    """
+
+    blobs = {url: parse_blob_url(url) for url in urls}
+    assets = await AssetsDAO.find_assets(
+        [blob[0] for blob in blobs.values() if blob is not None],
+        session=session,
+    )
+
+    found = {}
+    for url, blob in blobs.items():
+        asset = assets.get(blob[0]) if blob is not None else None
+        if asset is not None and asset.ext == blob[1]:
+            found[url] = image_url(asset, width)
+
+    return found
+
+
+class VariantWorker(PollingWorker):
+    """
+    Фоновый обработчик загруженных изображений.
+
+    Забирает пачками файлы со статусом pending и делает для изображений
+    копию в WebP и уменьшенные копии заданных ширин. Изображения
+    обрабатываются в пуле потоков по одному, чтобы не занимать
+    все ядра веб-процесса.
+    """
+
+    log_name = "Image variants"
+
+    # На сколько секунд забранные файлы скрываются от других обработчиков
+    lease = 300
+
+    def __init__(
+        self,
+        widths: list[int],
+        quality: int = 80,
+        batch_size: int = 8,
+        poll_interval: float = 5,
+    ):
+        """
+        Args:
+            widths: ширины уменьшенных копий.
+            quality: качество WebP от 0 до 100.
+            batch_size: максимальное число файлов в одной пачке.
+            poll_interval: интервал опроса в секундах.
+        """
+
+        super().__init__(poll_interval, batch_size)
+        self.widths = widths
+        self.quality = quality
+
+    async def _process(self, asset: Asset) -> None:
+        """Обрабатывает один файл и сохраняет результат."""
+
+        if asset.ext not in IMAGE_EXTS:
+            await AssetsDAO.finish_variants(asset.sha256, "skipped")
+            return
+
+        try:
+            widths = await asyncio.to_thread(
+                make_variants, asset.sha256, asset.ext, self.widths, self.quality
+            )
+        except FileNotFoundError as error:
+            # Запись о файле добавляется раньше, чем файл переносится
+            # на место, файл будет обработан после окончания lease.
+            # Если файла нет и после этого, он уже не появится.
+            age = utc_now() - asset.created_at
+            if age.total_seconds() < self.lease:
+                return
+            print(f"Image variants error {asset.sha256}: {error!r}")
+            await AssetsDAO.finish_variants(asset.sha256, "failed")
+            return
+        except (OSError, ValueError, Image.DecompressionBombError) as error:
+            print(f"Image variants error {asset.sha256}: {error!r}")
+            await AssetsDAO.finish_variants(asset.sha256, "failed")
+            return
+
+        if widths is None:
+            await AssetsDAO.finish_variants(asset.sha256, "skipped")
+        else:
+            await AssetsDAO.finish_variants(asset.sha256, "done", widths)
+
+    async def run_once(self) -> int:
+        """
+        Обрабатывает одну пачку файлов.
+
+        Returns:
+            Количество файлов, взятых в обработку.
+        """
+
+        assets = await AssetsDAO.claim_variants(self.batch_size, self.lease)
+        for asset in assets:
+            await self._process(asset)
+
+        return len(assets)
+
+
+variant_worker = VariantWorker(
+    VARIANTS_DATA["widths"],
+    VARIANTS_DATA["quality"],
+    VARIANTS_DATA["batch_size"],
+    VARIANTS_DATA["poll_interval"],
+)
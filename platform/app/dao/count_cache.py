@@ -0,0 +1,102 @@
+from sqlalchemy import select, func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import time
+from typing import Type
+
+
+class TableCountCache:
+    """
+    Кэш общего количества строк таблицы.
+
+    Значение хранится в памяти процесса и пересчитывается после истечения
+    ttl секунд или после сброса. Другие процессы не сбрасывают этот кэш,
+    поэтому ttl задает максимальную задержку обновления. Значение, 
+    подсчет которого начался до сброса, не сохраняется.
+
+    Режимы:
+        exact - точное количество через count(*).
+        estimate - оценка из pg_class.reltuples, которая не зависит
+            от размера таблицы. Если оценки нет (таблица еще не
+            анализировалась), то используется count(*).
+    """
+
+    def __init__(self, model: Type, ttl: float = 60, mode: str = "exact"):
+        """
+        Args:
+            model: ORM-модель таблицы.
+            ttl: время жизни значения в секундах.
+            mode: режим подсчета, exact или estimate.
+        """
+
+        if mode not in ("exact", "estimate"):
+            raise ValueError(f"Неизвестный режим подсчета: {mode}")
+
+        self.model = model
+        self.ttl = ttl
+        self.mode = mode
+        self._value: int | None = None
+        self._expires_at = 0.0
+        # Номер сброса, увеличивается при каждом invalidate
+        self._generation = 0
+
+    async def get(self, session: AsyncSession) -> int:
+        """
+        Возвращает количество строк таблицы.
+
+        Args:
+            session: сессия, через которую выполняется подсчет при промахе.
+
+        Returns:
+            Количество строк.
+        """
+
+        if self._value is not None and time.monotonic() < self._expires_at:
+            return self._value
+
+        generation = self._generation
+        value = None
+        if self.mode == "estimate":
+            value = await self._estimate(session)
+        if value is None:
+            value = await self._count(session)
+
+        # Пока шел подсчет, кэш сбросили - значение могло устареть
+        if generation == self._generation:
+            self._value = value
+            self._expires_at = time.monotonic() + self.ttl
+        return value
+
+    def invalidate(self) -> None:
+        """Сбрасывает значение, следующий get пересчитает его."""
+
+        self._value = None
+        self._generation += 1
+
+    async def _count(self, session: AsyncSession) -> int:
+        """Считает точное количество строк."""
+
+        result = await session.execute(
+            select(func.count()).select_from(self.model)
+        )
+        return result.scalar()
+
+    async def _estimate(self, session: AsyncSession) -> int | None:
+        """
+        Возвращает оценку количества строк из статистики Postgres.
+
+        Returns:
+            Оценка или None, если статистики еще нет.
+        """
+
+        result = await session.execute(
+            text(
+                "SELECT reltuples::bigint FROM pg_class "
+                "WHERE oid = CAST(:table AS regclass)"
+            ),
+            {"table": self.model.__tablename__},
+        )
+        value = result.scalar()
+        if value is None or value < 0:
+            return None
+        return value
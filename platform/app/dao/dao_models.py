@@ -1,50 +1,127 @@
-from sqlalchemy import select, update, delete, insert, func
-from sqlalchemy.sql import ClauseElement
+from sqlalchemy import select, update, delete, insert, literal, Row, tuple_, func
+from sqlalchemy import event, or_, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.sql import ClauseElement, ColumnElement, Select
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
 from pydantic import EmailStr
 
-from app.migration.models import User, Novell
-from app.database import async_session_maker
+from app.migration.models import (
+    User, Novell, EmailOutbox, AiJob, Asset, AssetRef, UploadSession
+)
+from app.database import async_session_maker, COUNT_DATA
+from app.dao.count_cache import TableCountCache
 
-from typing import Generic, TypeVar, Type, Dict, Any, Optional
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import (
+    Generic, TypeVar, Type, Dict, Any, Optional, AsyncIterator, Callable
+)
 
 
 T = TypeVar("T")
 
 
+@asynccontextmanager
+async def open_session(
+    session: AsyncSession | None = None
+) -> AsyncIterator[AsyncSession]:
+    """
+    Возвращает сессию запроса или открывает новую сессию.
+
+    Args:
+        session: сессия запроса. Если None, то открывается новая сессия, 
+            которая закрывается после выхода из контекста.
+    """
+
+    if session is not None:
+        yield session
+        return
+
+    async with async_session_maker() as new_session:
+        yield new_session
+
+
+def call_after_commit(
+    session: AsyncSession | None,
+    callback: Callable[[], None],
+) -> None:
+    """
+    Вызывает callback после фиксации сессии запроса.
+
+    Args:
+        session: сессия запроса. Если None, то изменения уже
+            зафиксированы и callback вызывается сразу.
+        callback: функция без аргументов.
+    """
+
+    if session is None:
+        callback()
+        return
+
+    event.listen(
+        session.sync_session,
+        "after_commit",
+        lambda _: callback(),
+        once=True,
+    )
+
+
 class BaseDAO(Generic[T]):
     """Базовый класс взаимодействия с данными."""
     
     model: Type[T]
     
     @classmethod
-    async def _find_data_where(cls, *conditions: ClauseElement) -> T | None:
+    async def _find_data_where(
+        cls, 
+        *conditions: ClauseElement,
+        session: AsyncSession | None = None
+    ) -> T | None:
         """
         Находит данные в базе данных.
 
         Args:
             conditions: условия для поиска данных.
+            session: сессия запроса. Если None, то открывается новая сессия.
         
         Returns:
             Объект данных или None, если объект не найден.
         """
 
-        async with async_session_maker() as session:
+        async with open_session(session) as current:
             query = select(cls.model).where(*conditions)
-            result = await session.execute(query)
+            result = await current.execute(query)
 
             return result.scalars().first()
 
     @classmethod
-    async def _add_data(cls, **values) -> None:
+    async def _add_data(
+        cls, 
+        session: AsyncSession | None = None, 
+        returning: tuple[ColumnElement, ...] = (),
+        **values
+    ) -> Row | None:
         """
         Добавляет данные в базу данных.
 
+        Изменения в сессии запроса фиксируются вместе с ней, 
+        в новой сессии - сразу.
+
         Args:
+            session: сессия запроса. Если None, то открывается новая сессия.
+            returning: столбцы, которые нужно вернуть из добавленной строки
+                тем же запросом (INSERT ... RETURNING).
             values: словарь с данными для добавления.
                     
                     Ключи должны соответствовать атрибутам ORM-модели.
                     Допустимый набор полей определяется конкретным DAO.
+
+        Returns:
+            Строка с запрошенными столбцами или None, если столбцы 
+            не запрошены.
         
         Raises:
             IntegrityError - если добавляются данные, которые уже есть в базе.
@@ -52,56 +129,82 @@ class BaseDAO(Generic[T]):
             TypeError - если были переданы некорректные значения.
         """
 
-        async with async_session_maker() as session:
+        async with open_session(session) as current:
             query = insert(cls.model).values(**values)
+            if returning:
+                query = query.returning(*returning)
             try:
-                await session.execute(query)
-                await session.commit()
+                result = await current.execute(query)
+                row = result.first() if returning else None
+                if session is None:
+                    await current.commit()
             except (TypeError, IntegrityError, SQLAlchemyError) as error:
-                await session.rollback()
+                await current.rollback()
                 raise error
 
+            return row
+
     @classmethod
     async def _update_data_where(
         cls, 
         *conditions: ClauseElement, 
+        session: AsyncSession | None = None,
+        returning: tuple[ColumnElement, ...] = (),
         **values
-    ) -> None:
+    ) -> bool | Row | None:
         """
         Обновляет данные в базе данных.
 
         Args:
             conditions: набор условий.
+            session: сессия запроса. Если None, то открывается новая сессия.
+            returning: столбцы, которые нужно вернуть из обновленной строки
+                тем же запросом (UPDATE ... RETURNING).
             values: словарь с полями и значениями для обновления.
                     
                     Ключи должны соответствовать атрибутам ORM-модели.
                     Допустимый набор полей определяется конкретным DAO.
 
         Returns:
-            True - если была обновлена хотя бы одна строка. False - иначе.
+            Если столбцы не запрошены: True - если была обновлена хотя бы 
+            одна строка, False - иначе.
+            Если столбцы запрошены: первая обновленная строка или None, 
+            если ничего не обновлено.
 
         Raises:
             SQLAlchemyError - если возникла ошибка при обновлении.
         """
 
-        async with async_session_maker() as session:
+        async with open_session(session) as current:
             query = update(cls.model).where(*conditions).values(**values)
+            if returning:
+                query = query.returning(*returning)
             try:
-                result = await session.execute(query)
-                await session.commit()
+                result = await current.execute(query)
+                if returning:
+                    updated = result.first()
+                else:
+                    updated = result.rowcount > 0
+                if session is None:
+                    await current.commit()
             except SQLAlchemyError as error:
-                await session.rollback()
+                await current.rollback()
                 raise error
 
-            return result.rowcount > 0
+            return updated
 
     @classmethod
-    async def _delete_data_where(cls, *conditions: ClauseElement) -> bool:
+    async def _delete_data_where(
+        cls, 
+        *conditions: ClauseElement,
+        session: AsyncSession | None = None
+    ) -> bool:
         """
         Удаляет данные из базы данных.
 
         Args:
             conditions: набор условий.
+            session: сессия запроса. Если None, то открывается новая сессия.
         
         Returns:
             True - если данные получилось удалить, иначе False.
@@ -110,13 +213,14 @@ class BaseDAO(Generic[T]):
             SQLAlchemyError - если возникла ошибка при удалении.
         """
 
-        async with async_session_maker() as session:
+        async with open_session(session) as current:
             query = delete(cls.model).where(*conditions)
             try:
-                result = await session.execute(query)
-                await session.commit()
+                result = await current.execute(query)
+                if session is None:
+                    await current.commit()
             except SQLAlchemyError as error:
-                await session.rollback()
+                await current.rollback()
                 raise error
             
             return result.rowcount > 0
@@ -132,8 +236,9 @@ class UsersDAO(BaseDAO[User]):
         cls, 
         username: str, 
         password: str, 
-        email: EmailStr
-    ) -> None:
+        email: EmailStr,
+        session: AsyncSession | None = None
+    ) -> int:
         """
         Добавляет пользователя в базу данных.
 
@@ -141,39 +246,60 @@ class UsersDAO(BaseDAO[User]):
             username: имя пользователя.
             password: хэшированный пароль пользователя.
             email: электронная почта пользователя.
+            session: сессия запроса.
+
+        Returns:
+            Id добавленного пользователя.
 
         Raises:
             IntegrityError - если добавляются данные, которые уже есть в базе.
             SQLAlchemyError - если возникла ошибка при добавлении. 
         """
 
-        await super()._add_data(
+        row = await super()._add_data(
+            session=session,
+            returning=(cls.model.id,),
             username=username,
             email=email,
             password=password,
         )
 
+        return row.id
+
     @classmethod
-    async def find_user(cls, email: EmailStr) -> User | None:
+    async def find_user(
+        cls, 
+        email: EmailStr,
+        session: AsyncSession | None = None
+    ) -> User | None:
         """
         Находит пользователя в базе данных.
 
         Args: 
             email: электронная почта пользователя.
+            session: сессия запроса.
         
         Returns:
             Объект пользователя или None, если пользователь не найден.
         """
 
-        return await super()._find_data_where(cls.model.email == email)
+        return await super()._find_data_where(
+            cls.model.email == email,
+            session=session
+        )
     
     @classmethod
-    async def delete_user(cls, email: EmailStr) -> None:
+    async def delete_user(
+        cls, 
+        email: EmailStr,
+        session: AsyncSession | None = None
+    ) -> None:
         """
         Удаляют пользователя из базы данных.
 
         Args:
             email: электронная почта пользователя.
+            session: сессия запроса.
     
         Returns:
             True - если получилось удалить пользователя, иначе False.
@@ -182,44 +308,83 @@ class UsersDAO(BaseDAO[User]):
             SQLAlchemyError - если при удалении возникла ошибка.
         """
         
-        return await super()._delete_data_where(cls.model.email == email)
+        deleted = await super()._delete_data_where(
+            cls.model.email == email,
+            session=session
+        )
+        # Новеллы пользователя удаляются каскадно
+        if deleted:
+            call_after_commit(session, NovelsDAO.count_cache.invalidate)
+
+        return deleted
     
     @classmethod
     async def update_user_password(
         cls,
         email: EmailStr,
-        password: str
-    ) -> None:
+        password: str,
+        session: AsyncSession | None = None
+    ) -> int | None:
         """
         Меняет пароль в базе данных.
 
         Args:
             email: электронная почта пользователя.
             password: новый пароль.
+            session: сессия запроса.
 
         Returns:
-            True - если была обновлена хотя бы одна строка. False - иначе.
+            Id пользователя, у которого сменился пароль, или None, 
+            если пользователь не найден.
             
         Raises:
             SQLAlchemyError - если возникла ошибка при обновлении.
         """
 
-        return await super()._update_data_where(
+        row = await super()._update_data_where(
             cls.model.email == email, 
+            session=session,
+            returning=(cls.model.id,),
             password=password
         )
 
+        return row.id if row else None
+
 class NovelsDAO(BaseDAO[Novell]):
     model = Novell
 
+    # Общее количество новелл для постраничного вывода
+    count_cache = TableCountCache(Novell, **COUNT_DATA)
+
+    # Поля карточки новеллы в списках. Столбец data (полное состояние 
+    # проекта) в списки не загружается.
+    card_fields = (Novell.id, Novell.title, Novell.preview, Novell.created_at)
+
+    @classmethod
+    def _select_cards(cls) -> Select:
+        """
+        Формирует запрос новелл только с полями карточки.
+
+        Обращение к незагруженному полю вызывает ошибку, а не 
+        дополнительный запрос.
+
+        Returns:
+            Запрос новелл.
+        """
+
+        return select(cls.model).options(
+            load_only(*cls.card_fields, raiseload=True)
+        )
+
     @classmethod
     async def add_novel(
         cls,
         user_id: int,
         title: str,
         data: Dict[str, Any],
-        preview: Optional[str] = None
-    ) -> None:
+        preview: Optional[str] = None,
+        session: AsyncSession | None = None
+    ) -> int:
         """
         Сохраняет новеллу  в базу данных.
 
@@ -227,36 +392,1151 @@ class NovelsDAO(BaseDAO[Novell]):
             user_id: идентификатор пользователя.
             title: название проекта.
             data: JSON-объект с полным состоянием проекта.
+            session: сессия запроса.
+
+        Returns:
+            Id сохраненной новеллы.
 
         Raises:
             IntegrityError: если нарушены ограничения (например, неверный user_id).
             SQLAlchemyError: при ошибке БД.
         """
 
-        await super()._add_data(
+        row = await super()._add_data(
+            session=session,
+            returning=(cls.model.id,),
             user_id=user_id,
             title=title,
             data=data,
             preview=preview
         )
+        # До фиксации другие запросы еще видят старое количество
+        call_after_commit(session, cls.count_cache.invalidate)
+
+        return row.id
 
     @classmethod
-    async def find_by_id(cls, novel_id: int) -> Optional["Novell"]:
-        async with async_session_maker() as session:
-            result = await session.execute(
+    async def find_by_id(
+        cls, 
+        novel_id: int,
+        session: AsyncSession | None = None
+    ) -> Optional["Novell"]:
+        async with open_session(session) as current:
+            result = await current.execute(
                 select(cls.model).where(cls.model.id == novel_id)
             )
             return result.scalar_one_or_none()
         
     @classmethod
-    async def find_paginated_all(cls, skip: int, limit: int) -> tuple[list["Novell"], int]:
-        async with async_session_maker() as session:
+    async def find_by_title(
+        cls,
+        user_id: int,
+        title: str,
+        session: AsyncSession | None = None
+    ) -> Optional["Novell"]:
+        """
+        Находит новеллу пользователя по названию.
+
+        Поиск идет по индексу uq_novels_user_id_title.
+
+        Args:
+            user_id: id пользователя.
+            title: название новеллы.
+            session: сессия запроса.
+
+        Returns:
+            Объект новеллы или None, если новелла не найдена.
+        """
+
+        return await super()._find_data_where(
+            cls.model.user_id == user_id,
+            cls.model.title == title,
+            session=session
+        )
+
+    @classmethod
+    async def find_paginated_all(
+        cls, 
+        skip: int, 
+        limit: int,
+        session: AsyncSession | None = None
+    ) -> tuple[list["Novell"], int]:
+        async with open_session(session) as current:
             # Запрос всех новелл (можно сортировать по дате)
-            query = select(cls.model).order_by(cls.model.created_at.desc()).offset(skip).limit(limit)
-            result = await session.execute(query)
+            query = cls._select_cards().order_by(cls.model.created_at.desc(), cls.model.id.desc()).offset(skip).limit(limit)
+            result = await current.execute(query)
             novels = result.scalars().all()
             # Общее количество всех новелл
-            total_query = select(func.count()).select_from(cls.model)
-            total = await session.execute(total_query)
-            total_count = total.scalar()
-            return novels, total_count
\ No newline at end of file
+            total_count = await cls.count_cache.get(current)
+            return novels, total_count
+
+    @classmethod
+    async def find_page_after(
+        cls,
+        limit: int,
+        after: tuple[datetime, int] | None = None,
+        session: AsyncSession | None = None
+    ) -> list["Novell"]:
+        """
+        Находит страницу новелл, идущих после курсора.
+
+        Новеллы отсортированы от новых к старым по (created_at, id).
+        Запрос читает индекс ix_novels_created_at_id с позиции курсора, 
+        поэтому время не зависит от номера страницы.
+
+        Args:
+            limit: количество новелл на странице.
+            after: (created_at, id) последней новеллы предыдущей страницы. 
+                Если None, то возвращается первая страница.
+            session: сессия запроса.
+
+        Returns:
+            Список новелл.
+        """
+
+        query = (
+            cls._select_cards()
+            .order_by(cls.model.created_at.desc(), cls.model.id.desc())
+            .limit(limit)
+        )
+        if after is not None:
+            query = query.where(
+                tuple_(cls.model.created_at, cls.model.id) < tuple_(*after)
+            )
+
+        async with open_session(session) as current:
+            result = await current.execute(query)
+            return list(result.scalars().all())
+
+
+
+def utc_now() -> datetime:
+    """Возвращает текущее время UTC без часового пояса, как в столбцах БД."""
+
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class OutboxDAO(BaseDAO[EmailOutbox]):
+    """Класс взаимодействия с данными таблицы email_outbox."""
+
+    model = EmailOutbox
+
+    @classmethod
+    async def add_email(
+        cls,
+        recipient: EmailStr,
+        subject: str,
+        body: str,
+        session: AsyncSession | None = None
+    ) -> int:
+        """
+        Добавляет письмо в очередь на отправку.
+
+        В сессии запроса письмо попадает в очередь только вместе 
+        с остальными изменениями запроса.
+
+        Args:
+            recipient: электронная почта получателя.
+            subject: тема письма.
+            body: текст письма.
+            session: сессия запроса.
+
+        Returns:
+            Id письма в очереди.
+
+        Raises:
+            SQLAlchemyError - если возникла ошибка при добавлении.
+        """
+
+        row = await super()._add_data(
+            session=session,
+            returning=(cls.model.id,),
+            recipient=recipient,
+            subject=subject,
+            body=body,
+        )
+
+        return row.id
+
+    @classmethod
+    async def claim_batch(cls, limit: int, lease: float) -> list[EmailOutbox]:
+        """
+        Забирает из очереди письма, которые пора отправить.
+
+        Строки, заблокированные другим обработчиком, пропускаются 
+        (FOR UPDATE SKIP LOCKED). Забранные письма откладываются на lease 
+        секунд, поэтому если обработчик упадет, не отметив результат, 
+        письма снова станут доступны после этого времени.
+
+        Args:
+            limit: максимальное количество писем.
+            lease: на сколько секунд письма откладываются для других 
+                обработчиков.
+
+        Returns:
+            Список писем, у которых уже увеличен счетчик попыток.
+
+        Raises:
+            SQLAlchemyError - если возникла ошибка при обновлении.
+        """
+
+        now = utc_now()
+        pending = (
+            select(cls.model.id)
+            .where(
+                cls.model.status == "pending",
+                cls.model.next_attempt_at <= now,
+            )
+            .order_by(cls.model.next_attempt_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        query = (
+            update(cls.model)
+            .where(cls.model.id.in_(pending.scalar_subquery()))
+            .values(
+                attempts=cls.model.attempts + 1,
+                next_attempt_at=now + timedelta(seconds=lease),
+            )
+            .returning(cls.model)
+            .execution_options(synchronize_session=False)
+        )
+
+        async with open_session() as current:
+            try:
+                result = await current.execute(query)
+                emails = list(result.scalars().all())
+                await current.commit()
+            except SQLAlchemyError as error:
+                await current.rollback()
+                raise error
+
+            return emails
+
+    @classmethod
+    async def mark_sent(cls, email_ids: list[int]) -> None:
+        """
+        Отмечает письма отправленными.
+
+        Args:
+            email_ids: id отправленных писем.
+
+        Raises:
+            SQLAlchemyError - если возникла ошибка при обновлении.
+        """
+
+        if email_ids:
+            await super()._update_data_where(
+                cls.model.id.in_(email_ids),
+                status="sent",
+                sent_at=utc_now(),
+                last_error=None,
+            )
+
+    @classmethod
+    async def mark_retry(cls, email_id: int, error: str, delay: float) -> None:
+        """
+        Откладывает письмо для повторной отправки.
+
+        Args:
+            email_id: id письма.
+            error: текст ошибки отправки.
+            delay: через сколько секунд повторить отправку.
+
+        Raises:
+            SQLAlchemyError - если возникла ошибка при обновлении.
+        """
+
+        await super()._update_data_where(
+            cls.model.id == email_id,
+            next_attempt_at=utc_now() + timedelta(seconds=delay),
+            last_error=error,
+        )
+
+    @classmethod
+    async def mark_failed(cls, email_id: int, error: str) -> None:
+        """
+        Отмечает письмо, которое не удалось отправить за все попытки.
+
+        Args:
+            email_id: id письма.
+            error: текст последней ошибки отправки.
+
+        Raises:
+            SQLAlchemyError - если возникла ошибка при обновлении.
+        """
+
+        await super()._update_data_where(
+            cls.model.id == email_id,
+            status="failed",
+            last_error=error,
+        )
+
+
+
+class AiJobsDAO(BaseDAO[AiJob]):
+    """Класс взаимодействия с данными таблицы ai_jobs."""
+
+    model = AiJob
+
+    # Поля задачи, достаточные для ответа о ее состоянии
+    status_fields = (
+        AiJob.id, AiJob.user_id, AiJob.kind, AiJob.status, AiJob.progress,
+        AiJob.total_steps, AiJob.error, AiJob.result_url,
+    )
+
+    @classmethod
+    async def add_job(
+        cls,
+        kind: str,
+        params: Dict[str, Any],
+        user_id: int | None = None,
+        result_url: str | None = None,
+        session: AsyncSession | None = None
+    ) -> int:
+        """
+        Добавляет задачу в очередь.
+
+        Args:
+            kind: тип задачи, generate или remove_bg.
+            params: параметры задачи.
+            user_id: id пользователя, который поставил задачу.
+            result_url: URL готового результата. Если задан, задача 
+                сразу добавляется выполненной.
+            session: сессия запроса.
+
+        Returns:
+            Id задачи.
+
+        Raises:
+            SQLAlchemyError - если возникла ошибка при добавлении.
+        """
+
+        done = {}
+        if result_url is not None:
+            now = utc_now()
+            done = {
+                "status": "done",
+                "result_url": result_url,
+                "started_at": now,
+                "finished_at": now,
+            }
+
+        row = await super()._add_data(
+            session=session,
+            returning=(cls.model.id,),
+            kind=kind,
+            params=params,
+            user_id=user_id,
+            **done,
+        )
+
+        return row.id
+
+    @classmethod
+    async def find_by_id(
+        cls,
+        job_id: int,
+        session: AsyncSession | None = None
+    ) -> AiJob | None:
+        """
+        Находит задачу.
+
+        Args:
+            job_id: id задачи.
+            session: сессия запроса.
+
+        Returns:
+            Задача или None, если задача не найдена.
+        """
+
+        return await super()._find_data_where(
+            cls.model.id == job_id,
+            session=session
+        )
+
+    @classmethod
+    async def find_status(
+        cls,
+        job_id: int,
+        session: AsyncSession | None = None
+    ) -> AiJob | None:
+        """
+        Находит задачу, загружая только поля состояния.
+
+        Args:
+            job_id: id задачи.
+            session: сессия запроса.
+
+        Returns:
+            Задача или None, если задача не найдена.
+        """
+
+        query = (
+            select(cls.model)
+            .options(load_only(*cls.status_fields, raiseload=True))
+            .where(cls.model.id == job_id)
+        )
+
+        async with open_session(session) as current:
+            result = await current.execute(query)
+            return result.scalar_one_or_none()
+
+    @classmethod
+    async def queue_position(
+        cls,
+        job_id: int,
+        session: AsyncSession | None = None
+    ) -> int:
+        """
+        Возвращает количество задач, которые стоят в очереди перед задачей.
+
+        Args:
+            job_id: id задачи.
+            session: сессия запроса.
+
+        Returns:
+            Количество задач впереди, 0 - задача следующая.
+        """
+
+        query = (
+            select(func.count())
+            .select_from(cls.model)
+            .where(cls.model.status == "queued", cls.model.id < job_id)
+        )
+
+        async with open_session(session) as current:
+            result = await current.execute(query)
+            return result.scalar()
+
+    @classmethod
+    async def claim_jobs(
+        cls,
+        limit: int = 1,
+        kind: str | None = None,
+        params: Dict[str, Any] | None = None,
+        lease: float = 300
+    ) -> list[AiJob]:
+        """
+        Забирает из очереди самые старые задачи и отмечает их running.
+
+        Строки, заблокированные другим обработчиком, пропускаются
+        (FOR UPDATE SKIP LOCKED). Забранные задачи заняты обработчиком 
+        lease секунд, пока он не продлит срок (см. extend_lease).
+
+        Args:
+            limit: максимальное количество задач.
+            kind: тип задач. Если None, то задачи любого типа.
+            params: параметры, которые должны быть у задач 
+                (JSONB-оператор @>). Если None, то любые.
+            lease: на сколько секунд задачи занимаются обработчиком.
+
+        Returns:
+            Список задач по порядку добавления.
+
+        Raises:
+            SQLAlchemyError - если возникла ошибка при обновлении.
+        """
+
+        now = utc_now()
+        conditions = [cls.model.status == "queued"]
+        if kind is not None:
+            conditions.append(cls.model.kind == kind)
+        if params is not None:
+            conditions.append(cls.model.params.contains(params))
+
+        queued = (
+            select(cls.model.id)
+            .where(*conditions)
+            .order_by(cls.model.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        query = (
+            update(cls.model)
+            .where(cls.model.id.in_(queued.scalar_subquery()))
+            .values(
+                status="running",
+                started_at=now,
+                locked_until=now + timedelta(seconds=lease),
+            )
+            .returning(cls.model)
+            .execution_options(synchronize_session=False)
+        )
+
+        async with open_session() as current:
+            try:
+                result = await current.execute(query)
+                jobs = sorted(result.scalars().all(), key=lambda job: job.id)
+                await current.commit()
+            except SQLAlchemyError as error:
+                await current.rollback()
+                raise error
+
+            return jobs
+
+    @classmethod
+    async def finish_job(cls, job_id: int, result_url: str) -> None:
+        """
+        Отмечает задачу выполненной.
+
+        Args:
+            job_id: id задачи.
+            result_url: URL готового изображения.
+
+        Raises:
+            SQLAlchemyError - если возникла ошибка при обновлении.
+        """
+
+        await super()._update_data_where(
+            cls.model.id == job_id,
+            status="done",
+            result_url=result_url,
+            finished_at=utc_now(),
+        )
+
+    @classmethod
+    async def update_progress(
+        cls,
+        job_ids: list[int],
+        step: int,
+        total: int
+    ) -> set[int]:
+        """
+        Сохраняет прогресс выполняемых задач.
+
+        Args:
+            job_ids: id задач, которые выполняются вместе.
+            step: количество выполненных шагов.
+            total: общее количество шагов.
+
+        Returns:
+            Id задач, для которых пользователь запросил отмену.
+
+        Raises:
+            SQLAlchemyError - если возникла ошибка при обновлении.
+        """
+
+        query = (
+            update(cls.model)
+            .where(cls.model.id.in_(job_ids))
+            .values(progress=step, total_steps=total)
+            .returning(cls.model.id, cls.model.cancel_requested)
+        )
+
+        async with open_session() as current:
+            try:
+                result = await current.execute(query)
+                cancelled = {row.id for row in result if row.cancel_requested}
+                await current.commit()
+            except SQLAlchemyError as error:
+                await current.rollback()
+                raise error
+
+            return cancelled
+
+    @classmethod
+    async def cancel_job(
+        cls,
+        job_id: int,
+        session: AsyncSession | None = None
+    ) -> str | None:
+        """
+        Отменяет задачу.
+
+        Задача в очереди отменяется сразу. Для выполняемой задачи 
+        запрашивается отмена, обработчик остановит ее на следующем шаге.
+
+        Args:
+            job_id: id задачи.
+            session: сессия запроса.
+
+        Returns:
+            Новое состояние задачи: cancelled - задача отменена, 
+            running - отмена запрошена, None - задача уже завершена.
+
+        Raises:
+            SQLAlchemyError - если возникла ошибка при обновлении.
+        """
+
+        cancelled = await super()._update_data_where(
+            cls.model.id == job_id,
+            cls.model.status == "queued",
+            session=session,
+            status="cancelled",
+            finished_at=utc_now(),
+        )
+        if cancelled:
+            return "cancelled"
+
+        requested = await super()._update_data_where(
+            cls.model.id == job_id,
+            cls.model.status == "running",
+            session=session,
+            cancel_requested=True,
+        )
+
+        return "running" if requested else None
+
+    @classmethod
+    async def mark_cancelled(cls, job_id: int) -> None:
+        """
+        Отмечает выполнявшуюся задачу отмененной.
+
+        Args:
+            job_id: id задачи.
+
+        Raises:
+            SQLAlchemyError - если возникла ошибка при обновлении.
+        """
+
+        await super()._update_data_where(
+            cls.model.id == job_id,
+            status="cancelled",
+            finished_at=utc_now(),
+        )
+
+    @classmethod
+    async def fail_job(cls, job_id: int, error: str) -> None:
+        """
+        Отмечает задачу, которая завершилась ошибкой.
+
+        Args:
+            job_id: id задачи.
+            error: текст ошибки.
+
+        Raises:
+            SQLAlchemyError - если возникла ошибка при обновлении.
+        """
+
+        await super()._update_data_where(
+            cls.model.id == job_id,
+            status="failed",
+            error=error,
+            finished_at=utc_now(),
+        )
+
+    @classmethod
+    async def extend_lease(cls, job_ids: list[int], lease: float) -> None:
+        """
+        Продлевает срок, на который задачи заняты обработчиком.
+
+        Args:
+            job_ids: id выполняемых задач.
+            lease: на сколько секунд от текущего времени продлить срок.
+
+        Raises:
+            SQLAlchemyError - если возникла ошибка при обновлении.
+        """
+
+        await super()._update_data_where(
+            cls.model.id.in_(job_ids),
+            cls.model.status == "running",
+            locked_until=utc_now() + timedelta(seconds=lease),
+        )
+
+    @classmethod
+    async def requeue_expired(cls) -> bool:
+        """
+        Возвращает в очередь выполняемые задачи с истекшим сроком - 
+        их обработчик остановился, не завершив задачу.
+
+        Задачи, которые выполняют работающие обработчики, не трогаются:
+        обработчики продлевают их срок.
+
+        Returns:
+            True - если такие задачи были, иначе False.
+
+        Raises:
+            SQLAlchemyError - если возникла ошибка при обновлении.
+        """
+
+        return await super()._update_data_where(
+            cls.model.status == "running",
+            or_(
+                cls.model.locked_until.is_(None),
+                cls.model.locked_until < utc_now(),
+            ),
+            status="queued",
+            started_at=None,
+            locked_until=None,
+        )
+
+
+@dataclass(frozen=True)
+class AddedUpload:
+    """
+    Результат AssetsDAO.add_upload.
+
+    ext - расширение, под которым файл хранится. new_asset - запись
+    о файле добавлена этим вызовом. ref_id - id ссылки пользователя, 
+    добавленной этим вызовом, None - если ссылка уже была.
+    """
+
+    ext: str
+    new_asset: bool = False
+    ref_id: int | None = None
+
+
+class AssetsDAO(BaseDAO[Asset]):
+    """Класс взаимодействия с данными таблиц assets и asset_refs."""
+
+    model = Asset
+
+    @classmethod
+    async def add_upload(
+        cls,
+        sha256: str,
+        ext: str,
+        size: int,
+        user_id: int | None,
+    ) -> AddedUpload:
+        """
+        Добавляет файл, если его еще нет, и ссылку пользователя на него.
+
+        Если файл с таким содержимым уже загружали, обновляется только 
+        время его последней загрузки. Изменения фиксируются сразу.
+
+        Args:
+            sha256: хэш содержимого файла.
+            ext: расширение файла с точкой.
+            size: размер файла в байтах.
+            user_id: id пользователя, который загрузил файл. None - без 
+                ссылки, такой файл удалится при очистке.
+
+        Returns:
+            Расширение, под которым файл хранится (если файл уже 
+            загружали с другим расширением, возвращается прежнее), и 
+            что из записей добавлено этим вызовом (см. discard_upload).
+
+        Raises:
+            SQLAlchemyError - если возникла ошибка при добавлении.
+        """
+
+        add_asset = (
+            pg_insert(Asset)
+            .values(sha256=sha256, ext=ext, size=size)
+            .on_conflict_do_update(
+                index_elements=[Asset.sha256],
+                set_={"used_at": utc_now()},
+            )
+            # xmax = 0 только у строки, которую вставил этот запрос, 
+            # а не обновил
+            .returning(Asset.ext, literal_column("xmax = 0"))
+        )
+        add_ref = (
+            pg_insert(AssetRef)
+            .values(user_id=user_id, sha256=sha256)
+            .on_conflict_do_nothing()
+            .returning(AssetRef.id)
+        )
+
+        async with open_session() as current:
+            try:
+                result = await current.execute(add_asset)
+                stored_ext, new_asset = result.one()
+                ref_id = None
+                if user_id is not None:
+                    result = await current.execute(add_ref)
+                    ref_id = result.scalar_one_or_none()
+                await current.commit()
+            except SQLAlchemyError as error:
+                await current.rollback()
+                raise error
+
+            return AddedUpload(stored_ext, new_asset, ref_id)
+
+    @classmethod
+    async def discard_upload(cls, sha256: str, added: AddedUpload) -> None:
+        """
+        Отменяет add_upload, если файл не удалось перенести на место.
+
+        Удаляется ссылка, добавленная этим вызовом, и запись о файле,
+        если ее добавил он же и на файл больше никто не сослался. 
+        Иначе запись указывала бы на несуществующий файл.
+
+        Args:
+            sha256: хэш содержимого файла.
+            added: результат add_upload.
+
+        Raises:
+            SQLAlchemyError - если возникла ошибка при удалении.
+        """
+
+        async with open_session() as current:
+            try:
+                if added.ref_id is not None:
+                    await current.execute(
+                        delete(AssetRef).where(AssetRef.id == added.ref_id)
+                    )
+                if added.new_asset:
+                    refs = select(AssetRef.id).where(AssetRef.sha256 == sha256)
+                    await current.execute(
+                        delete(Asset).where(
+                            Asset.sha256 == sha256, ~refs.exists()
+                        )
+                    )
+                await current.commit()
+            except SQLAlchemyError as error:
+                await current.rollback()
+                raise error
+
+    @classmethod
+    async def find_user_asset(
+        cls,
+        user_id: int,
+        sha256: str,
+        session: AsyncSession | None = None
+    ) -> Asset | None:
+        """
+        Находит файл, на который ссылается пользователь или его новелла.
+
+        Args:
+            user_id: id пользователя.
+            sha256: хэш содержимого файла.
+            session: сессия запроса.
+
+        Returns:
+            Файл или None, если у пользователя нет ссылки на него.
+        """
+
+        has_ref = (
+            select(AssetRef.id)
+            .where(AssetRef.user_id == user_id, AssetRef.sha256 == sha256)
+            .exists()
+        )
+
+        return await super()._find_data_where(
+            cls.model.sha256 == sha256,
+            has_ref,
+            session=session,
+        )
+
+    @classmethod
+    async def find_assets(
+        cls,
+        hashes: list[str],
+        session: AsyncSession | None = None
+    ) -> dict[str, Asset]:
+        """
+        Находит файлы по хэшам одним запросом.
+
+        Args:
+            hashes: хэши содержимого файлов.
+            session: сессия запроса.
+
+        Returns:
+            Файлы по хэшу. Хэшей, которых нет в базе, в словаре нет.
+        """
+
+        if not hashes:
+            return {}
+
+        async with open_session(session) as current:
+            result = await current.execute(
+                select(cls.model).where(cls.model.sha256.in_(hashes))
+            )
+            return {asset.sha256: asset for asset in result.scalars()}
+
+    @classmethod
+    async def claim_variants(cls, limit: int, lease: float) -> list[Asset]:
+        """
+        Забирает файлы, ожидающие обработки изображений.
+
+        Строки, заблокированные другим обработчиком, пропускаются 
+        (FOR UPDATE SKIP LOCKED). Забранные файлы откладываются на lease 
+        секунд, поэтому если обработчик упадет, файлы снова станут 
+        доступны после этого времени.
+
+        Args:
+            limit: максимальное количество файлов.
+            lease: на сколько секунд файлы откладываются для других 
+                обработчиков.
+
+        Returns:
+            Список файлов.
+
+        Raises:
+            SQLAlchemyError - если возникла ошибка при обновлении.
+        """
+
+        now = utc_now()
+        pending = (
+            select(cls.model.sha256)
+            .where(
+                cls.model.variants_status == "pending",
+                cls.model.variants_at <= now,
+            )
+            .order_by(cls.model.variants_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        query = (
+            update(cls.model)
+            .where(cls.model.sha256.in_(pending.scalar_subquery()))
+            .values(variants_at=now + timedelta(seconds=lease))
+            .returning(cls.model)
+            .execution_options(synchronize_session=False)
+        )
+
+        async with open_session() as current:
+            try:
+                result = await current.execute(query)
+                assets = list(result.scalars().all())
+                await current.commit()
+            except SQLAlchemyError as error:
+                await current.rollback()
+                raise error
+
+            return assets
+
+    @classmethod
+    async def finish_variants(
+        cls, 
+        sha256: str, 
+        status: str, 
+        variants: list[int] | None = None,
+    ) -> None:
+        """
+        Отмечает файл обработанным.
+
+        Args:
+            sha256: хэш содержимого файла.
+            status: done, skipped или failed.
+            variants: ширины готовых уменьшенных копий.
+
+        Raises:
+            SQLAlchemyError - если возникла ошибка при обновлении.
+        """
+
+        await super()._update_data_where(
+            cls.model.sha256 == sha256,
+            variants_status=status,
+            variants=variants or [],
+        )
+
+    @classmethod
+    async def link_novel(
+        cls,
+        user_id: int,
+        novel_id: int,
+        hashes: list[str],
+        session: AsyncSession | None = None
+    ) -> set[str]:
+        """
+        Добавляет ссылки новеллы на используемые в ней файлы.
+
+        Ссылки добавляются только на файлы пользователя - те, на которые
+        у него уже есть ссылка (загрузка или другая новелла). Иначе, 
+        зная хэш, можно было бы закрепить чужой файл и не дать очистке 
+        удалить его. Хэши чужих и несуществующих файлов пропускаются.
+
+        Args:
+            user_id: id владельца новеллы.
+            novel_id: id новеллы.
+            hashes: хэши содержимого файлов.
+            session: сессия запроса.
+
+        Returns:
+            Хэши файлов, на которые добавлены ссылки.
+
+        Raises:
+            SQLAlchemyError - если возникла ошибка при добавлении.
+        """
+
+        if not hashes:
+            return set()
+
+        owned = (
+            select(AssetRef.sha256)
+            .where(AssetRef.user_id == user_id, AssetRef.sha256.in_(hashes))
+            .distinct()
+        )
+
+        async with open_session(session) as current:
+            try:
+                result = await current.execute(owned)
+                linked = set(result.scalars().all())
+                if linked:
+                    await current.execute(
+                        pg_insert(AssetRef)
+                        .values([
+                            {
+                                "user_id": user_id,
+                                "novel_id": novel_id,
+                                "sha256": sha256,
+                            }
+                            for sha256 in sorted(linked)
+                        ])
+                        .on_conflict_do_nothing()
+                    )
+                if session is None:
+                    await current.commit()
+            except SQLAlchemyError as error:
+                await current.rollback()
+                raise error
+
+            return linked
+
+    @classmethod
+    async def delete_unused(cls, before: datetime) -> list[Row]:
+        """
+        Удаляет ссылки загрузок, созданные раньше before, и записи 
+        о файлах, на которые не осталось ссылок.
+
+        Файлы, строки которых заблокированы (их в этот момент загружают
+        заново или добавляют в новеллу), пропускаются (FOR UPDATE SKIP 
+        LOCKED) до следующей очистки. Сами файлы удаляются с диска 
+        вызывающим кодом после фиксации (см. app.constructor.cleenup).
+
+        Args:
+            before: время, раньше которого ссылки загрузок устарели.
+                Файлы, загруженные позже, не удаляются.
+
+        Returns:
+            Строки удаленных файлов с полями sha256 и ext.
+
+        Raises:
+            SQLAlchemyError - если возникла ошибка при удалении.
+        """
+
+        delete_refs = delete(AssetRef).where(
+            AssetRef.novel_id.is_(None),
+            AssetRef.created_at < before,
+        )
+        has_ref = (
+            select(AssetRef.id)
+            .where(AssetRef.sha256 == Asset.sha256)
+            .exists()
+        )
+        unused = (
+            select(Asset.sha256)
+            .where(Asset.used_at < before, ~has_ref)
+            .with_for_update(skip_locked=True)
+        )
+        delete_assets = (
+            delete(Asset)
+            # Ссылки проверяются еще раз после блокировки строки
+            .where(Asset.sha256.in_(unused.scalar_subquery()), ~has_ref)
+            .returning(Asset.sha256, Asset.ext)
+        )
+
+        async with open_session() as current:
+            try:
+                await current.execute(delete_refs)
+                result = await current.execute(delete_assets)
+                rows = list(result.all())
+                await current.commit()
+            except SQLAlchemyError as error:
+                await current.rollback()
+                raise error
+
+            return rows
+
+
+class UploadSessionsDAO(BaseDAO[UploadSession]):
+    """Класс взаимодействия с данными таблицы upload_sessions."""
+
+    model = UploadSession
+
+    @classmethod
+    async def add_session(
+        cls,
+        session_id: str,
+        user_id: int,
+        size: int,
+        ext: str,
+        sha256: str,
+    ) -> None:
+        """
+        Добавляет загрузку по частям.
+
+        Args:
+            session_id: id загрузки.
+            user_id: id пользователя.
+            size: размер файла в байтах.
+            ext: расширение файла с точкой.
+            sha256: хэш содержимого файла от клиента.
+
+        Raises:
+            SQLAlchemyError - если возникла ошибка при добавлении.
+        """
+
+        await super()._add_data(
+            id=session_id,
+            user_id=user_id,
+            size=size,
+            ext=ext,
+            sha256=sha256,
+        )
+
+    @classmethod
+    async def find_session(
+        cls,
+        session_id: str,
+        user_id: int,
+    ) -> UploadSession | None:
+        """
+        Находит загрузку пользователя.
+
+        Args:
+            session_id: id загрузки.
+            user_id: id пользователя.
+
+        Returns:
+            Загрузка или None, если ее нет или она чужая.
+        """
+
+        return await super()._find_data_where(
+            cls.model.id == session_id,
+            cls.model.user_id == user_id,
+        )
+
+    @classmethod
+    async def delete_session(cls, session_id: str) -> bool:
+        """
+        Удаляет загрузку.
+
+        Args:
+            session_id: id загрузки.
+
+        Returns:
+            True - если загрузка была удалена, иначе False.
+
+        Raises:
+            SQLAlchemyError - если возникла ошибка при удалении.
+        """
+
+        return await super()._delete_data_where(cls.model.id == session_id)
+
+    @classmethod
+    async def delete_expired(cls, before: datetime) -> list[str]:
+        """
+        Удаляет загрузки, начатые раньше before.
+
+        Args:
+            before: время, раньше которого загрузки устарели.
+
+        Returns:
+            Id удаленных загрузок.
+
+        Raises:
+            SQLAlchemyError - если возникла ошибка при удалении.
+        """
+
+        query = (
+            delete(cls.model)
+            .where(cls.model.created_at < before)
+            .returning(cls.model.id)
+        )
+
+        async with open_session() as current:
+            try:
+                result = await current.execute(query)
+                session_ids = list(result.scalars().all())
+                await current.commit()
+            except SQLAlchemyError as error:
+                await current.rollback()
+                raise error
+
+            return session_ids
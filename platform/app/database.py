@@ -2,8 +2,13 @@ from os import getenv
 from dotenv import load_dotenv
 
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 from sqlalchemy import pool
 
+import asyncio
+import json
+from typing import AsyncIterator
+
 
 load_dotenv()
 
@@ -35,6 +40,7 @@ def get_token_data() -> dict:
     return {
         "secret_key": getenv("SECRET_KEY"),
         "algorithm": getenv("ALGORITHM"),
+        "cache_size": int(getenv("TOKEN_CACHE_SIZE", "1024")),
     }
 
 
@@ -51,13 +57,262 @@ def get_email_data() -> dict:
         "platform_password": getenv("PLATFORM_PASSWORD"),
         "smtp_server": getenv("SMTP_SERVER"),
         "smtp_port": getenv("SMTP_PORT"),
+        "smtp_use_tls": getenv("SMTP_USE_TLS", "true").lower() == "true",
+        "smtp_pool_size": int(getenv("SMTP_POOL_SIZE", "2")),
+        "smtp_pool_check_after": float(getenv("SMTP_POOL_CHECK_AFTER", "30")),
+    }
+
+
+def get_outbox_data() -> dict:
+    """
+    Возвращает настройки фоновой отправки писем.
+
+    Returns:
+        Словарь содержащий размер пачки писем, интервал опроса очереди,
+        число попыток отправки и начальную задержку повтора в секундах.
+    """
+
+    return {
+        "batch_size": int(getenv("EMAIL_OUTBOX_BATCH", "50")),
+        "poll_interval": float(getenv("EMAIL_OUTBOX_POLL", "1")),
+        "max_attempts": int(getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "5")),
+        "backoff": float(getenv("EMAIL_OUTBOX_BACKOFF", "30")),
+    }
+
+
+def get_pool_data() -> dict:
+    """
+    Возвращает настройки пула соединений с базой данных.
+
+    Режим "queue" держит открытые соединения между запросами,
+    режим "null" открывает новое соединение на каждый запрос.
+
+    Returns:
+        Словарь содержащий настройки пула соединений.
+    """
+
+    return {
+        "pool_mode": getenv("DB_POOL_MODE", "queue"),
+        "pool_size": int(getenv("DB_POOL_SIZE", "10")),
+        "max_overflow": int(getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": int(getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+        "pool_warmup": int(getenv("DB_POOL_WARMUP", "5")),
+    }
+
+
+def get_hashing_data() -> dict:
+    """
+    Возвращает настройки пула потоков для хэширования паролей.
+
+    Returns:
+        Словарь содержащий число потоков и допустимую длину очереди.
+    """
+
+    return {
+        "workers": int(getenv("HASH_WORKERS", "4")),
+        "max_queue": int(getenv("HASH_MAX_QUEUE", "64")),
+    }
+
+
+def get_count_data() -> dict:
+    """
+    Возвращает настройки кэша общего количества новелл.
+
+    Returns:
+        Словарь содержащий режим подсчета и время жизни значения.
+    """
+
+    return {
+        "mode": getenv("NOVELS_COUNT_MODE", "exact"),
+        "ttl": float(getenv("NOVELS_COUNT_TTL", "60")),
+    }
+
+
+def get_ai_data() -> dict:
+    """
+    Возвращает настройки генерации изображений.
+
+    Returns:
+        Словарь содержащий флаг подключения маршрутов /robot, модель,
+        путь к LoRA-адаптеру, флаг загрузки модели при старте, интервал
+        опроса очереди задач, время ожидания результата, максимальный 
+        размер пакета генерации, время сбора пакета в секундах, папку 
+        и максимальный размер кэша результатов в мегабайтах, модель 
+        rembg, количество ее сессий и потоков ONNX Runtime, флаг 
+        объединения LoRA с UNet, папку объединенных UNet, настройки 
+        генерации на CPU (потоки torch, channels_last, bfloat16, 
+        attention slicing), число шагов и размер изображения по 
+        умолчанию и для отдельных режимов.
+    """
+
+    return {
+        "enabled": getenv("AI_ENABLED", "true").lower() == "true",
+        "model": getenv("AI_MODEL", "runwayml/stable-diffusion-v1-5"),
+        "lora_path": getenv("AI_LORA_PATH", "./app/ai/lora"),
+        "preload": getenv("AI_PRELOAD", "false").lower() == "true",
+        "poll_interval": float(getenv("AI_POLL_INTERVAL", "0.5")),
+        "job_timeout": float(getenv("AI_JOB_TIMEOUT", "600")),
+        "max_batch": int(getenv("AI_MAX_BATCH", "4")),
+        "batch_window": float(getenv("AI_BATCH_WINDOW", "0.25")),
+        "cache_dir": getenv("AI_CACHE_DIR", "./cache/ai"),
+        "cache_max_mb": int(getenv("AI_CACHE_MAX_MB", "512")),
+        "rembg_model": getenv("AI_REMBG_MODEL", "u2net"),
+        "rembg_sessions": int(getenv("AI_REMBG_SESSIONS", "1")),
+        "rembg_intra_threads": int(getenv("AI_REMBG_INTRA_THREADS", "0")),
+        "rembg_inter_threads": int(getenv("AI_REMBG_INTER_THREADS", "0")),
+        "lora_fuse": getenv("AI_LORA_FUSE", "true").lower() == "true",
+        "fused_unet_dir": getenv("AI_FUSED_UNET_DIR", "./cache/unet") or None,
+        "torch_threads": int(getenv("AI_TORCH_THREADS", "0")),
+        "torch_interop_threads": int(getenv("AI_TORCH_INTEROP_THREADS", "0")),
+        "channels_last": getenv("AI_CHANNELS_LAST", "true").lower() == "true",
+        "bf16": getenv("AI_BF16", "true").lower() == "true",
+        "attention_slicing": 
+            getenv("AI_ATTENTION_SLICING", "true").lower() == "true",
+        "steps": int(getenv("AI_STEPS", "25")),
+        "width": int(getenv("AI_WIDTH", "512")),
+        "height": int(getenv("AI_HEIGHT", "512")),
+        "mode_settings": json.loads(getenv("AI_MODE_SETTINGS", "{}")),
     }
 
 
+def get_upload_data() -> dict:
+    """
+    Возвращает настройки загрузки файлов.
+
+    Returns:
+        Словарь содержащий максимальный размер файла и запроса в байтах,
+        размер порции записи на диск в байтах и размер части файла 
+        при загрузке по частям в байтах.
+    """
+
+    return {
+        "max_file_size": int(getenv("UPLOAD_MAX_FILE_MB", "50")) * 1024 * 1024,
+        "max_request_size": 
+            int(getenv("UPLOAD_MAX_REQUEST_MB", "60")) * 1024 * 1024,
+        "chunk_size": int(getenv("UPLOAD_CHUNK_KB", "1024")) * 1024,
+        "session_chunk_size":
+            int(getenv("UPLOAD_SESSION_CHUNK_MB", "8")) * 1024 * 1024,
+    }
+
+
+def get_variants_data() -> dict:
+    """
+    Возвращает настройки обработки загруженных изображений.
+
+    Returns:
+        Словарь содержащий ширины уменьшенных копий, ширину копии для
+        карточки новеллы, качество WebP, размер пачки файлов и интервал
+        опроса в секундах.
+    """
+
+    widths = getenv("IMAGE_VARIANT_WIDTHS", "320,640,1280")
+
+    return {
+        "widths": sorted(int(width) for width in widths.split(",") if width),
+        "card_width": int(getenv("IMAGE_CARD_WIDTH", "320")),
+        "quality": int(getenv("IMAGE_WEBP_QUALITY", "80")),
+        "batch_size": int(getenv("IMAGE_VARIANTS_BATCH", "8")),
+        "poll_interval": float(getenv("IMAGE_VARIANTS_POLL", "5")),
+    }
+
+
+def create_database_engine(url: str, pool_data: dict) -> AsyncEngine:
+    """
+    Создает асинхронный движок базы данных с нужным пулом соединений.
+
+    Args:
+        url: url для асинхронного соединения с базой данных.
+        pool_data: настройки пула соединений.
+
+    Returns:
+        Асинхронный движок базы данных.
+    """
+
+    if pool_data["pool_mode"] == "null":
+        return create_async_engine(url, poolclass=pool.NullPool)
+
+    return create_async_engine(
+        url,
+        pool_size=pool_data["pool_size"],
+        max_overflow=pool_data["max_overflow"],
+        pool_timeout=pool_data["pool_timeout"],
+        pool_recycle=pool_data["pool_recycle"],
+        pool_pre_ping=pool_data["pool_pre_ping"],
+    )
+
+
+async def warmup_pool(engine: AsyncEngine, count: int) -> int:
+    """
+    Заранее открывает соединения пула, чтобы первые запросы 
+    не тратили время на установку соединения.
+
+    Args:
+        engine: асинхронный движок базы данных.
+        count: сколько соединений нужно открыть.
+
+    Returns:
+        Количество открытых соединений.
+
+    Raises:
+        OSError, SQLAlchemyError - если не удалось открыть соединение.
+    """
+
+    if isinstance(engine.pool, pool.NullPool):
+        return 0
+
+    count = min(count, engine.pool.size())
+    if count <= 0:
+        return 0
+
+    results = await asyncio.gather(
+        *(engine.connect().start() for _ in range(count)),
+        return_exceptions=True,
+    )
+    connections = [conn for conn in results if not isinstance(conn, Exception)]
+    await asyncio.gather(*(conn.close() for conn in connections))
+
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+
+    return len(connections)
+
+
 DB_URL = get_database_url()
 TOKEN_DATA = get_token_data()
 EMAIL_DATA = get_email_data()
+OUTBOX_DATA = get_outbox_data()
+POOL_DATA = get_pool_data()
+COUNT_DATA = get_count_data()
+HASHING_DATA = get_hashing_data()
+AI_DATA = get_ai_data()
+UPLOAD_DATA = get_upload_data()
+VARIANTS_DATA = get_variants_data()
+
+
+async_engine = create_database_engine(DB_URL, POOL_DATA)
+async_session_maker = async_sessionmaker(async_engine, expire_on_commit=False)
 
 
-async_engine = create_async_engine(DB_URL, poolclass=pool.NullPool)
-async_session_maker = async_sessionmaker(async_engine, expire_on_commit=False)
\ No newline at end of file
+async def get_session() -> AsyncIterator[AsyncSession]:
+    """
+    Выдает одну сессию на весь запрос.
+
+    Все изменения, сделанные за запрос, фиксируются одной транзакцией 
+    после завершения обработчика. Если обработчик завершился ошибкой, 
+    транзакция откатывается.
+
+    Yields:
+        Сессия для работы с базой данных.
+    """
+
+    async with async_session_maker() as session:
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
+        else:
+            await session.commit()
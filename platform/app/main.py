@@ -5,34 +5,110 @@ from fastapi.templating import Jinja2Templates
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 
-from app.users.router import router as router_users
-from app.ai.router import router as router_ai
+from app.users.router import router as router_users, redirect_message
 from app.constructor.novell_router import router as router_novel
 from app.constructor.upload_router import router as router_upload
 from app.constructor.cleenup import cleanup_orphan_files
+from app.constructor.storage import ImmutableStaticFiles, UploadStaticFiles
+from app.constructor.storage import BLOB_DIR
+from app.constructor.variants import variant_worker
+from app.database import async_engine, warmup_pool, POOL_DATA, AI_DATA
+from app.users.auth import hashing_pool, NotAuthorizedError
+from app.users.outbox import email_worker
+from app.users.smtp_pool import smtp_pool
 
 from typing import Optional
 
 
 app = FastAPI()
 app.include_router(router_users)
-app.include_router(router_ai)
 app.include_router(router_novel)
 app.include_router(router_upload)
 
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# Модели загружаются только в процессе app.ai.worker. Без AI_ENABLED
+# маршруты /robot не подключаются вовсе.
+if AI_DATA["enabled"]:
+    from app.ai.router import router as router_ai
+    app.include_router(router_ai)
+
+# Файлы по хэшу содержимого не меняются и кэшируются браузером бессрочно.
+# Монтируется раньше /uploads, чтобы перехватить эти URL.
+app.mount("/uploads/blobs", ImmutableStaticFiles(directory=BLOB_DIR), name="blobs")
+# Скрытые пути (например, uploads/.tmp с недописанными файлами) не отдаются.
+app.mount("/uploads", UploadStaticFiles(directory="uploads"), name="uploads")
 app.mount('/static', StaticFiles(directory="app/site/static"), name="static")
 templates = Jinja2Templates(directory="app/site/templates")
 
 
+@app.exception_handler(NotAuthorizedError)
+async def not_authorized_handler(request: Request, error: NotAuthorizedError):
+    """Перенаправляет неавторизованного пользователя на страницу входа."""
+
+    return redirect_message(
+        url="/auth/login/",
+        message=error.message,
+        error=True,
+    )
+
+
 scheduler = AsyncIOScheduler()
 scheduler.add_job(cleanup_orphan_files, IntervalTrigger(hours=24))
 scheduler.start()
 
 
+@app.on_event("startup")
+async def warmup_database():
+    """Открывает соединения с базой данных до приема первых запросов."""
+
+    await warmup_pool(async_engine, POOL_DATA["pool_warmup"])
+
+
+@app.on_event("startup")
+def start_email_worker():
+    """Запускает фоновую отправку писем из очереди."""
+
+    email_worker.start()
+
+
+@app.on_event("startup")
+def start_variant_worker():
+    """Запускает фоновую обработку загруженных изображений."""
+
+    variant_worker.start()
+
+
 @app.on_event("shutdown")
 def shutdown_scheduler():
     scheduler.shutdown()
+
+
+@app.on_event("shutdown")
+def shutdown_hashing_pool():
+    """Останавливает потоки хэширования паролей."""
+
+    hashing_pool.shutdown()
+
+
+@app.on_event("shutdown")
+async def shutdown_email_worker():
+    """Останавливает фоновую отправку писем."""
+
+    await email_worker.stop()
+    await smtp_pool.close()
+
+
+@app.on_event("shutdown")
+async def shutdown_variant_worker():
+    """Останавливает фоновую обработку изображений."""
+
+    await variant_worker.stop()
+
+
+@app.on_event("shutdown")
+async def shutdown_database():
+    """Закрывает соединения пула с базой данных."""
+
+    await async_engine.dispose()
     
 
 @app.get("/auth/register/", response_class=HTMLResponse)
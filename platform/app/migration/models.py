@@ -1,7 +1,8 @@
 from sqlalchemy.orm import Mapped, mapped_column, DeclarativeBase
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.asyncio import AsyncAttrs
-from sqlalchemy import JSON, ForeignKey, text, UniqueConstraint, String
+from sqlalchemy import ForeignKey, text, UniqueConstraint, String, Index, BigInteger
+from sqlalchemy.dialects.postgresql import JSONB
 
 from datetime import datetime
 
@@ -36,16 +37,223 @@ class User(Base):
 
 class Novell(Base):
     __tablename__ = "novels"
+    __table_args__ = (
+        # Название уникально в пределах пользователя. Индекс ограничения 
+        # используется и для поиска новелл пользователя по user_id.
+        UniqueConstraint("user_id", "title", name="uq_novels_user_id_title"),
+        # Индекс для постраничного вывода по курсору (created_at, id)
+        Index("ix_novels_created_at_id", "created_at", "id"),
+        # Индекс для поиска по содержимому data (оператор @>)
+        Index(
+            "ix_novels_data",
+            "data",
+            postgresql_using="gin",
+            postgresql_ops={"data": "jsonb_path_ops"},
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
-    title: Mapped[str] = mapped_column(nullable=False, default="Без названия", unique=True)
+    title: Mapped[str] = mapped_column(nullable=False, default="Без названия")
     preview: Mapped[str | None] = mapped_column(String(500), nullable=True)
     created_at: Mapped[datetime] = mapped_column(server_default=text("TIMEZONE('utc', now())"))
     updated_at: Mapped[datetime] = mapped_column(
         server_default=text("TIMEZONE('utc', now())"),
         onupdate=text("TIMEZONE('utc', now())")
     )
-    data: Mapped[dict] = mapped_column(JSON, nullable=False, default=dict)
+    data: Mapped[dict] = mapped_column(JSONB, nullable=False, default=dict)
+
+    user: Mapped["User"] = relationship(back_populates="novels")
+
+
+class EmailOutbox(Base):
+    """ORM-модель таблицы email_outbox - очереди писем на отправку."""
+
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        # Индекс для выборки писем, которые пора отправить
+        Index(
+            "ix_email_outbox_pending",
+            "next_attempt_at",
+            postgresql_where=text("status = 'pending'"),
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    recipient: Mapped[str] = mapped_column()
+    subject: Mapped[str] = mapped_column()
+    body: Mapped[str] = mapped_column()
+    # pending - ждет отправки, sent - отправлено, failed - попытки кончились
+    status: Mapped[str] = mapped_column(String(16), server_default="pending")
+    attempts: Mapped[int] = mapped_column(server_default=text("0"))
+    last_error: Mapped[str | None] = mapped_column(nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        server_default=text("TIMEZONE('utc', now())")
+    )
+    next_attempt_at: Mapped[datetime] = mapped_column(
+        server_default=text("TIMEZONE('utc', now())")
+    )
+    sent_at: Mapped[datetime | None] = mapped_column(nullable=True)
+
+
+
+class AiJob(Base):
+    """
+    ORM-модель таблицы ai_jobs - очереди задач генерации изображений.
+
+    Задачи добавляют веб-процессы, а выполняет отдельный процесс
+    app.ai.worker, в котором загружена модель.
+    """
+
+    __tablename__ = "ai_jobs"
+    __table_args__ = (
+        # Индекс для выборки задач, ожидающих выполнения
+        Index(
+            "ix_ai_jobs_queued",
+            "id",
+            postgresql_where=text("status = 'queued'"),
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int | None] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=True,
+    )
+    # generate - генерация по описанию, remove_bg - удаление фона
+    kind: Mapped[str] = mapped_column(String(16))
+    # queued - ждет, running - выполняется, done - готово, 
+    # failed - ошибка, cancelled - отменена
+    status: Mapped[str] = mapped_column(String(16), server_default="queued")
+    params: Mapped[dict] = mapped_column(JSONB, nullable=False, default=dict)
+    progress: Mapped[int] = mapped_column(server_default=text("0"))
+    total_steps: Mapped[int | None] = mapped_column(nullable=True)
+    cancel_requested: Mapped[bool] = mapped_column(server_default=text("false"))
+    # URL готового изображения в папке загрузок пользователя
+    result_url: Mapped[str | None] = mapped_column(nullable=True)
+    error: Mapped[str | None] = mapped_column(nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        server_default=text("TIMEZONE('utc', now())")
+    )
+    started_at: Mapped[datetime | None] = mapped_column(nullable=True)
+    # До какого времени выполняемая задача занята обработчиком. Обработчик
+    # продлевает срок, пока выполняет задачу; задача с истекшим сроком
+    # возвращается в очередь.
+    locked_until: Mapped[datetime | None] = mapped_column(nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(nullable=True)
+
+
+class Asset(Base):
+    """
+    ORM-модель таблицы assets - загруженных файлов.
+
+    Файл с одинаковым содержимым хранится один раз под именем по его
+    хэшу sha256 (см. app.constructor.storage).
+    """
+
+    __tablename__ = "assets"
+    __table_args__ = (
+        # Индекс для выборки файлов, ожидающих обработки изображений
+        Index(
+            "ix_assets_variants_pending",
+            "variants_at",
+            postgresql_where=text("variants_status = 'pending'"),
+        ),
+    )
 
-    user: Mapped["User"] = relationship(back_populates="novels")
\ No newline at end of file
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    # Расширение файла с точкой, с ним файл отдается по URL
+    ext: Mapped[str] = mapped_column(String(11))
+    size: Mapped[int] = mapped_column(BigInteger)
+    created_at: Mapped[datetime] = mapped_column(
+        server_default=text("TIMEZONE('utc', now())")
+    )
+    # Время последней загрузки. Файл без ссылок удаляется не раньше,
+    # чем через сутки после него.
+    used_at: Mapped[datetime] = mapped_column(
+        server_default=text("TIMEZONE('utc', now())")
+    )
+    # Обработка изображения (см. app.constructor.variants): pending - 
+    # ждет, done - варианты WebP готовы, skipped - файл не изображение, 
+    # failed - изображение не удалось прочитать
+    variants_status: Mapped[str] = mapped_column(
+        String(16), server_default="pending"
+    )
+    # Время, после которого файл можно взять в обработку
+    variants_at: Mapped[datetime] = mapped_column(
+        server_default=text("TIMEZONE('utc', now())")
+    )
+    # Ширины готовых уменьшенных копий
+    variants: Mapped[list[int]] = mapped_column(
+        JSONB, server_default=text("'[]'::jsonb")
+    )
+
+
+class AssetRef(Base):
+    """
+    ORM-модель таблицы asset_refs - ссылок пользователей и новелл 
+    на загруженные файлы.
+
+    Ссылка без novel_id появляется при загрузке файла пользователем,
+    ссылка с novel_id - при сохранении новеллы, в которой файл 
+    используется. Файл, на который не осталось ссылок, удаляется.
+    """
+
+    __tablename__ = "asset_refs"
+    __table_args__ = (
+        Index(
+            "uq_asset_refs_upload",
+            "user_id",
+            "sha256",
+            unique=True,
+            postgresql_where=text("novel_id IS NULL"),
+        ),
+        Index(
+            "uq_asset_refs_novel",
+            "novel_id",
+            "sha256",
+            unique=True,
+            postgresql_where=text("novel_id IS NOT NULL"),
+        ),
+        # Индекс для поиска файлов без ссылок
+        Index("ix_asset_refs_sha256", "sha256"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE")
+    )
+    novel_id: Mapped[int | None] = mapped_column(
+        ForeignKey("novels.id", ondelete="CASCADE"),
+        nullable=True,
+    )
+    sha256: Mapped[str] = mapped_column(
+        ForeignKey("assets.sha256", ondelete="CASCADE")
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        server_default=text("TIMEZONE('utc', now())")
+    )
+
+
+class UploadSession(Base):
+    """
+    ORM-модель таблицы upload_sessions - незавершенных загрузок файлов
+    по частям (см. app.constructor.upload_router).
+
+    Полученные данные хранятся во временном файле, их размер на диске 
+    и есть смещение, с которого продолжается загрузка.
+    """
+
+    __tablename__ = "upload_sessions"
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE")
+    )
+    size: Mapped[int] = mapped_column(BigInteger)
+    ext: Mapped[str] = mapped_column(String(11))
+    # Хэш sha256 файла от клиента, сверяется после загрузки
+    sha256: Mapped[str] = mapped_column(String(64))
+    created_at: Mapped[datetime] = mapped_column(
+        server_default=text("TIMEZONE('utc', now())")
+    )
@@ -0,0 +1,99 @@
+from abc import ABC, abstractmethod
+import asyncio
+
+
+class PollingWorker(ABC):
+    """
+    Базовый класс фоновых обработчиков, которые опрашивают очередь в
+    базе данных.
+
+    Подкласс обязан реализовать run_once - обработку одной пачки. Цикл
+    run вызывает ее, пока есть работа, а потом ждет poll_interval 
+    секунд или вызова notify. Ошибка пачки записывается в лог и не
+    останавливает обработчик.
+    """
+
+    # Название обработчика в логе
+    log_name = "Worker"
+
+    def __init__(self, poll_interval: float, batch_size: int = 1):
+        """
+        Args:
+            poll_interval: интервал опроса в секундах.
+            batch_size: максимальное число задач в одной пачке.
+        """
+
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    @abstractmethod
+    async def run_once(self) -> int:
+        """
+        Обрабатывает одну пачку.
+
+        Returns:
+            Количество задач, взятых в обработку.
+        """
+
+    def has_more(self, taken: int) -> bool:
+        """
+        Проверяет, есть ли смысл сразу обрабатывать следующую пачку.
+
+        Args:
+            taken: сколько задач взято в последней пачке.
+
+        Returns:
+            True - если пачка полная и в очереди могут быть еще задачи.
+        """
+
+        return taken >= self.batch_size
+
+    async def run(self) -> None:
+        """Обрабатывает очередь, пока обработчик не остановлен."""
+
+        while True:
+            try:
+                taken = await self.run_once()
+            except Exception as error:
+                # Любая ошибка пачки не должна останавливать обработчик,
+                # CancelledError не перехватывается
+                print(f"{self.log_name} error: {error!r}")
+                taken = 0
+
+            if self.has_more(taken):
+                continue
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(),
+                    timeout=self.poll_interval,
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    def notify(self) -> None:
+        """Будит обработчик, чтобы он не ждал конца интервала опроса."""
+
+        self._wakeup.set()
+
+    def start(self) -> None:
+        """Запускает обработчик в текущем цикле событий."""
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Останавливает обработчик."""
+
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
@@ -509,24 +509,20 @@ document.addEventListener("DOMContentLoaded", () => {
         const file = e.target.files[0];
         if (!file) return;
 
-        const reader = new FileReader();
-        reader.onload = async function () {
-            const base64 = reader.result.split(",")[1];
-            robotSay("Удаляю фон ✂️");
-
-            const res = await fetch("/robot/remove-bg", {
-                method: "POST",
-                headers: {"Content-Type": "application/json"},
-                body: JSON.stringify({ image: base64 })
-            });
+        // Исходное изображение загружается один раз, результат 
+        // сохраняется на сервере, и браузер получает только его URL
+        const source = await uploadFile(file);
+        if (!source) return;
+        robotSay("Удаляю фон ✂️");
 
-            const data = await res.json();
-            if (!data.image) return;
+        const res = await fetch("/robot/remove-bg", {
+            method: "POST",
+            headers: {"Content-Type": "application/json"},
+            body: JSON.stringify({ url: source })
+        });
 
-            const url = await uploadBase64(data.image, "removed_bg.png");
-            if (url) createSprite(url, 100, 100);
-        };
-        reader.readAsDataURL(file);
+        const data = await res.json();
+        if (data.url) createSprite(data.url, 100, 100);
     });
 
 });
@@ -559,7 +555,7 @@ function promptUser(text) {
     return prompt(text);
 }
 
-// вызов FastAPI
+// вызов FastAPI: генерация выполняется в фоне, прогресс приходит через SSE
 async function generateAI(prompt, mode) {
     const res = await fetch("/robot/generate", {
         method: "POST",
@@ -569,12 +565,19 @@ async function generateAI(prompt, mode) {
 
     const data = await res.json();
 
-    if (!data.image) return;
+    if (!data.job_id) return;
 
-    // Загружаем сгенерированное изображение на сервер
-    const url = await uploadBase64(data.image, `${mode}_${Date.now()}.png`);
+    const job = await waitForJob(data.job_id);
+    if (job.status !== "done") {
+        robotDone(job.status === "cancelled" ? "Отменено" : "Не получилось 😢");
+        return;
+    }
+
+    // Изображение уже сохранено на сервере в папке пользователя
+    const url = job.url;
     if (!url) return;
 
+    robotDone();
     if (mode === "background") {
         bgImage = url;
         scene.style.background = `url(${bgImage}) center/cover`;
@@ -584,6 +587,36 @@ async function generateAI(prompt, mode) {
     }
 }
 
+// ждет завершения задачи и показывает место в очереди и прогресс
+function waitForJob(jobId) {
+    return new Promise(resolve => {
+        const events = new EventSource(`/robot/jobs/${jobId}/events`);
+
+        events.addEventListener("progress", e => {
+            const state = JSON.parse(e.data);
+            if (state.status === "queued") {
+                robotThinking(`В очереди: ${state.position + 1}`);
+            } else if (state.total_steps) {
+                robotThinking(`Генерирую ${state.progress}/${state.total_steps}`);
+            } else {
+                robotThinking("Генерирую");
+            }
+        });
+
+        for (const status of ["done", "failed", "cancelled"]) {
+            events.addEventListener(status, e => {
+                events.close();
+                resolve(JSON.parse(e.data));
+            });
+        }
+
+        events.onerror = () => {
+            events.close();
+            resolve({ status: "failed" });
+        };
+    });
+}
+
 document.addEventListener("mousemove", e => {
     document.querySelectorAll(".pupil").forEach(pupil => {
         const rect = pupil.parentElement.getBoundingClientRect();
@@ -649,8 +682,23 @@ setInterval(draw,30);
 
 
 
+// файлы больше этого размера загружаются по частям
+const RESUMABLE_SIZE = 8 * 1024 * 1024;
+
 // загрузка файла на сервер и получение постоянного URL
 async function uploadFile(file) {
+    // загрузке по частям нужен хэш файла, а crypto.subtle есть
+    // только в защищенном контексте (https или localhost)
+    const canHash = window.crypto && crypto.subtle;
+    if (file.size > RESUMABLE_SIZE && canHash) {
+        try {
+            return await uploadResumable(file);
+        } catch (e) {
+            alert("Ошибка загрузки: " + e.message);
+            return null;
+        }
+    }
+
     const formData = new FormData();
     formData.append("file", file);
     const response = await fetch("/upload/file/", {
@@ -671,23 +719,76 @@ async function uploadFile(file) {
     return data.url;
 }
 
-async function uploadBase64(base64Data, filename = "image.png") {
-    // Если передана строка с префиксом "data:image/...;base64,", отрезаем его
-    let rawBase64 = base64Data;
-    if (base64Data.includes(',')) {
-        rawBase64 = base64Data.split(',')[1];
-    }
-    const byteCharacters = atob(rawBase64);
-    const byteNumbers = new Array(byteCharacters.length);
-    for (let i = 0; i < byteCharacters.length; i++) {
-        byteNumbers[i] = byteCharacters.charCodeAt(i);
+// хэш sha256 файла для проверки на сервере
+async function fileSha256(file) {
+    const digest = await crypto.subtle.digest("SHA-256", await file.arrayBuffer());
+    return Array.from(new Uint8Array(digest))
+        .map(b => b.toString(16).padStart(2, "0")).join("");
+}
+
+async function uploadRequest(url, options = {}) {
+    const response = await fetch(url, { credentials: "include", ...options });
+    const data = await response.json().catch(() => ({}));
+    if (!response.ok && response.status !== 409) {
+        throw new Error(data.detail || "Неизвестная");
     }
-    const byteArray = new Uint8Array(byteNumbers);
-    const blob = new Blob([byteArray], { type: "image/png" });
-    const file = new File([blob], filename, { type: "image/png" });
-    return await uploadFile(file);
+    return data;
 }
 
+// загрузка большого файла по частям: после обрыва связи
+// загрузка продолжается с того места, где остановилась
+async function uploadResumable(file) {
+    const session = await uploadRequest("/upload/sessions/", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({
+            filename: file.name,
+            size: file.size,
+            sha256: await fileSha256(file)
+        })
+    });
+    const sessionUrl = `/upload/sessions/${session.id}`;
+    let offset = session.offset;
+    let retries = 0;
+
+    while (offset < file.size) {
+        const chunk = file.slice(offset, offset + session.chunk_size);
+        try {
+            const data = await uploadRequest(sessionUrl, {
+                method: "PUT",
+                headers: { "Upload-Offset": String(offset) },
+                body: chunk
+            });
+            if (data.busy) {
+                // прежний запрос с этой частью еще пишется на сервере
+                await new Promise(r => setTimeout(r, 1000));
+            }
+            offset = data.offset;
+            retries = 0;
+        } catch (e) {
+            if (e instanceof TypeError && retries < 5) {
+                // связь оборвалась: узнаем, сколько дошло, и продолжаем
+                retries++;
+                await new Promise(r => setTimeout(r, 1000 * 2 ** retries));
+                try {
+                    offset = (await uploadRequest(sessionUrl)).offset;
+                } catch (_) {
+                    // смещение придет в ответе 409 на следующую часть
+                }
+            } else {
+                throw e;
+            }
+        }
+    }
+
+    let data = await uploadRequest(`${sessionUrl}/complete`, { method: "POST" });
+    while (data.busy) {
+        await new Promise(r => setTimeout(r, 1000));
+        data = await uploadRequest(`${sessionUrl}/complete`, { method: "POST" });
+    }
+    if (!data.url) throw new Error(data.detail || "Неизвестная");
+    return data.url;
+}
 
 
 // ---------- СОХРАНЕНИЕ ПРОЕКТА НА БЭКЕНД ----------
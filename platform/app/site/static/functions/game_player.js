@@ -147,7 +147,10 @@ function resizeSceneToWindow() {
 async function loadGame(novelId) {
     try {
         // URL согласно вашему роуту – /novels/game/{id}/data
-        const res = await fetch(`/novels/game/${novelId}/data`);
+        // Сцена не бывает шире окна, поэтому изображения запрашиваются
+        // в копиях не шире экрана
+        const width = Math.ceil(window.innerWidth * (window.devicePixelRatio || 1));
+        const res = await fetch(`/novels/game/${novelId}/data?width=${width}`);
         if (!res.ok) throw new Error(`HTTP ${res.status}`);
         const data = await res.json();
 
@@ -1,9 +1,11 @@
 let currentPage = 0;
+// cursors[i] - курсор i-й страницы, пустая строка - первая страница
+const cursors = [''];
 const limit = 6;
 
 async function loadNovels() {
-    const skip = currentPage * limit;
-    const res = await fetch(`/novels/public/?skip=${skip}&limit=${limit}`);
+    const cursor = encodeURIComponent(cursors[currentPage]);
+    const res = await fetch(`/novels/public/?cursor=${cursor}&limit=${limit}`);
     if (!res.ok) {
         console.error('Ошибка загрузки');
         return;
@@ -17,7 +19,8 @@ async function loadNovels() {
         for (let n of data.items) {
             const card = document.createElement('div');
             card.className = 'novel-card';
-            const previewUrl = n.preview ? n.preview : '/static/default_preview.png';
+            // thumbnail - уменьшенная копия превью для карточки
+            const previewUrl = n.thumbnail || n.preview || '/static/default_preview.png';
             card.innerHTML = `
                 <div class="preview" style="background-image: url('${previewUrl}');"></div>
                 <div class="title">${escapeHtml(n.title)}</div>
@@ -27,6 +30,7 @@ async function loadNovels() {
         }
     }
     document.getElementById('prevPageBtn').disabled = currentPage === 0;
-    document.getElementById('nextPageBtn').disabled = data.items.length < limit;
+    cursors[currentPage + 1] = data.next_cursor;
+    document.getElementById('nextPageBtn').disabled = !data.next_cursor;
     document.getElementById('pageInfo').innerText = `Страница ${currentPage + 1}`;
 }
\ No newline at end of file
@@ -1,12 +1,19 @@
+from fastapi import Request, HTTPException
 from passlib.context import CryptContext
 from pydantic import EmailStr
 from jose import jwt
-from email.mime.text import MIMEText
+from jose.exceptions import ExpiredSignatureError, JWTError
 
 from datetime import datetime, timedelta, timezone
-from aiosmtplib import SMTP
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Any
+import asyncio
+import hashlib
+import time
 
-from app.database import TOKEN_DATA, EMAIL_DATA
+from app.database import TOKEN_DATA, HASHING_DATA
 
 
 def create_access_token(email: EmailStr, user_id: int, for_email: bool = False) -> str:
@@ -39,6 +46,116 @@ def create_access_token(email: EmailStr, user_id: int, for_email: bool = False)
     return token
 
 
+class VerifiedTokenCache:
+    """
+    LRU-кэш токенов, у которых уже проверена подпись.
+
+    Ключом служит sha256 токена, поэтому сами токены в памяти не хранятся.
+    Запись удаляется, когда у токена истекает срок годности, после этого
+    токен снова проходит jwt.decode и получает ExpiredSignatureError.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        """
+        Args:
+            max_size: максимальное число токенов в кэше.
+        """
+
+        self.max_size = max_size
+        self._items: OrderedDict[bytes, dict] = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        """Возвращает ключ токена в кэше."""
+
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> dict | None:
+        """
+        Возвращает данные проверенного токена.
+
+        Args:
+            token: токен пользователя.
+
+        Returns:
+            Данные токена или None, если токена нет в кэше или он истек.
+        """
+
+        key = self._key(token)
+        data = self._items.get(key)
+        if data is None:
+            return None
+
+        expire = data.get("exp")
+        if expire is not None and expire <= time.time():
+            del self._items[key]
+            return None
+
+        self._items.move_to_end(key)
+        return data
+
+    def put(self, token: str, data: dict) -> None:
+        """
+        Сохраняет данные проверенного токена.
+
+        Args:
+            token: токен пользователя.
+            data: данные из токена.
+        """
+
+        if self.max_size <= 0:
+            return
+
+        key = self._key(token)
+        self._items[key] = data
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        """Очищает кэш."""
+
+        self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+token_cache = VerifiedTokenCache(TOKEN_DATA["cache_size"])
+
+
+def decode_token_claims(token: str) -> dict:
+    """
+    Проверяет подпись токена и возвращает все его данные.
+
+    Проверенные токены хранятся в token_cache, поэтому повторная
+    проверка того же токена не вычисляет подпись заново.
+
+    Args:
+        token: токен пользователя.
+
+    Returns:
+        Данные из токена.
+
+    Raises:
+        ExpiredSignatureError - если у токена истек срок годности.
+        JWTError - если с токеном какая то проблема.
+    """
+
+    data = token_cache.get(token)
+    if data is not None:
+        return data
+
+    data = jwt.decode(
+        token,
+        TOKEN_DATA['secret_key'], 
+        TOKEN_DATA['algorithm'],
+    )
+    token_cache.put(token, data)
+
+    return data
+
+
 def decode_access_token(token: str, for_email: bool = False) -> int | EmailStr:
     """
     Расшифровывает токен пользователя.
@@ -55,11 +172,7 @@ def decode_access_token(token: str, for_email: bool = False) -> int | EmailStr:
         JWTError - если с токеном какая то проблема.
     """
 
-    data = jwt.decode(
-        token,
-        TOKEN_DATA['secret_key'], 
-        TOKEN_DATA['algorithm'],
-    )
+    data = decode_token_claims(token)
 
     if for_email :
         return data['email']
@@ -67,6 +180,78 @@ def decode_access_token(token: str, for_email: bool = False) -> int | EmailStr:
     return data["user_id"]
 
 
+@dataclass(frozen=True)
+class TokenClaims:
+    """Данные авторизованного пользователя из токена."""
+
+    user_id: int
+    email: EmailStr | None = None
+    exp: int | None = None
+
+
+class NotAuthorizedError(Exception):
+    """Пользователь не авторизован или его токен недействителен."""
+
+    def __init__(self, message: str):
+        """
+        Args:
+            message: сообщение для пользователя.
+        """
+
+        super().__init__(message)
+        self.message = message
+
+
+def get_token_claims(request: Request) -> TokenClaims:
+    """
+    Зависимость, которая один раз расшифровывает токен из cookie.
+
+    Args:
+        request: запрос пользователя.
+
+    Returns:
+        Данные пользователя из токена.
+
+    Raises:
+        NotAuthorizedError - если токена нет или он недействителен.
+    """
+
+    token = request.cookies.get("users_access_token")
+    if not token:
+        raise NotAuthorizedError("Пользователь не авторизован.")
+
+    try:
+        data = decode_token_claims(token)
+        return TokenClaims(
+            user_id=data["user_id"],
+            email=data.get("email"),
+            exp=data.get("exp"),
+        )
+    except (ExpiredSignatureError, JWTError, KeyError):
+        raise NotAuthorizedError("Ошибка авторизации.")
+
+
+def get_api_token_claims(request: Request) -> TokenClaims:
+    """
+    То же, что get_token_claims, но для JSON API: вместо перенаправления
+    на страницу входа возвращается ответ 401.
+
+    Args:
+        request: запрос пользователя.
+
+    Returns:
+        Данные пользователя из токена.
+
+    Raises:
+        HTTPException - если токена нет или он недействителен.
+    """
+
+    try:
+        return get_token_claims(request)
+    except NotAuthorizedError as error:
+        raise HTTPException(status_code=401, detail=error.message)
+
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
@@ -99,39 +284,124 @@ def verify_password(password: str, hash: str) -> bool:
     return pwd_context.verify(password, hash)
 
 
-async def send_verification_email(
-        email: EmailStr,
-        title: str,
-        text: str,
-        url_for_token: str,
-        user_id: int
-) -> None:
+class HashingOverloadError(Exception):
+    """Очередь на хэширование паролей переполнена."""
+
+
+class HashingPool:
     """
-    Отправляет письмо верификации на почту пользователя.
+    Ограниченный пул потоков для хэширования паролей.
 
-    Args:
-        email: электронная почта пользователя.
-        title: заголовок письма.
-        text: текст письма.
-        url_for_token: маршрут, на который перейдет пользователь, 
-            нажав на ссылку.
-    """
-
-    token = create_access_token(email=email, user_id=user_id, for_email=True)
-    link = f"http://localhost:8000{url_for_token}?token={token}"
-
-    msg = MIMEText(f"{text} {link}")
-    msg["Subject"] = title
-    msg["From"] = EMAIL_DATA["platform_email"] 
-    msg["To"] = email
-
-    async with SMTP(
-        hostname=EMAIL_DATA["smtp_server"],
-        port=EMAIL_DATA["smtp_port"],
-        use_tls=True
-    ) as server:
-        await server.login(
-            EMAIL_DATA["platform_email"], 
-            EMAIL_DATA["platform_password"],
+    bcrypt отпускает GIL, поэтому хэширование в потоках не блокирует 
+    цикл событий и выполняется параллельно. Если задач больше, чем 
+    workers + max_queue, то новые задачи сразу отклоняются.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        """
+        Args:
+            workers: число потоков.
+            max_queue: сколько задач может ждать свободный поток.
+        """
+
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix="password-hash",
         )
-        await server.send_message(msg)
\ No newline at end of file
+        self.metrics = {
+            "submitted": 0,
+            "rejected": 0,
+            "completed": 0,
+            "pending": 0,
+            "max_pending": 0,
+            "wait_seconds": 0.0,
+            "run_seconds": 0.0,
+        }
+
+    async def run(self, function: Callable[..., Any], *args) -> Any:
+        """
+        Выполняет функцию в пуле потоков.
+
+        Args:
+            function: функция хэширования.
+            args: аргументы функции.
+
+        Returns:
+            Результат функции.
+
+        Raises:
+            HashingOverloadError - если очередь переполнена.
+        """
+
+        metrics = self.metrics
+        if metrics["pending"] >= self.workers + self.max_queue:
+            metrics["rejected"] += 1
+            raise HashingOverloadError("Очередь на хэширование переполнена")
+
+        def job() -> tuple[Any, float, float]:
+            started = time.perf_counter()
+            result = function(*args)
+            return result, started, time.perf_counter()
+
+        metrics["submitted"] += 1
+        metrics["pending"] += 1
+        metrics["max_pending"] = max(metrics["max_pending"], metrics["pending"])
+        queued = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result, started, finished = await loop.run_in_executor(
+                self._executor, 
+                job,
+            )
+        finally:
+            metrics["pending"] -= 1
+
+        metrics["completed"] += 1
+        metrics["wait_seconds"] += started - queued
+        metrics["run_seconds"] += finished - started
+        return result
+
+    def shutdown(self) -> None:
+        """Останавливает потоки пула."""
+
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+hashing_pool = HashingPool(**HASHING_DATA)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    Хэширует пароль пользователя, не блокируя цикл событий.
+
+    Args:
+        password: пароль пользователя.
+    
+    Returns:
+        Хэш пароля.
+
+    Raises:
+        HashingOverloadError - если очередь на хэширование переполнена.
+    """
+
+    return await hashing_pool.run(get_password_hash, password)
+
+
+async def verify_password_async(password: str, hash: str) -> bool:
+    """
+    Сравнивает пароли, не блокируя цикл событий.
+
+    Args:
+        password: пароль введённый пользователем.
+        hash: хэш настоящего пароля пользователя.
+    
+    Returns:
+        True - если пароль совпал, False иначе.
+
+    Raises:
+        HashingOverloadError - если очередь на хэширование переполнена.
+    """
+
+    return await hashing_pool.run(verify_password, password, hash)
@@ -0,0 +1,193 @@
+from aiosmtplib import SMTPException
+from pydantic import EmailStr
+from sqlalchemy.ext.asyncio import AsyncSession
+from email.mime.text import MIMEText
+
+
+from app.dao.dao_models import OutboxDAO, call_after_commit
+from app.database import EMAIL_DATA, OUTBOX_DATA
+from app.migration.models import EmailOutbox
+from app.polling import PollingWorker
+from app.users.auth import create_access_token
+from app.users.smtp_pool import SMTPPool, smtp_pool
+
+
+def build_message(email: EmailOutbox) -> MIMEText:
+    """
+    Формирует письмо из записи очереди.
+
+    Args:
+        email: запись очереди писем.
+
+    Returns:
+        Письмо для отправки.
+    """
+
+    msg = MIMEText(email.body)
+    msg["Subject"] = email.subject
+    msg["From"] = EMAIL_DATA["platform_email"]
+    msg["To"] = email.recipient
+
+    return msg
+
+
+class EmailOutboxWorker(PollingWorker):
+    """
+    Фоновый обработчик очереди писем email_outbox.
+
+    Забирает письма пачками и отправляет каждую пачку через одно
+    соединение из пула SMTP-соединений. Неотправленные письма
+    повторяются с экспоненциальной задержкой, после max_attempts
+    попыток письмо отмечается failed.
+    """
+
+    log_name = "Email outbox"
+
+    # На сколько секунд забранные письма скрываются от других обработчиков
+    lease = 300
+
+    def __init__(
+        self,
+        batch_size: int = 50,
+        poll_interval: float = 1,
+        max_attempts: int = 5,
+        backoff: float = 30,
+        pool: SMTPPool | None = None,
+    ):
+        """
+        Args:
+            batch_size: максимальное число писем в одной пачке.
+            poll_interval: интервал опроса очереди в секундах.
+            max_attempts: число попыток отправки одного письма.
+            backoff: задержка перед второй попыткой в секундах,
+                каждая следующая задержка вдвое больше.
+            pool: пул SMTP-соединений. Если None, то используется 
+                общий smtp_pool.
+        """
+
+        super().__init__(poll_interval, batch_size)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.pool = pool or smtp_pool
+
+    def retry_delay(self, attempts: int) -> float:
+        """
+        Возвращает задержку перед следующей попыткой.
+
+        Args:
+            attempts: сколько попыток уже сделано.
+
+        Returns:
+            Задержка в секундах.
+        """
+
+        return self.backoff * 2 ** (attempts - 1)
+
+    async def _send_batch(
+        self,
+        emails: list[EmailOutbox],
+    ) -> tuple[list[int], dict[int, str]]:
+        """
+        Отправляет пачку писем через одно SMTP-соединение.
+
+        Args:
+            emails: письма для отправки.
+
+        Returns:
+            Id отправленных писем и ошибки неотправленных писем по id.
+        """
+
+        sent, errors = [], {}
+        try:
+            async with self.pool.connection() as server:
+                for email in emails:
+                    try:
+                        await server.send_message(build_message(email))
+                        sent.append(email.id)
+                    except SMTPException as error:
+                        errors[email.id] = repr(error)
+                        if not server.is_connected:
+                            raise
+        except (SMTPException, OSError) as error:
+            # Соединение не удалось или оборвалось,
+            # все неотправленные письма повторяются
+            for email in emails:
+                if email.id not in sent:
+                    errors.setdefault(email.id, repr(error))
+
+        return sent, errors
+
+    async def run_once(self) -> int:
+        """
+        Обрабатывает одну пачку писем.
+
+        Returns:
+            Количество писем, взятых из очереди.
+        """
+
+        emails = await OutboxDAO.claim_batch(self.batch_size, self.lease)
+        if not emails:
+            return 0
+
+        sent, errors = await self._send_batch(emails)
+        await OutboxDAO.mark_sent(sent)
+        for email in emails:
+            if email.id not in errors:
+                continue
+            if email.attempts >= self.max_attempts:
+                await OutboxDAO.mark_failed(email.id, errors[email.id])
+            else:
+                await OutboxDAO.mark_retry(
+                    email.id,
+                    errors[email.id],
+                    self.retry_delay(email.attempts),
+                )
+
+        return len(emails)
+
+
+email_worker = EmailOutboxWorker(**OUTBOX_DATA)
+
+
+async def enqueue_verification_email(
+        email: EmailStr,
+        title: str,
+        text: str,
+        url_for_token: str,
+        user_id: int,
+        session: AsyncSession | None = None
+) -> int:
+    """
+    Ставит письмо верификации в очередь на отправку.
+
+    Письмо отправит email_worker после фиксации сессии.
+
+    Args:
+        email: электронная почта пользователя.
+        title: заголовок письма.
+        text: текст письма.
+        url_for_token: маршрут, на который перейдет пользователь,
+            нажав на ссылку.
+        user_id: id пользователя.
+        session: сессия запроса.
+
+    Returns:
+        Id письма в очереди.
+
+    Raises:
+        SQLAlchemyError - если не удалось добавить письмо в очередь.
+    """
+
+    token = create_access_token(email=email, user_id=user_id, for_email=True)
+    link = f"http://localhost:8000{url_for_token}?token={token}"
+
+    email_id = await OutboxDAO.add_email(
+        recipient=email,
+        subject=title,
+        body=f"{text} {link}",
+        session=session,
+    )
+
+    call_after_commit(session, email_worker.notify)
+
+    return email_id
@@ -1,17 +1,21 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Request, Depends
 from fastapi.responses import RedirectResponse
 from pydantic import ValidationError
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose.exceptions import ExpiredSignatureError, JWTError
 import shutil
 from pathlib import Path
 
+from app.database import get_session
 from app.dao.dao_models import UsersDAO
 from app.users.validation import SUserRegister, SUserAuth, SUserForgotPassword
 from app.users.validation import SUserUpdatePassword
-from app.users.auth import decode_access_token, send_verification_email
-from app.users.auth import get_password_hash, create_access_token
-from app.users.auth import verify_password
+from app.users.auth import decode_access_token
+from app.users.auth import get_password_hash_async, create_access_token
+from app.users.auth import verify_password_async, HashingOverloadError
+from app.users.auth import TokenClaims, get_token_claims
+from app.users.outbox import enqueue_verification_email
 
 
 from urllib.parse import quote
@@ -58,16 +62,20 @@ def redirect_message(
 
 
 @router.post("/register/")
-async def register_user(request: Request) -> RedirectResponse:
+async def register_user(
+    request: Request,
+    session: AsyncSession = Depends(get_session, scope="function"),
+) -> RedirectResponse:
     """Регистрирует пользователя на платформе."""
 
     form = await request.form()
     try:
         data = SUserRegister(**form)
-        await UsersDAO.add_user(
+        user_id = await UsersDAO.add_user(
             username=data.username,
             email=data.email,
-            password=get_password_hash(data.password),
+            password=await get_password_hash_async(data.password),
+            session=session,
         )
         
 
@@ -83,15 +91,17 @@ async def register_user(request: Request) -> RedirectResponse:
     except SQLAlchemyError:
         message="Возникла ошибка при добавлении пользователя."
 
+    except HashingOverloadError:
+        message="Сервер перегружен, попробуйте позже."
+
     else:
-        user = await UsersDAO.find_user(email=data.email)
-        
-        await send_verification_email(
+        await enqueue_verification_email(
             email=data.email,
             title="Подтверждение почты.",
             text="Подтвердите вашу почту, перейдя по ссылке:",
             url_for_token="/auth/verify-email",
-            user_id=user.id
+            user_id=user_id,
+            session=session,
         )
         return redirect_message(url="/auth/verify-email")
     
@@ -104,7 +114,12 @@ async def register_user(request: Request) -> RedirectResponse:
 
 @router.post("/login/")
 async def auth_user(request: Request) -> RedirectResponse:
-    """Аутентифицирует пользователя на платформе."""
+    """
+    Аутентифицирует пользователя на платформе.
+
+    Пользователь загружается в отдельной короткой сессии, чтобы 
+    соединение с базой данных вернулось в пул до проверки пароля.
+    """
     
     form = await request.form()
     try:
@@ -118,7 +133,19 @@ async def auth_user(request: Request) -> RedirectResponse:
         )
     
     user = await UsersDAO.find_user(email=data.email)
-    if not user or not verify_password(data.password, user.password):
+    try:
+        verified = user is not None and await verify_password_async(
+            data.password, 
+            user.password,
+        )
+    except HashingOverloadError:
+        return redirect_message(
+            url="/auth/login/",
+            message="Сервер перегружен, попробуйте позже.",
+            error=True,
+        )
+
+    if not verified:
         return redirect_message(
             url="/auth/login/",
             message="Неверная почта или пароль",
@@ -141,28 +168,14 @@ async def logout_user() -> RedirectResponse:
 
 
 @router.post("/del/")
-async def delete_user(request: Request) -> RedirectResponse:
+async def delete_user(
+    claims: TokenClaims = Depends(get_token_claims),
+    session: AsyncSession = Depends(get_session, scope="function"),
+) -> RedirectResponse:
     """Удаляет аккаунт пользователя и все его файлы."""
 
     UPLOAD_DIR = Path("uploads/novels")
-
-    token = request.cookies.get("users_access_token")
-    if not token:
-        return redirect_message(
-            url="/auth/login/",
-            message="Пользователь не авторизован.",
-            error=True,
-        )
-
-    try:
-        user_id = decode_access_token(token)
-        user_email = decode_access_token(token=token, for_email=True)
-    except (ExpiredSignatureError, JWTError):
-        return redirect_message(
-            url="/auth/login/",
-            message="Ошибка авторизации.",
-            error=True,
-        )
+    user_id = claims.user_id
 
     # Удаляем папку пользователя с файлами (если существует)
     user_folder = UPLOAD_DIR / str(user_id)
@@ -171,7 +184,7 @@ async def delete_user(request: Request) -> RedirectResponse:
 
     # Удаляем пользователя из БД (каскадно удалятся его новеллы)
     try:
-        result = await UsersDAO.delete_user(user_email)
+        result = await UsersDAO.delete_user(claims.email, session=session)
         if not result:
             return redirect_message(
                 url="/auth/login/",
@@ -197,14 +210,17 @@ async def delete_user(request: Request) -> RedirectResponse:
     
 
 @router.post("/verify-email")
-async def verify_email(request: Request) -> RedirectResponse:
+async def verify_email(
+    request: Request,
+    session: AsyncSession = Depends(get_session, scope="function"),
+) -> RedirectResponse:
     """Переводит пользователя на его аккаунт после подтверждения почты."""
 
     form = await request.form()
     token = dict(form).get("token")
     try:
         email = decode_access_token(token, for_email=True)
-        user = await UsersDAO.find_user(email=email)
+        user = await UsersDAO.find_user(email=email, session=session)
         if not user:
             return redirect_message(
                 url="/auth/login/",
@@ -240,7 +256,10 @@ async def verify_email(request: Request) -> RedirectResponse:
 
 
 @router.post("/forgot_password/")
-async def forgot_password_user(request: Request) -> RedirectResponse:
+async def forgot_password_user(
+    request: Request,
+    session: AsyncSession = Depends(get_session, scope="function"),
+) -> RedirectResponse:
     """Обрабатывает первую страницу вкладки 'Забыли пароль?'"""
 
     form = await request.form()
@@ -254,7 +273,7 @@ async def forgot_password_user(request: Request) -> RedirectResponse:
             error=True,
         )
 
-    found = await UsersDAO.find_user(email=data.email)
+    found = await UsersDAO.find_user(email=data.email, session=session)
     if not found:
         return redirect_message(
             url="/auth/forgot_password/",
@@ -262,12 +281,13 @@ async def forgot_password_user(request: Request) -> RedirectResponse:
             error=True,
         )
 
-    await send_verification_email(
+    await enqueue_verification_email(
         email=data.email,
         title="Смена пароля.",
         text="Перейдите по ссылке, чтобы сменить пароль:",
         url_for_token="/auth/forgot_password/",
-        user_id=found.id
+        user_id=found.id,
+        session=session,
     )
 
     return redirect_message(
@@ -278,15 +298,22 @@ async def forgot_password_user(request: Request) -> RedirectResponse:
 
 
 @router.post("/update_password/")
-async def update_password_user(request: Request) -> RedirectResponse:
+async def update_password_user(
+    request: Request,
+    session: AsyncSession = Depends(get_session, scope="function"),
+) -> RedirectResponse:
     """Обрабатывает вторую страницу вкладки 'Забыли пароль?'"""
 
     form = await request.form()
     try:
         data = SUserUpdatePassword(**form)
         email = decode_access_token(token=data.token, for_email=True)
-        new_password = get_password_hash(password=data.password)
-        await UsersDAO.update_user_password(email=email, password=new_password)
+        new_password = await get_password_hash_async(password=data.password)
+        user_id = await UsersDAO.update_user_password(
+            email=email, 
+            password=new_password,
+            session=session,
+        )
     
     except ValidationError:
         return redirect_message(
@@ -305,14 +332,23 @@ async def update_password_user(request: Request) -> RedirectResponse:
     except SQLAlchemyError:
         message = "Возникла ошибка при обновлении пароля."
 
+    except HashingOverloadError:
+        message = "Сервер перегружен, попробуйте позже."
+
     else:
+        if user_id is None:
+            return redirect_message(
+                url="/auth/login/",
+                message="Пользователь не зарегистрирован.",
+                error=True,
+            )
+
         response = redirect_message(
             url="/main/",
             message="Пароль успешно изменен.",
             success=True,
         )
-        user = await UsersDAO.find_user(email=email)
-        token = create_access_token(email=email, user_id=user.id)
+        token = create_access_token(email=email, user_id=user_id)
         response.set_cookie(
             key="users_access_token", 
             value=token, 
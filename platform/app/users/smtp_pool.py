@@ -0,0 +1,171 @@
+from aiosmtplib import SMTP, SMTPException
+
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+import asyncio
+import time
+
+from app.database import EMAIL_DATA
+
+
+class SMTPPool:
+    """
+    Пул долгоживущих SMTP-соединений.
+
+    Соединение открывается и проходит login один раз, а затем
+    возвращается в пул и используется следующими отправками. Если
+    соединение простаивало дольше check_after секунд, перед выдачей
+    оно проверяется командой NOOP. Оборванные соединения закрываются
+    и заменяются новыми.
+    """
+
+    def __init__(
+        self,
+        hostname: str,
+        port: int | str,
+        use_tls: bool = True,
+        username: str | None = None,
+        password: str | None = None,
+        size: int = 2,
+        check_after: float = 30,
+    ):
+        """
+        Args:
+            hostname: адрес SMTP-сервера.
+            port: порт SMTP-сервера.
+            use_tls: подключаться ли сразу по TLS.
+            username: логин. Если пароль не задан, login не выполняется.
+            password: пароль.
+            size: максимальное число одновременно открытых соединений.
+            check_after: через сколько секунд простоя соединение
+                проверяется перед выдачей.
+        """
+
+        self.hostname = hostname
+        self.port = int(port) if port else None
+        self.use_tls = use_tls
+        self.username = username
+        self.password = password
+        self.size = size
+        self.check_after = check_after
+        self.metrics = {"connects": 0, "reuses": 0, "discarded": 0}
+        self._idle: deque[tuple[SMTP, float]] = deque()
+        self._semaphore: asyncio.Semaphore | None = None
+
+    async def _connect(self) -> SMTP:
+        """
+        Открывает новое соединение и выполняет login.
+
+        Raises:
+            SMTPException, OSError - если не удалось подключиться.
+        """
+
+        client = SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            use_tls=self.use_tls,
+        )
+        await client.connect()
+        try:
+            if self.password:
+                await client.login(self.username, self.password)
+        except SMTPException:
+            await self._close_client(client)
+            raise
+
+        self.metrics["connects"] += 1
+        return client
+
+    @staticmethod
+    async def _close_client(client: SMTP) -> None:
+        """Закрывает соединение, не обращая внимания на ошибки."""
+
+        try:
+            if client.is_connected:
+                await client.quit()
+        except (SMTPException, OSError):
+            client.close()
+
+    async def _is_alive(self, client: SMTP, idle_since: float) -> bool:
+        """
+        Проверяет, что соединение можно использовать.
+
+        Args:
+            client: соединение.
+            idle_since: время возврата соединения в пул.
+
+        Returns:
+            True - если соединение живо.
+        """
+
+        if not client.is_connected:
+            return False
+        if time.monotonic() - idle_since < self.check_after:
+            return True
+
+        try:
+            await client.noop()
+            return True
+        except (SMTPException, OSError):
+            return False
+
+    async def _acquire(self) -> SMTP:
+        """Возвращает живое соединение из пула или открывает новое."""
+
+        while self._idle:
+            client, idle_since = self._idle.pop()
+            if await self._is_alive(client, idle_since):
+                self.metrics["reuses"] += 1
+                return client
+            self.metrics["discarded"] += 1
+            await self._close_client(client)
+
+        return await self._connect()
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[SMTP]:
+        """
+        Выдает соединение из пула на время контекста.
+
+        Если в контексте возникла ошибка или соединение оборвалось,
+        оно закрывается и в пул не возвращается.
+
+        Raises:
+            SMTPException, OSError - если не удалось подключиться.
+        """
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.size)
+
+        async with self._semaphore:
+            client = await self._acquire()
+            try:
+                yield client
+            except BaseException:
+                self.metrics["discarded"] += 1
+                await self._close_client(client)
+                raise
+
+            if client.is_connected:
+                self._idle.append((client, time.monotonic()))
+            else:
+                self.metrics["discarded"] += 1
+
+    async def close(self) -> None:
+        """Закрывает все свободные соединения пула."""
+
+        while self._idle:
+            client, _ = self._idle.pop()
+            await self._close_client(client)
+
+
+smtp_pool = SMTPPool(
+    hostname=EMAIL_DATA["smtp_server"],
+    port=EMAIL_DATA["smtp_port"],
+    use_tls=EMAIL_DATA["smtp_use_tls"],
+    username=EMAIL_DATA["platform_email"],
+    password=EMAIL_DATA["platform_password"],
+    size=EMAIL_DATA["smtp_pool_size"],
+    check_after=EMAIL_DATA["smtp_pool_check_after"],
+)
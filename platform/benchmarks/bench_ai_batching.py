@@ -0,0 +1,75 @@
+"""
+Сравнивает скорость генерации изображений при разном размере пакета.
+
+Модель загружается так же, как в процессе app.ai.worker (AI_MODEL и
+AI_LORA_PATH из .env), поэтому нужны torch, diffusers и peft. Для
+каждого размера пакета генерируется --images изображений, первый
+пакет не учитывается (прогрев).
+
+Запуск из папки platform:
+    python -m benchmarks.bench_ai_batching --batch 1 2 4 --steps 10 --size 512
+"""
+
+import argparse
+import time
+
+from app.ai.pipeline import pipeline
+
+
+PROMPT = "a girl standing in a forest, anime style"
+
+
+def run(batch: int, images: int, steps: int, size: int) -> float:
+    """
+    Генерирует изображения пакетами.
+
+    Args:
+        batch: размер пакета.
+        images: общее количество изображений.
+        steps: количество шагов генерации.
+        size: ширина и высота изображения.
+
+    Returns:
+        Изображений в минуту.
+    """
+
+    import torch
+
+    pipe = pipeline.get()
+
+    def generate() -> None:
+        with torch.no_grad():
+            pipe(
+                prompt=[PROMPT] * batch,
+                num_inference_steps=steps,
+                width=size,
+                height=size,
+            )
+
+    generate()
+
+    batches = max(1, images // batch)
+    start = time.perf_counter()
+    for _ in range(batches):
+        generate()
+    return batches * batch * 60 / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--images", type=int, default=8)
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--size", type=int, default=512)
+    args = parser.parse_args()
+
+    pipeline.get()
+    print(f"model loaded in {pipeline.load_seconds:.1f} s")
+
+    for batch in args.batch:
+        speed = run(batch, args.images, args.steps, args.size)
+        print(f"batch {batch:<2} {speed:8.2f} images/min")
+
+
+if __name__ == "__main__":
+    main()
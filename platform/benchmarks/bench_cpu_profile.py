@@ -0,0 +1,119 @@
+"""
+Сравнивает настройки генерации на CPU: секунды на изображение и
+пиковое потребление памяти (RSS) для каждой настройки.
+
+Каждая настройка запускается в отдельном процессе, потому что число
+потоков torch и пиковый RSS относятся ко всему процессу. Нужны torch,
+diffusers и peft, модель берется из AI_MODEL и AI_LORA_PATH.
+
+Запуск из папки platform:
+    python -m benchmarks.bench_cpu_profile --images 2 --steps 10 --size 512
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from app.ai.pipeline import CpuProfile, LazyPipeline, run_pipe
+from app.database import AI_DATA
+
+
+THREADS = os.cpu_count() or 1
+
+VARIANTS = {
+    "baseline": CpuProfile(),
+    "threads": CpuProfile(threads=THREADS),
+    "channels_last": CpuProfile(threads=THREADS, channels_last=True),
+    "bf16": CpuProfile(threads=THREADS, bf16=True),
+    "attention_slicing": CpuProfile(threads=THREADS, attention_slicing=True),
+    "all": CpuProfile(
+        threads=THREADS, channels_last=True, bf16=True, attention_slicing=True
+    ),
+}
+
+PROMPT = "a girl standing in a forest, anime style"
+
+
+def measure(variant: str, images: int, steps: int, size: int) -> dict:
+    """
+    Генерирует изображения с одной настройкой.
+
+    Args:
+        variant: название настройки из VARIANTS.
+        images: количество изображений.
+        steps: количество шагов генерации.
+        size: ширина и высота изображения.
+
+    Returns:
+        Секунды на изображение, пиковый RSS в мегабайтах и время загрузки.
+    """
+
+    from app.ai import pipeline as pipeline_module
+
+    pipeline = LazyPipeline(
+        AI_DATA["model"],
+        AI_DATA["lora_path"],
+        AI_DATA["lora_fuse"],
+        AI_DATA["fused_unet_dir"],
+        VARIANTS[variant],
+    )
+    pipeline_module.pipeline = pipeline
+    pipeline.get()
+
+    settings = {"steps": steps, "width": size, "height": size}
+    run_pipe([PROMPT], settings=settings)
+
+    start = time.perf_counter()
+    for _ in range(images):
+        run_pipe([PROMPT], settings=settings)
+    seconds = (time.perf_counter() - start) / images
+
+    return {
+        "seconds_per_image": seconds,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "load_seconds": pipeline.load_seconds,
+        "bf16": pipeline.autocast_bf16,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=2)
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--variant", choices=VARIANTS)
+    args = parser.parse_args()
+
+    if args.variant:
+        result = measure(args.variant, args.images, args.steps, args.size)
+        print(json.dumps(result))
+        return
+
+    for variant in VARIANTS:
+        output = subprocess.run(
+            [
+                sys.executable, "-m", "benchmarks.bench_cpu_profile",
+                "--variant", variant,
+                "--images", str(args.images),
+                "--steps", str(args.steps),
+                "--size", str(args.size),
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        no_bf16 = VARIANTS[variant].bf16 and not result["bf16"]
+        note = " (bf16 not supported)" if no_bf16 else ""
+        print(
+            f"{variant:<18} {result['seconds_per_image']:7.1f} s/image"
+            f"   peak RSS {result['peak_rss_mb']:7.0f} MB{note}"
+        )
+
+
+if __name__ == "__main__":
+    main()
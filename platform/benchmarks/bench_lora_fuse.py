@@ -0,0 +1,88 @@
+"""
+Сравнивает время загрузки и время шага генерации с LoRA-адаптером
+поверх UNet (PEFT) и с адаптером, объединенным с весами UNet.
+
+Объединенный UNet сохраняется во временную папку, поэтому замеряются
+три загрузки: без объединения, первое объединение и загрузка
+сохраненного UNet. Нужны torch, diffusers и peft, модель берется из
+AI_MODEL и AI_LORA_PATH.
+
+Запуск из папки platform:
+    python -m benchmarks.bench_lora_fuse --steps 10 --size 512
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+
+from app.ai.pipeline import LazyPipeline
+from app.database import AI_DATA
+
+
+PROMPT = "a girl standing in a forest, anime style"
+
+
+def step_times(pipeline: LazyPipeline, steps: int, size: int) -> list[float]:
+    """
+    Генерирует изображение и замеряет время каждого шага.
+
+    Args:
+        pipeline: пайплайн.
+        steps: количество шагов генерации.
+        size: ширина и высота изображения.
+
+    Returns:
+        Время шагов в миллисекундах без первого шага (прогрев).
+    """
+
+    import torch
+
+    timings = []
+    last = time.perf_counter()
+
+    def callback(pipe, step, timestep, tensors):
+        nonlocal last
+        now = time.perf_counter()
+        timings.append((now - last) * 1000)
+        last = now
+        return tensors
+
+    with torch.no_grad():
+        pipeline.get()(
+            prompt=PROMPT,
+            num_inference_steps=steps,
+            width=size,
+            height=size,
+            callback_on_step_end=callback,
+        )
+
+    return timings[1:]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--size", type=int, default=512)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as fused_dir:
+        variants = [
+            ("peft", False),
+            ("fused", True),
+            ("fused, cached", True),
+        ]
+        for name, fuse in variants:
+            pipeline = LazyPipeline(
+                AI_DATA["model"], AI_DATA["lora_path"], fuse, fused_dir
+            )
+            pipeline.get()
+            timings = step_times(pipeline, args.steps, args.size)
+            print(
+                f"{name:<14} load {pipeline.load_seconds:6.1f} s"
+                f"   step {statistics.median(timings):8.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Измеряет время поиска новеллы пользователя по названию,
+когда в базе много пользователей и у каждого много новелл.
+
+Скрипт добавляет пользователей bench-* с новеллами,
+а после замеров удаляет их.
+
+Запуск из папки platform:
+    python -m benchmarks.bench_novels_by_title --users 2000 --novels 250
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from sqlalchemy import text
+
+from app.database import async_engine, async_session_maker
+from app.dao.dao_models import NovelsDAO
+
+
+async def fill(users: int, novels: int) -> list[int]:
+    """
+    Добавляет пользователей и их новеллы.
+
+    Args:
+        users: количество пользователей.
+        novels: количество новелл у каждого пользователя.
+
+    Returns:
+        Список id добавленных пользователей.
+    """
+
+    async with async_engine.begin() as conn:
+        result = await conn.execute(
+            text(
+                "INSERT INTO users (username, email, password) "
+                "SELECT 'bench-' || n, 'bench-' || n || '@bench.local', 'x' "
+                "FROM generate_series(1, :users) AS n RETURNING id"
+            ),
+            {"users": users},
+        )
+        user_ids = [row.id for row in result]
+        await conn.execute(
+            text(
+                "INSERT INTO novels (user_id, title, data) "
+                "SELECT u.id, 'Новелла ' || n, '{}' "
+                "FROM users AS u, generate_series(1, :novels) AS n "
+                "WHERE u.email LIKE '%@bench.local'"
+            ),
+            {"novels": novels},
+        )
+        await conn.execute(text("ANALYZE novels"))
+    return user_ids
+
+
+async def clean() -> None:
+    """Удаляет тестовых пользователей вместе с их новеллами."""
+
+    async with async_engine.begin() as conn:
+        await conn.execute(
+            text("DELETE FROM users WHERE email LIKE '%@bench.local'")
+        )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--novels", type=int, default=250)
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+
+    user_ids = await fill(args.users, args.novels)
+    try:
+        timings = []
+        async with async_session_maker() as session:
+            for _ in range(args.repeat):
+                user_id = random.choice(user_ids)
+                title = f"Новелла {random.randint(1, args.novels)}"
+
+                start = time.perf_counter()
+                novel = await NovelsDAO.find_by_title(user_id, title, session)
+                timings.append((time.perf_counter() - start) * 1000)
+                assert novel is not None
+
+            plan = await session.execute(
+                text(
+                    "EXPLAIN SELECT * FROM novels "
+                    "WHERE user_id = :user_id AND title = :title"
+                ),
+                {"user_id": user_ids[0], "title": "Новелла 1"},
+            )
+            plan = "\n".join(row[0] for row in plan)
+    finally:
+        await clean()
+        await async_engine.dispose()
+
+    timings.sort()
+    print(f"rows: {args.users * args.novels}")
+    print(
+        f"find_by_title p50={statistics.median(timings):.2f} ms "
+        f"p99={timings[int(len(timings) * 0.99) - 1]:.2f} ms"
+    )
+    print(plan)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,137 @@
+"""
+Сравнивает время и пиковую память страницы публичных новелл
+при загрузке всей строки и только полей карточки.
+
+Скрипт добавляет пользователя bench и новеллы с большим data,
+а после замеров удаляет их.
+
+Запуск из папки platform:
+    python -m benchmarks.bench_novels_listing --rows 200 --data-kb 512
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+
+from sqlalchemy import select, text
+
+from app.database import async_engine, async_session_maker
+from app.dao.dao_models import NovelsDAO
+from app.migration.models import Base, Novell
+
+
+BENCH_EMAIL = "bench@bench.local"
+
+
+async def fill(rows: int, data_kb: int) -> None:
+    """
+    Заполняет novels новеллами с большим data.
+
+    Args:
+        rows: количество новелл.
+        data_kb: примерный размер data одной новеллы в килобайтах.
+    """
+
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        user_id = (await conn.execute(
+            text(
+                "INSERT INTO users (username, email, password) "
+                "VALUES ('bench', :email, 'bench') RETURNING id"
+            ),
+            {"email": BENCH_EMAIL},
+        )).scalar()
+        # Одна реплика ~100 байт, поэтому нужно ~10 реплик на килобайт
+        await conn.execute(
+            text(
+                "INSERT INTO novels (user_id, title, preview, data) "
+                "SELECT :user_id, 'bench-' || n, '/static/preview.png', "
+                "json_build_object('dialogData', ("
+                "  SELECT json_agg(json_build_object("
+                "    'text', repeat('x', 80), 'sprites', '[]'::json))"
+                "  FROM generate_series(1, :replicas)"
+                ")) FROM generate_series(1, :rows) AS n"
+            ),
+            {"user_id": user_id, "rows": rows, "replicas": data_kb * 10},
+        )
+
+
+async def clean() -> None:
+    """Удаляет тестового пользователя вместе с его новеллами."""
+
+    async with async_engine.begin() as conn:
+        await conn.execute(
+            text("DELETE FROM users WHERE email = :email"),
+            {"email": BENCH_EMAIL},
+        )
+
+
+async def load_full(limit: int) -> list:
+    """Загружает страницу новелл целиком, вместе с data."""
+
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(Novell).order_by(Novell.created_at.desc()).limit(limit)
+        )
+        return list(result.scalars().all())
+
+
+async def load_cards(limit: int) -> list:
+    """Загружает страницу новелл только с полями карточки."""
+
+    return await NovelsDAO.find_page_after(limit)
+
+
+async def measure(function, limit: int, repeat: int) -> tuple[float, float]:
+    """
+    Возвращает медианное время и пиковую память загрузки страницы.
+
+    Args:
+        function: функция загрузки страницы.
+        limit: размер страницы.
+        repeat: количество повторов.
+
+    Returns:
+        Время в миллисекундах и память в мегабайтах.
+    """
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await function(limit)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    await function(limit)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return statistics.median(timings), peak / 1024 / 1024
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--data-kb", type=int, default=512)
+    parser.add_argument("--limit", type=int, default=15)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    await fill(args.rows, args.data_kb)
+    try:
+        results = {
+            "full rows": await measure(load_full, args.limit, args.repeat),
+            "card fields": await measure(load_cards, args.limit, args.repeat),
+        }
+    finally:
+        await clean()
+        await async_engine.dispose()
+
+    for name, (latency, memory) in results.items():
+        print(f"{name:12} {latency:9.2f} ms {memory:9.2f} MB peak")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
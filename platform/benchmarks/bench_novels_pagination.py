@@ -0,0 +1,136 @@
+"""
+Сравнивает время получения страницы публичных новелл через OFFSET
+и через курсор на большой таблице novels.
+
+Скрипт добавляет пользователя bench и нужное число новелл,
+а после замеров удаляет их (если не передан --keep).
+
+Запуск из папки platform:
+    python -m benchmarks.bench_novels_pagination --rows 1000000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import text
+
+from app.database import async_engine, async_session_maker
+from app.dao.dao_models import NovelsDAO
+from app.migration.models import Base
+
+
+BENCH_EMAIL = "bench@bench.local"
+
+
+async def fill(rows: int) -> None:
+    """
+    Создает таблицы (если их нет) и заполняет novels тестовыми данными.
+
+    Args:
+        rows: количество новелл.
+    """
+
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        user_id = (await conn.execute(
+            text(
+                "INSERT INTO users (username, email, password) "
+                "VALUES ('bench', :email, 'bench') RETURNING id"
+            ),
+            {"email": BENCH_EMAIL},
+        )).scalar()
+        await conn.execute(
+            text(
+                "INSERT INTO novels (user_id, title, preview, created_at, "
+                "updated_at, data) "
+                "SELECT :user_id, 'bench-' || n, NULL, "
+                "now() - n * interval '1 second', now(), '{}' "
+                "FROM generate_series(1, :rows) AS n"
+            ),
+            {"user_id": user_id, "rows": rows},
+        )
+        await conn.execute(text("ANALYZE novels"))
+
+
+async def clean() -> None:
+    """Удаляет тестового пользователя вместе с его новеллами."""
+
+    async with async_engine.begin() as conn:
+        await conn.execute(
+            text("DELETE FROM users WHERE email = :email"),
+            {"email": BENCH_EMAIL},
+        )
+
+
+async def measure(function, repeat: int) -> float:
+    """
+    Возвращает медианное время вызова функции в миллисекундах.
+
+    Args:
+        function: асинхронная функция без аргументов.
+        repeat: количество повторов.
+    """
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=6)
+    parser.add_argument("--page", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    await fill(args.rows)
+    try:
+        async with async_session_maker() as session:
+            skip = (args.page - 1) * args.limit
+
+            # Курсор страницы page - позиция последней новеллы страницы page-1
+            previous, _ = await NovelsDAO.find_paginated_all(
+                skip - 1, 1, session
+            )
+            after = (previous[0].created_at, previous[0].id)
+
+            results = {
+                "offset page 1": await measure(
+                    lambda: NovelsDAO.find_paginated_all(0, args.limit, session),
+                    args.repeat,
+                ),
+                f"offset page {args.page}": await measure(
+                    lambda: NovelsDAO.find_paginated_all(
+                        skip, args.limit, session
+                    ),
+                    args.repeat,
+                ),
+                "cursor page 1": await measure(
+                    lambda: NovelsDAO.find_page_after(args.limit, None, session),
+                    args.repeat,
+                ),
+                f"cursor page {args.page}": await measure(
+                    lambda: NovelsDAO.find_page_after(
+                        args.limit, after, session
+                    ),
+                    args.repeat,
+                ),
+            }
+    finally:
+        if not args.keep:
+            await clean()
+        await async_engine.dispose()
+
+    for name, value in results.items():
+        print(f"{name:22} {value:9.2f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
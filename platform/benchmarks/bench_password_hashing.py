@@ -0,0 +1,126 @@
+"""
+Сравнивает задержку входа при параллельной нагрузке, когда bcrypt
+выполняется прямо в цикле событий и в пуле потоков.
+
+Кроме времени проверки пароля, замеряется задержка легкого запроса
+(например, загрузки страницы), который выполняется одновременно со входами.
+
+Запуск из папки platform:
+    python -m benchmarks.bench_password_hashing --logins 64 --interval 0.05
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.users.auth import get_password_hash, verify_password
+from app.users.auth import verify_password_async, hashing_pool
+
+
+PASSWORD = "password123"
+
+
+async def login_sync(password_hash: str) -> None:
+    """Проверяет пароль прямо в цикле событий."""
+
+    verify_password(PASSWORD, password_hash)
+
+
+async def login_pool(password_hash: str) -> None:
+    """Проверяет пароль в пуле потоков."""
+
+    await verify_password_async(PASSWORD, password_hash)
+
+
+async def light_requests(stop: asyncio.Event, timings: list[float]) -> None:
+    """
+    Каждые 10 мс выполняет легкий запрос и сохраняет его задержку.
+
+    Args:
+        stop: событие завершения.
+        timings: список для задержек в миллисекундах.
+    """
+
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        timings.append((time.perf_counter() - start - 0.01) * 1000)
+
+
+async def run(
+    login, 
+    logins: int, 
+    concurrency: int, 
+    interval: float,
+) -> tuple[list, list]:
+    """
+    Запускает параллельные входы.
+
+    Args:
+        login: функция проверки пароля.
+        logins: общее число входов.
+        concurrency: число одновременных входов.
+        interval: интервал между приходом входов в секундах.
+
+    Returns:
+        Задержки входов и задержки легких запросов в миллисекундах.
+    """
+
+    password_hash = get_password_hash(PASSWORD)
+    semaphore = asyncio.Semaphore(concurrency)
+    login_timings, light_timings = [], []
+
+    async def timed(delay: float) -> None:
+        # Входы приходят равномерно, задержка считается от прихода запроса
+        await asyncio.sleep(delay)
+        start = time.perf_counter()
+        async with semaphore:
+            await login(password_hash)
+        login_timings.append((time.perf_counter() - start) * 1000)
+
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(light_requests(stop, light_timings))
+    await asyncio.gather(*(timed(n * interval) for n in range(logins)))
+    stop.set()
+    await ticker
+
+    return login_timings, light_timings
+
+
+def p99(timings: list[float]) -> float:
+    """Возвращает 99-й перцентиль."""
+
+    timings = sorted(timings)
+    return timings[max(int(len(timings) * 0.99) - 1, 0)]
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--interval", type=float, default=0.05)
+    args = parser.parse_args()
+
+    for name, login in (("in loop", login_sync), ("pool", login_pool)):
+        started = time.perf_counter()
+        logins, light = await run(
+            login, 
+            args.logins, 
+            args.concurrency, 
+            args.interval,
+        )
+        elapsed = time.perf_counter() - started
+        print(
+            f"{name:8} login p50={statistics.median(logins):8.1f} ms "
+            f"p99={p99(logins):8.1f} ms | "
+            f"other request p99={p99(light):8.1f} ms | "
+            f"{args.logins / elapsed:6.1f} logins/s"
+        )
+
+    print(f"pool workers={hashing_pool.workers} metrics={hashing_pool.metrics}")
+    hashing_pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""
+Сравнивает задержку получения соединения с базой данных
+для NullPool и пула соединений.
+
+Запуск из папки platform:
+    python -m benchmarks.bench_pool --requests 500 --concurrency 10
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.database import DB_URL, create_database_engine, get_pool_data
+from app.database import warmup_pool
+
+
+async def acquire(engine: AsyncEngine) -> float:
+    """
+    Получает соединение, выполняет пустой запрос и возвращает соединение.
+
+    Args:
+        engine: асинхронный движок базы данных.
+
+    Returns:
+        Время в миллисекундах.
+    """
+
+    start = time.perf_counter()
+    async with engine.connect() as connection:
+        await connection.exec_driver_sql("SELECT 1")
+    return (time.perf_counter() - start) * 1000
+
+
+async def run(pool_mode: str, requests: int, concurrency: int) -> list[float]:
+    """
+    Выполняет серию запросов к базе данных через движок с нужным пулом.
+
+    Args:
+        pool_mode: режим пула соединений.
+        requests: общее число запросов.
+        concurrency: число одновременных запросов.
+
+    Returns:
+        Список задержек в миллисекундах.
+    """
+
+    pool_data = get_pool_data()
+    pool_data["pool_mode"] = pool_mode
+    engine = create_database_engine(DB_URL, pool_data)
+    await warmup_pool(engine, pool_data["pool_warmup"])
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited() -> float:
+        async with semaphore:
+            return await acquire(engine)
+
+    timings = await asyncio.gather(*(limited() for _ in range(requests)))
+    await engine.dispose()
+    return timings
+
+
+def report(name: str, timings: list[float]) -> None:
+    """Печатает статистику задержек."""
+
+    timings = sorted(timings)
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    print(
+        f"{name:6} mean={statistics.mean(timings):7.2f} ms "
+        f"p50={statistics.median(timings):7.2f} ms p99={p99:7.2f} ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    for pool_mode in ("null", "queue"):
+        timings = await run(pool_mode, args.requests, args.concurrency)
+        report(pool_mode, timings)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
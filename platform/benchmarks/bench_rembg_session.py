@@ -0,0 +1,87 @@
+"""
+Сравнивает время удаления фона одного изображения, когда rembg создает
+новую сессию на каждый вызов и когда сессия берется из пула.
+
+Нужны rembg и onnxruntime. При первом запуске rembg скачивает модель
+в ~/.u2net (или U2NET_HOME).
+
+Запуск из папки platform:
+    python -m benchmarks.bench_rembg_session --images 10 --model u2net
+"""
+
+import argparse
+import statistics
+import time
+
+from PIL import Image
+from rembg import new_session, remove
+
+from app.ai.pipeline import RembgSessionPool
+
+
+def measure(remove_one, images: int) -> list[float]:
+    """
+    Удаляет фон несколько раз подряд.
+
+    Args:
+        remove_one: функция удаления фона одного изображения.
+        images: количество изображений.
+
+    Returns:
+        Время каждого вызова в миллисекундах.
+    """
+
+    timings = []
+    for _ in range(images):
+        start = time.perf_counter()
+        remove_one()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return timings
+
+
+def report(name: str, timings: list[float]) -> None:
+    """Печатает медиану и среднее время вызова."""
+
+    print(
+        f"{name:<16} median {statistics.median(timings):8.1f} ms"
+        f"   mean {statistics.mean(timings):8.1f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=10)
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--model", default="u2net")
+    parser.add_argument("--intra-threads", type=int, default=0)
+    parser.add_argument("--inter-threads", type=int, default=0)
+    args = parser.parse_args()
+
+    image = Image.new("RGB", (args.size, args.size), "white")
+    pool = RembgSessionPool(
+        args.model,
+        intra_threads=args.intra_threads,
+        inter_threads=args.inter_threads,
+    )
+
+    def remove_with_pool() -> None:
+        with pool.session() as session:
+            remove(image, session=session)
+
+    # Прогрев: скачивание модели не должно попасть в замер.
+    pool.preload()
+    print(f"session created in {pool.load_seconds * 1000:.1f} ms")
+
+    report(
+        "new session",
+        measure(
+            lambda: remove(image, session=new_session(args.model)),
+            args.images,
+        ),
+    )
+    report("session pool", measure(remove_with_pool, args.images))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Сравнивает скорость отправки писем, когда на каждое письмо открывается
+новое SMTP-соединение и когда соединения берутся из пула.
+
+Письма принимает локальный сервер aiosmtpd (pip install aiosmtpd),
+поэтому TLS не используется. Задержку сети до настоящего SMTP-сервера
+можно смоделировать параметром --latency.
+
+Запуск из папки platform:
+    python -m benchmarks.bench_smtp_pool --messages 500 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import time
+from email.mime.text import MIMEText
+
+from aiosmtpd.controller import Controller
+from aiosmtplib import SMTP
+
+from app.users.smtp_pool import SMTPPool
+
+
+HOST = "127.0.0.1"
+
+
+class SlowHandler:
+    """Обработчик aiosmtpd, который отвечает на команды с задержкой."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.received = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        await asyncio.sleep(self.latency)
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.latency)
+        self.received += 1
+        return "250 OK"
+
+
+def make_message(n: int) -> MIMEText:
+    """Создает тестовое письмо."""
+
+    msg = MIMEText(f"Письмо {n}")
+    msg["Subject"] = "bench"
+    msg["From"] = "bench@bench.local"
+    msg["To"] = "user@bench.local"
+    return msg
+
+
+async def send_without_pool(port: int, n: int) -> None:
+    """Открывает соединение, отправляет одно письмо и закрывает его."""
+
+    async with SMTP(hostname=HOST, port=port, use_tls=False) as server:
+        await server.send_message(make_message(n))
+
+
+async def run(send, messages: int, concurrency: int) -> float:
+    """
+    Отправляет письма параллельно.
+
+    Args:
+        send: функция отправки одного письма.
+        messages: количество писем.
+        concurrency: число одновременных отправок.
+
+    Returns:
+        Писем в секунду.
+    """
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(n: int) -> None:
+        async with semaphore:
+            await send(n)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(limited(n) for n in range(messages)))
+    return messages / (time.perf_counter() - start)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+
+    handler = SlowHandler(args.latency)
+    controller = Controller(handler, hostname=HOST, port=args.port)
+    controller.start()
+
+    pool = SMTPPool(HOST, args.port, use_tls=False, size=args.pool_size)
+
+    async def send_with_pool(n: int) -> None:
+        async with pool.connection() as server:
+            await server.send_message(make_message(n))
+
+    try:
+        without_pool = await run(
+            lambda n: send_without_pool(args.port, n),
+            args.messages,
+            args.concurrency,
+        )
+        with_pool = await run(send_with_pool, args.messages, args.concurrency)
+        await pool.close()
+    finally:
+        controller.stop()
+
+    print(f"messages received: {handler.received}")
+    print(f"without pool {without_pool:8.1f} msg/s")
+    print(f"pool size {args.pool_size:<2} {with_pool:8.1f} msg/s")
+    print(f"pool metrics: {pool.metrics}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+"""
+Измеряет время запуска веб-приложения: импорт app.main в новом процессе
+и пиковую память процесса после импорта.
+
+Замер выполняется с подключенными маршрутами /robot (AI_ENABLED=true)
+и без них. С параметром --load дополнительно измеряется время первой
+загрузки модели Stable Diffusion (нужны torch, diffusers и peft).
+
+Запуск из папки platform:
+    python -m benchmarks.bench_startup --repeat 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+IMPORT_APP = """
+import json, resource, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "seconds": elapsed,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "torch": __import__("sys").modules.get("torch") is not None,
+}))
+"""
+
+# Нижняя граница: только фреймворки, без кода приложения
+IMPORT_FRAMEWORKS = IMPORT_APP.replace(
+    "import app.main", "import fastapi, sqlalchemy.ext.asyncio"
+)
+
+LOAD_MODEL = """
+import json, resource
+from app.ai.pipeline import pipeline
+pipeline.get()
+print(json.dumps({
+    "seconds": pipeline.load_seconds,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "torch": True,
+}))
+"""
+
+
+def measure(code: str, env: dict) -> dict:
+    """
+    Выполняет код в новом процессе и возвращает его замеры.
+
+    Args:
+        code: код, который печатает замеры в формате JSON.
+        env: дополнительные переменные окружения.
+
+    Returns:
+        Словарь с временем, пиковой памятью и флагом импорта torch.
+    """
+
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        env={**os.environ, **env},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--load", action="store_true")
+    args = parser.parse_args()
+
+    runs = [measure(IMPORT_FRAMEWORKS, {}) for _ in range(args.repeat)]
+    print(
+        f"{'frameworks only':32} "
+        f"{statistics.median(r['seconds'] for r in runs) * 1000:8.1f} ms"
+    )
+
+    for enabled in ("false", "true"):
+        runs = [
+            measure(IMPORT_APP, {"AI_ENABLED": enabled})
+            for _ in range(args.repeat)
+        ]
+        print(
+            f"AI_ENABLED={enabled:5} import app.main "
+            f"{statistics.median(r['seconds'] for r in runs) * 1000:8.1f} ms "
+            f"peak RSS {max(r['rss_mb'] for r in runs):7.1f} MB "
+            f"torch imported: {any(r['torch'] for r in runs)}"
+        )
+
+    if args.load:
+        run = measure(LOAD_MODEL, {})
+        print(
+            f"first model load {run['seconds']:8.1f} s "
+            f"peak RSS {run['rss_mb']:7.1f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
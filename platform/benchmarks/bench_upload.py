@@ -0,0 +1,139 @@
+"""
+Сравнивает прием файлов: потоковую запись StreamingUpload и прежнюю
+запись через UploadFile и shutil.copyfileobj в async-обработчике.
+
+Сервер uvicorn запускается в отдельном потоке, клиенты одновременно
+загружают файлы по несколько мегабайт. Во время загрузки отдельный
+клиент опрашивает /ping: его наибольшая задержка показывает, насколько
+прием файлов блокирует цикл событий сервера.
+
+Запуск из папки platform:
+    python -m benchmarks.bench_upload --clients 8 --size 20 --rounds 3
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request, UploadFile
+
+from app.constructor import storage
+from app.constructor.storage import StreamingUpload
+
+
+PORT = 8765
+
+app = FastAPI()
+
+
+@app.get("/ping")
+async def ping():
+    return {}
+
+
+@app.post("/buffered")
+async def buffered(file: UploadFile):
+    path = storage.UPLOAD_DIR / "buffered" / os.urandom(8).hex()
+    with open(path, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+    return {}
+
+
+@app.post("/streaming")
+async def streaming(request: Request):
+    upload = StreamingUpload(0, 1 << 40, 1 << 40)
+    return {"url": await upload.receive(request)}
+
+
+async def measure(route: str, clients: int, size: int, rounds: int) -> dict:
+    """
+    Загружает файлы одновременно несколькими клиентами.
+
+    Args:
+        route: путь обработчика загрузки.
+        clients: количество одновременных клиентов.
+        size: размер файла в мегабайтах.
+        rounds: количество загрузок каждым клиентом.
+
+    Returns:
+        Пропускная способность в МБ/с и задержки /ping в миллисекундах.
+    """
+
+    data = os.urandom(size * 1024 * 1024)
+    url = f"http://127.0.0.1:{PORT}"
+    done = asyncio.Event()
+    delays = []
+
+    async def upload(client: httpx.AsyncClient) -> None:
+        for _ in range(rounds):
+            response = await client.post(
+                f"{url}{route}", files={"file": ("a.mp3", data)}
+            )
+            response.raise_for_status()
+
+    async def probe(client: httpx.AsyncClient) -> None:
+        while not done.is_set():
+            start = time.perf_counter()
+            await client.get(f"{url}/ping")
+            delays.append((time.perf_counter() - start) * 1000)
+            await asyncio.sleep(0.01)
+
+    async with httpx.AsyncClient(timeout=None) as client, \
+               httpx.AsyncClient(timeout=None) as probe_client:
+        probe_task = asyncio.create_task(probe(probe_client))
+        start = time.perf_counter()
+        await asyncio.gather(*(upload(client) for _ in range(clients)))
+        seconds = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+    delays.sort()
+    return {
+        "mb_per_second": clients * rounds * size / seconds,
+        "ping_p50_ms": delays[len(delays) // 2],
+        "ping_max_ms": delays[-1],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--size", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory, \
+         patch("app.constructor.storage.UPLOAD_DIR", Path(directory)):
+        (Path(directory) / "buffered").mkdir()
+
+        config = uvicorn.Config(app, port=PORT, log_level="warning")
+        server = uvicorn.Server(config)
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.05)
+
+        for route in ("/buffered", "/streaming"):
+            result = asyncio.run(
+                measure(route, args.clients, args.size, args.rounds)
+            )
+            print(
+                f"{route:<11} {result['mb_per_second']:7.1f} MB/s"
+                f"   ping p50 {result['ping_p50_ms']:7.1f} ms"
+                f"   max {result['ping_max_ms']:7.1f} ms"
+            )
+
+        server.should_exit = True
+        thread.join()
+
+
+if __name__ == "__main__":
+    main()
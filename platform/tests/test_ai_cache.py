@@ -0,0 +1,118 @@
+import pytest
+
+from unittest.mock import patch
+import os
+
+from app.ai.cache import ResultCache, generate_key, image_key, is_cacheable
+
+
+def set_age(cache: ResultCache, key: str, seconds: float) -> None:
+    """Сдвигает время последнего чтения результата в прошлое."""
+
+    path = cache._path(key)
+    timestamp = path.stat().st_mtime - seconds
+    os.utime(path, (timestamp, timestamp))
+
+
+def test_cache_hit_and_miss(tmp_path):
+    """Проверка чтения результата и счетчиков попаданий."""
+
+    # Arrange
+    cache = ResultCache(tmp_path, 1024)
+
+    # Act
+    missed = cache.get("a")
+    cache.put("a", b"png")
+    found = cache.get("a")
+
+    # Assert
+    assert missed is None
+    assert found == b"png"
+    assert cache.metrics == {"hits": 1, "misses": 1, "evictions": 0}
+
+
+def test_cache_shared_on_disk(tmp_path):
+    """Проверка, что результат виден другому экземпляру кэша."""
+
+    # Arrange
+    ResultCache(tmp_path, 1024).put("a", b"png")
+
+    # Act
+    found = ResultCache(tmp_path, 1024).get("a")
+
+    # Assert
+    assert found == b"png"
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """Проверка, что при переполнении удаляется давно не читанный файл."""
+
+    # Arrange
+    cache = ResultCache(tmp_path, 10)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    set_age(cache, "a", 20)
+    set_age(cache, "b", 10)
+    cache.get("a")
+
+    # Act
+    cache.put("c", b"1234")
+
+    # Assert
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1234"
+    assert cache.get("c") == b"1234"
+    assert cache.metrics["evictions"] == 1
+
+
+def test_cache_disabled(tmp_path):
+    """Проверка, что кэш нулевого размера ничего не сохраняет."""
+
+    # Arrange
+    cache = ResultCache(tmp_path, 0)
+
+    # Act
+    cache.put("a", b"png")
+
+    # Assert
+    assert cache.get("a") is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_generate_key():
+    """Проверка, что ключ зависит от параметров и адаптера."""
+
+    # Arrange
+    params = {"prompt": "cat", "mode": "character"}
+
+    # Act
+    key = generate_key(params)
+    with patch.dict("app.ai.cache.AI_DATA", {"lora_path": "other"}):
+        other_adapter = generate_key(params)
+
+    # Assert
+    assert key == generate_key({"mode": "character", "prompt": "cat"})
+    assert key != generate_key({**params, "mode": "background"})
+    assert key != generate_key({**params, "seed": 1})
+    assert key != other_adapter
+    with patch.dict("app.ai.pipeline.AI_DATA", {"steps": 1}):
+        assert key != generate_key(params)
+    assert image_key(b"image") != image_key(b"other")
+
+
+@pytest.mark.parametrize("params, expected", [
+    ({"prompt": "cat", "seed": 0}, True),
+    ({"prompt": "cat", "seed": None}, False),
+    ({"prompt": "cat"}, False),
+])
+def test_is_cacheable(params: dict, expected: bool):
+    """
+    Проверка, что из кэша берутся только результаты с seed.
+
+    Args:
+        params: параметры задачи.
+        expected: ожидаемый результат.
+    """
+
+    # Act + Assert
+    assert is_cacheable(params) is expected
@@ -0,0 +1,237 @@
+import pytest
+from PIL import Image
+
+from unittest.mock import MagicMock, patch
+from concurrent.futures import ThreadPoolExecutor
+import subprocess
+import sys
+import threading
+import time
+
+from app.ai.pipeline import LazyPipeline, RembgSessionPool
+from app.ai.pipeline import generation_settings, run_remove
+
+
+def test_lazy_pipeline_not_loaded_on_create():
+    """Проверка, что модель не загружается при создании объекта."""
+
+    # Act
+    with patch.object(LazyPipeline, "_load") as mock_load:
+        pipeline = LazyPipeline("model", "lora")
+
+    # Assert
+    mock_load.assert_not_called()
+    assert pipeline.loaded is False
+
+
+def test_lazy_pipeline_loads_once():
+    """Проверка, что модель загружается один раз при одновременных вызовах."""
+
+    # Arrange
+    pipeline = LazyPipeline("model", "lora")
+
+    def slow_load():
+        time.sleep(0.05)
+        return object()
+
+    # Act
+    with patch.object(pipeline, "_load", side_effect=slow_load) as mock_load:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            pipes = list(executor.map(lambda _: pipeline.get(), range(4)))
+
+    # Assert
+    mock_load.assert_called_once()
+    assert all(pipe is pipes[0] for pipe in pipes)
+    assert pipeline.loaded is True
+    assert pipeline.load_seconds >= 0.05
+
+
+def make_adapter(directory, weights: bytes) -> str:
+    """Создает папку с файлами LoRA-адаптера."""
+
+    (directory / "adapter_config.json").write_text("{}")
+    (directory / "adapter_model.safetensors").write_bytes(weights)
+    return str(directory)
+
+
+def test_fused_unet_path(tmp_path):
+    """Проверка, что папка объединенного UNet зависит от адаптера и модели."""
+
+    # Arrange
+    lora = make_adapter(tmp_path, b"weights")
+    fused_dir = tmp_path / "unet"
+    pipeline = LazyPipeline("model", lora, True, fused_dir)
+
+    # Act
+    first = pipeline.fused_unet_path()
+    same = LazyPipeline("model", lora, True, fused_dir).fused_unet_path()
+    other_model = LazyPipeline("other", lora, True, fused_dir).fused_unet_path()
+    make_adapter(tmp_path, b"new weights")
+    other_adapter = pipeline.fused_unet_path()
+
+    # Assert
+    assert first.parent == tmp_path / "unet"
+    assert first == same
+    assert first != other_model
+    assert first != other_adapter
+    assert LazyPipeline("model", lora, True).fused_unet_path() is None
+
+
+def test_save_unet(tmp_path):
+    """Проверка, что UNet сохраняется через временную папку."""
+
+    # Arrange
+    path = tmp_path / "fused"
+
+    def save_pretrained(directory, safe_serialization):
+        directory.mkdir()
+        (directory / "diffusion_pytorch_model.safetensors").write_bytes(b"w")
+
+    unet = MagicMock()
+    unet.save_pretrained.side_effect = save_pretrained
+
+    # Act
+    LazyPipeline.save_unet(unet, path)
+    LazyPipeline.save_unet(unet, path)
+
+    # Assert
+    assert unet.save_pretrained.call_args.kwargs == {"safe_serialization": True}
+    assert [p.name for p in tmp_path.iterdir()] == ["fused"]
+    assert (path / "diffusion_pytorch_model.safetensors").read_bytes() == b"w"
+
+
+@pytest.mark.parametrize("mode, expected", [
+    ("background", {"steps": 20, "width": 768, "height": 432}),
+    ("character", {"steps": 25, "width": 512, "height": 768}),
+    (None, {"steps": 25, "width": 512, "height": 512}),
+])
+def test_generation_settings(mode: str | None, expected: dict):
+    """
+    Проверка, что настройки режима заменяют значения по умолчанию.
+
+    Args:
+        mode: режим генерации.
+        expected: ожидаемые настройки.
+    """
+
+    # Arrange
+    mode_settings = {
+        "background": {"steps": 20, "width": 768, "height": 432},
+        "character": {"height": 768},
+    }
+
+    # Act
+    with patch.dict("app.ai.pipeline.AI_DATA", {
+        "steps": 25, "width": 512, "height": 512,
+        "mode_settings": mode_settings,
+    }):
+        settings = generation_settings(mode)
+
+    # Assert
+    assert settings == expected
+
+
+def test_import_ai_router_without_torch():
+    """Проверка, что импорт маршрутов /robot не загружает torch и модели."""
+
+    # Arrange
+    code = (
+        "import sys, app.ai.router; "
+        "print(any(m in sys.modules for m in ('torch', 'diffusers', 'rembg')))"
+    )
+
+    # Act
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+    )
+
+    # Assert
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "False"
+
+
+def test_rembg_pool_reuses_session():
+    """Проверка, что сессия rembg создается один раз и переиспользуется."""
+
+    # Arrange
+    pool = RembgSessionPool("u2net")
+
+    # Act
+    with patch.object(pool, "_create", side_effect=object) as mock_create:
+        sessions = []
+        for _ in range(3):
+            with pool.session() as session:
+                sessions.append(session)
+
+    # Assert
+    mock_create.assert_called_once()
+    assert all(session is sessions[0] for session in sessions)
+    assert pool.created == 1
+
+
+def test_rembg_pool_size_limit():
+    """Проверка, что одновременно используется не больше size сессий."""
+
+    # Arrange
+    pool = RembgSessionPool("u2net", size=2)
+    lock = threading.Lock()
+    active, peak = 0, 0
+
+    def remove(_):
+        nonlocal active, peak
+        with pool.session():
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            time.sleep(0.02)
+            with lock:
+                active -= 1
+
+    # Act
+    with patch.object(pool, "_create", side_effect=object):
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            list(executor.map(remove, range(6)))
+
+    # Assert
+    assert peak == 2
+    assert pool.created == 2
+
+
+def test_rembg_pool_create_error():
+    """Проверка, что ошибка создания сессии не занимает место в пуле."""
+
+    # Arrange
+    pool = RembgSessionPool("u2net", size=1)
+
+    # Act
+    with patch.object(pool, "_create", side_effect=[OSError("no model"), "ok"]):
+        with pytest.raises(OSError):
+            with pool.session():
+                pass
+        with pool.session() as session:
+            pass
+
+    # Assert
+    assert session == "ok"
+    assert pool.created == 1
+
+
+def test_run_remove_uses_pool_session():
+    """Проверка, что удаление фона получает сессию из пула."""
+
+    # Arrange
+    pool = RembgSessionPool("u2net")
+    image = Image.new("RGB", (8, 8))
+    session = object()
+
+    # Act
+    with patch("app.ai.pipeline.rembg_sessions", pool), \
+         patch.object(pool, "_create", return_value=session), \
+         patch("rembg.remove", return_value=image) as mock_remove:
+        result = run_remove(image)
+
+    # Assert
+    assert result is image
+    mock_remove.assert_called_once_with(image, session=session)
@@ -0,0 +1,379 @@
+from fastapi.testclient import TestClient
+import pytest
+
+from unittest.mock import patch, AsyncMock
+from pathlib import Path
+import json
+
+from app.main import app
+from app.ai import router as ai_router
+from app.ai.cache import ResultCache, generate_key, image_key
+from app.dao.dao_models import AddedUpload
+from app.migration.models import AiJob
+from app.users.auth import create_access_token
+
+
+client = TestClient(app)
+client.cookies.set(
+    "users_access_token", 
+    create_access_token("robot@test.com", user_id=1),
+)
+
+DAO_PATH = "app.ai.router.AiJobsDAO"
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path) -> ResultCache:
+    """Фикстура, подменяющая кэш результатов пустым во временной папке."""
+
+    cache = ResultCache(tmp_path / "cache", 1024 * 1024)
+    with patch("app.ai.router.result_cache", cache):
+        yield cache
+
+
+@pytest.fixture
+def uploads(tmp_path) -> Path:
+    """Фикстура, подменяющая папки загрузок временными."""
+
+    with patch("app.constructor.storage.UPLOAD_DIR", tmp_path / "uploads/novels"), \
+         patch("app.constructor.storage.BLOB_DIR", tmp_path / "uploads/blobs"), \
+         patch("app.constructor.storage.TEMP_DIR", tmp_path / "uploads/.tmp"), \
+         patch("app.constructor.storage.AssetsDAO.add_upload", 
+               new_callable=AsyncMock, return_value=AddedUpload(".png")):
+        yield tmp_path / "uploads"
+
+
+def upload(uploads: Path, name: str, data: bytes) -> str:
+    """Создает загруженный файл пользователя 1 и возвращает его URL."""
+
+    (uploads / "novels" / "1").mkdir(parents=True, exist_ok=True)
+    (uploads / "novels" / "1" / name).write_bytes(data)
+    return f"/uploads/novels/1/{name}"
+
+
+def read_url(uploads: Path, url: str) -> bytes:
+    """Читает сохраненный файл по его URL."""
+
+    return (uploads / url.removeprefix("/uploads/")).read_bytes()
+
+
+@pytest.mark.parametrize("mode, suffix", [
+    ("background", ", wide landscape, 16:9"),
+    ("character", ", character, full body"),
+    (None, ""),
+])
+def test_generate_image(mode: str, suffix: str):
+    """
+    Проверка, что генерация ставит задачу и сразу возвращает ее id.
+
+    Args:
+        mode: режим генерации.
+        suffix: ожидаемое дополнение описания.
+    """
+
+    # Act
+    with patch(f"{DAO_PATH}.add_job", new_callable=AsyncMock, 
+               return_value=7) as mock_add, \
+         patch(f"{DAO_PATH}.queue_position", new_callable=AsyncMock, 
+               return_value=2):
+        response = client.post(
+            "/robot/generate",
+            json={"prompt": "cat", "mode": mode},
+        )
+
+    # Assert
+    assert response.status_code == 200
+    mock_add.assert_awaited_once_with(
+        "generate", {"prompt": "cat" + suffix, "mode": mode}, user_id=1
+    )
+    assert response.json() == {"job_id": 7, "status": "queued", "position": 2}
+
+
+def test_generate_image_no_prompt():
+    """Проверка генерации без описания."""
+
+    # Act
+    with patch(f"{DAO_PATH}.add_job", new_callable=AsyncMock) as mock_add:
+        response = client.post("/robot/generate", json={})
+
+    # Assert
+    mock_add.assert_not_awaited()
+    assert response.json() == {"error": "No prompt provided"}
+
+
+def test_generate_image_not_authorized():
+    """Проверка, что без токена генерация недоступна."""
+
+    # Act
+    response = TestClient(app).post("/robot/generate", json={"prompt": "cat"})
+
+    # Assert
+    assert response.status_code == 401
+
+
+def test_get_job_running():
+    """Проверка состояния выполняемой задачи."""
+
+    # Arrange
+    job = AiJob(id=7, user_id=1, status="running", progress=3, total_steps=25)
+
+    # Act
+    with patch(f"{DAO_PATH}.find_status", new_callable=AsyncMock, 
+               return_value=job):
+        response = client.get("/robot/jobs/7")
+
+    # Assert
+    assert response.json() == {
+        "job_id": 7,
+        "status": "running",
+        "progress": 3,
+        "total_steps": 25,
+        "position": None,
+        "error": None,
+        "url": None,
+    }
+
+
+def test_get_job_other_user():
+    """Проверка, что чужая задача не видна."""
+
+    # Arrange
+    job = AiJob(id=7, user_id=2, status="queued", progress=0)
+
+    # Act
+    with patch(f"{DAO_PATH}.find_status", new_callable=AsyncMock, 
+               return_value=job):
+        response = client.get("/robot/jobs/7")
+
+    # Assert
+    assert response.status_code == 404
+
+
+def test_get_job_result():
+    """Проверка перенаправления на готовое изображение."""
+
+    # Arrange
+    job = AiJob(
+        id=7, user_id=1, status="done", result_url="/uploads/novels/1/a.png"
+    )
+
+    # Act
+    with patch(f"{DAO_PATH}.find_status", new_callable=AsyncMock, 
+               return_value=job):
+        response = client.get("/robot/jobs/7/result", follow_redirects=False)
+
+    # Assert
+    assert response.status_code == 307
+    assert response.headers["location"] == "/uploads/novels/1/a.png"
+
+
+def test_get_job_result_not_ready():
+    """Проверка, что результат незавершенной задачи не отдается."""
+
+    # Arrange
+    job = AiJob(id=7, user_id=1, status="running")
+
+    # Act
+    with patch(f"{DAO_PATH}.find_status", new_callable=AsyncMock, 
+               return_value=job):
+        response = client.get("/robot/jobs/7/result")
+
+    # Assert
+    assert response.status_code == 409
+
+
+@pytest.mark.parametrize("status, code", [
+    ("cancelled", 200),
+    ("running", 200),
+    (None, 409),
+])
+def test_cancel_job(status: str | None, code: int):
+    """
+    Проверка отмены задачи.
+
+    Args:
+        status: результат отмены в базе данных.
+        code: ожидаемый код ответа.
+    """
+
+    # Arrange
+    job = AiJob(id=7, user_id=1, status="queued")
+
+    # Act
+    with patch(f"{DAO_PATH}.find_status", new_callable=AsyncMock, 
+               return_value=job), \
+         patch(f"{DAO_PATH}.cancel_job", new_callable=AsyncMock, 
+               return_value=status):
+        response = client.delete("/robot/jobs/7")
+
+    # Assert
+    assert response.status_code == code
+    if status:
+        assert response.json() == {"job_id": 7, "status": status}
+
+
+@pytest.mark.asyncio
+async def test_job_events():
+    """Проверка потока событий: изменения состояния и итоговое событие."""
+
+    # Arrange
+    jobs = [
+        AiJob(id=7, user_id=1, status="queued", progress=0),
+        AiJob(id=7, user_id=1, status="running", progress=1, total_steps=2),
+        AiJob(id=7, user_id=1, status="running", progress=1, total_steps=2),
+        AiJob(id=7, user_id=1, status="done", progress=2, total_steps=2),
+    ]
+
+    # Act
+    with patch(f"{DAO_PATH}.find_status", new_callable=AsyncMock, 
+               side_effect=jobs), \
+         patch(f"{DAO_PATH}.queue_position", new_callable=AsyncMock, 
+               return_value=0), \
+         patch.dict(ai_router.AI_DATA, {"poll_interval": 0}):
+        events = [event async for event in ai_router.job_events(7)]
+
+    # Assert
+    names = [event.split("\n")[0] for event in events]
+    assert names == ["event: progress", "event: progress", "event: done"]
+    last = json.loads(events[-1].split("data: ")[1])
+    assert last["progress"] == 2
+
+
+def test_remove_bg(uploads):
+    """Проверка, что удаление фона передает URL загрузки в очередь."""
+
+    # Arrange
+    source = upload(uploads, "source.png", b"image")
+    job = AiJob(id=1, status="done", result_url="/uploads/novels/1/out.png")
+
+    # Act
+    with patch(f"{DAO_PATH}.add_job", new_callable=AsyncMock, 
+               return_value=1) as mock_add, \
+         patch("app.ai.router.wait_for_job", new_callable=AsyncMock, 
+               return_value=job):
+        response = client.post("/robot/remove-bg", json={"url": source})
+
+    # Assert
+    mock_add.assert_awaited_once_with(
+        "remove_bg", {"source": source}, user_id=1
+    )
+    assert response.json() == {"url": "/uploads/novels/1/out.png"}
+
+
+@pytest.mark.parametrize("url", [
+    "/uploads/novels/2/source.png",
+    "/uploads/novels/1/../2/source.png",
+    "/uploads/novels/1/missing.png",
+])
+def test_remove_bg_wrong_url(uploads, url: str):
+    """
+    Проверка, что удалить фон можно только у своей загрузки.
+
+    Args:
+        url: URL чужого или несуществующего файла.
+    """
+
+    # Arrange
+    (uploads / "novels" / "2").mkdir(parents=True)
+    (uploads / "novels" / "2" / "source.png").write_bytes(b"image")
+
+    # Act
+    with patch(f"{DAO_PATH}.add_job", new_callable=AsyncMock) as mock_add:
+        response = client.post("/robot/remove-bg", json={"url": url})
+
+    # Assert
+    mock_add.assert_not_awaited()
+    assert response.json() == {"error": "Image not found"}
+
+
+def test_remove_bg_no_image():
+    """Проверка удаления фона без изображения."""
+
+    # Act
+    response = client.post("/robot/remove-bg", json={})
+
+    # Assert
+    assert response.json() == {"error": "No image provided"}
+
+
+def test_generate_image_cached(cache: ResultCache, uploads):
+    """Проверка, что изображение из кэша сохраняется без очереди."""
+
+    # Arrange
+    cache.put(generate_key({"prompt": "cat", "mode": None, "seed": 5}), b"png")
+
+    # Act
+    with patch(f"{DAO_PATH}.add_job", new_callable=AsyncMock, 
+               return_value=7) as mock_add, \
+         patch(f"{DAO_PATH}.queue_position", 
+               new_callable=AsyncMock) as mock_position:
+        response = client.post(
+            "/robot/generate", json={"prompt": "cat", "seed": 5}
+        )
+
+    # Assert
+    url = mock_add.call_args.kwargs["result_url"]
+    assert url.startswith("/uploads/blobs/")
+    assert read_url(uploads, url) == b"png"
+    mock_position.assert_not_awaited()
+    assert response.json() == {"job_id": 7, "status": "done", "position": None}
+    assert cache.metrics["hits"] == 1
+
+
+def test_generate_image_without_seed_skips_cache(cache: ResultCache):
+    """Проверка, что без seed задача ставится в очередь, даже если есть кэш."""
+
+    # Arrange
+    cache.put(generate_key({"prompt": "cat", "mode": None}), b"png")
+
+    # Act
+    with patch(f"{DAO_PATH}.add_job", new_callable=AsyncMock, 
+               return_value=7) as mock_add, \
+         patch(f"{DAO_PATH}.queue_position", new_callable=AsyncMock, 
+               return_value=0):
+        response = client.post("/robot/generate", json={"prompt": "cat"})
+
+    # Assert
+    mock_add.assert_awaited_once_with(
+        "generate", {"prompt": "cat", "mode": None}, user_id=1
+    )
+    assert response.json()["status"] == "queued"
+    assert cache.metrics["hits"] == 0
+
+
+@pytest.mark.parametrize("seed", [-1, 2 ** 63, "1", 1.5, True])
+def test_generate_image_invalid_seed(seed):
+    """
+    Проверка генерации с некорректным seed.
+
+    Args:
+        seed: seed из запроса.
+    """
+
+    # Act
+    with patch(f"{DAO_PATH}.add_job", new_callable=AsyncMock) as mock_add:
+        response = client.post(
+            "/robot/generate", json={"prompt": "cat", "seed": seed}
+        )
+
+    # Assert
+    mock_add.assert_not_awaited()
+    assert response.json() == {"error": "Invalid seed"}
+
+
+def test_remove_bg_cached(cache: ResultCache, uploads):
+    """Проверка, что удаление фона для того же изображения берется из кэша."""
+
+    # Arrange
+    source = upload(uploads, "source.png", b"image")
+    cache.put(image_key(b"image"), b"png")
+
+    # Act
+    with patch(f"{DAO_PATH}.add_job", new_callable=AsyncMock) as mock_add:
+        response = client.post("/robot/remove-bg", json={"url": source})
+
+    # Assert
+    mock_add.assert_not_awaited()
+    url = response.json()["url"]
+    assert url != source
+    assert read_url(uploads, url) == b"png"
@@ -0,0 +1,534 @@
+import pytest
+from PIL import Image
+from sqlalchemy import text
+
+from unittest.mock import patch
+from io import BytesIO
+from datetime import timedelta
+from pathlib import Path
+import asyncio
+import threading
+import time
+
+from app.ai.cache import ResultCache, generate_key
+from app.ai.worker import InferenceWorker, RemoveBgWorker, to_png
+from app.ai.router import wait_for_job
+from app.dao.dao_models import AiJobsDAO, UsersDAO
+from app.database import async_engine
+
+
+@pytest.fixture(scope="function")
+async def clean_jobs():
+    """Фикстура, очищающая очередь задач и файлы до и после теста."""
+
+    async with async_engine.begin() as conn:
+        await conn.execute(text("TRUNCATE ai_jobs, assets RESTART IDENTITY CASCADE;"))
+    yield
+    async with async_engine.begin() as conn:
+        await conn.execute(text("TRUNCATE ai_jobs, assets RESTART IDENTITY CASCADE;"))
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path) -> ResultCache:
+    """Фикстура, подменяющая кэш результатов пустым во временной папке."""
+
+    cache = ResultCache(tmp_path / "cache", 1024 * 1024)
+    with patch("app.ai.worker.result_cache", cache):
+        yield cache
+
+
+@pytest.fixture(autouse=True)
+def uploads(tmp_path) -> Path:
+    """Фикстура, подменяющая папки загрузок временными."""
+
+    with patch("app.constructor.storage.UPLOAD_DIR", tmp_path / "uploads/novels"), \
+         patch("app.constructor.storage.BLOB_DIR", tmp_path / "uploads/blobs"), \
+         patch("app.constructor.storage.TEMP_DIR", tmp_path / "uploads/.tmp"):
+        yield tmp_path / "uploads"
+
+
+@pytest.fixture(scope="function")
+async def user_id():
+    """Фикстура, создающая пользователя для задач."""
+
+    user_id = await UsersDAO.add_user("robot", "hash", "robot@test.com")
+    yield user_id
+    async with async_engine.begin() as conn:
+        await conn.execute(text("TRUNCATE users, assets RESTART IDENTITY CASCADE;"))
+
+
+def read_result(uploads: Path, url: str) -> bytes:
+    """Читает готовое изображение по URL задачи."""
+
+    return (uploads / url.removeprefix("/uploads/")).read_bytes()
+
+
+@pytest.mark.asyncio
+async def test_worker_generate(clean_jobs, uploads, user_id):
+    """Проверка, что результат генерации сохраняется в папку пользователя."""
+
+    # Arrange
+    worker = InferenceWorker()
+    image = Image.new("RGB", (8, 8), "red")
+    job_id = await AiJobsDAO.add_job(
+        "generate", {"prompt": "cat"}, user_id=user_id
+    )
+
+    # Act
+    with patch("app.ai.worker.run_pipe", return_value=[image]) as mock_pipe:
+        done = await worker.run_once()
+
+    # Assert
+    assert done == 1
+    assert mock_pipe.call_args[0][0] == ["cat"]
+    job = await wait_for_job(job_id)
+    assert job.status == "done"
+    assert job.result_url.startswith("/uploads/blobs/")
+    assert read_result(uploads, job.result_url) == to_png(image)
+    job = await AiJobsDAO.find_by_id(job_id)
+    assert job.started_at and job.finished_at
+    assert await worker.run_once() == 0
+
+
+@pytest.mark.asyncio
+async def test_worker_remove_bg(clean_jobs, uploads, user_id):
+    """Проверка, что удаление фона читает загрузку пользователя."""
+
+    # Arrange
+    worker = RemoveBgWorker()
+    (uploads / "novels" / str(user_id)).mkdir(parents=True)
+    source = uploads / "novels" / str(user_id) / "source.png"
+    source.write_bytes(to_png(Image.new("RGB", (8, 8), "red")))
+    output = Image.new("RGBA", (8, 8), (0, 0, 0, 0))
+    job_id = await AiJobsDAO.add_job(
+        "remove_bg", 
+        {"source": f"/uploads/novels/{user_id}/source.png"}, 
+        user_id=user_id,
+    )
+
+    # Act
+    with patch("app.ai.worker.run_remove", return_value=output) as mock_remove:
+        await worker.run_once()
+
+    # Assert
+    assert mock_remove.call_args[0][0].mode == "RGBA"
+    job = await AiJobsDAO.find_by_id(job_id)
+    assert job.status == "done"
+    result = read_result(uploads, job.result_url)
+    assert Image.open(BytesIO(result)).mode == "RGBA"
+
+
+@pytest.mark.asyncio
+async def test_worker_remove_bg_missing_source(clean_jobs, user_id):
+    """Проверка, что задача с несуществующим файлом отмечается failed."""
+
+    # Arrange
+    worker = RemoveBgWorker()
+    job_id = await AiJobsDAO.add_job(
+        "remove_bg", 
+        {"source": f"/uploads/novels/{user_id}/missing.png"}, 
+        user_id=user_id,
+    )
+
+    # Act
+    with patch("app.ai.worker.run_remove") as mock_remove:
+        await worker.run_once()
+
+    # Assert
+    mock_remove.assert_not_called()
+    job = await AiJobsDAO.find_by_id(job_id)
+    assert job.status == "failed"
+
+
+@pytest.mark.asyncio
+async def test_remove_bg_during_generation(clean_jobs, uploads, user_id):
+    """
+    Проверка, что задача удаления фона выполняется, пока идет долгий 
+    пакет генерации.
+    """
+
+    # Arrange
+    worker = InferenceWorker()
+    remove_worker = RemoveBgWorker()
+    (uploads / "novels" / str(user_id)).mkdir(parents=True)
+    source = uploads / "novels" / str(user_id) / "source.png"
+    source.write_bytes(to_png(Image.new("RGB", (8, 8), "red")))
+    await AiJobsDAO.add_job("generate", {"prompt": "cat"}, user_id=user_id)
+    job_id = await AiJobsDAO.add_job(
+        "remove_bg", 
+        {"source": f"/uploads/novels/{user_id}/source.png"}, 
+        user_id=user_id,
+    )
+    release = threading.Event()
+
+    def slow_pipe(*args):
+        release.wait(5)
+        return [Image.new("RGB", (8, 8), "red")]
+
+    # Act
+    with patch("app.ai.worker.run_pipe", side_effect=slow_pipe), \
+         patch("app.ai.worker.run_remove", 
+               return_value=Image.new("RGBA", (8, 8))):
+        generating = asyncio.create_task(worker.run_once())
+        await asyncio.sleep(0.1)
+        removed = await asyncio.wait_for(remove_worker.run_once(), timeout=2)
+        job = await AiJobsDAO.find_by_id(job_id)
+        still_generating = not generating.done()
+        release.set()
+        await generating
+
+    # Assert
+    assert removed == 1
+    assert job.status == "done"
+    assert still_generating
+
+
+@pytest.mark.asyncio
+async def test_worker_failed_job(clean_jobs):
+    """Проверка, что ошибка выполнения отмечает задачу failed."""
+
+    # Arrange
+    worker = InferenceWorker()
+    job_id = await AiJobsDAO.add_job("generate", {"prompt": "cat"})
+
+    # Act
+    with patch("app.ai.worker.run_pipe", side_effect=RuntimeError("boom")):
+        await worker.run_once()
+
+    # Assert
+    job = await AiJobsDAO.find_by_id(job_id)
+    assert job.status == "failed"
+    assert "boom" in job.error
+
+
+@pytest.mark.asyncio
+async def test_claim_jobs_order(clean_jobs):
+    """Проверка, что задачи забираются по порядку и только один раз."""
+
+    # Arrange
+    ids = [
+        await AiJobsDAO.add_job("generate", {"prompt": str(n)})
+        for n in range(3)
+    ]
+
+    # Act
+    first = await AiJobsDAO.claim_jobs(limit=2)
+    second = await AiJobsDAO.claim_jobs(limit=2)
+
+    # Assert
+    assert [job.id for job in first] == ids[:2]
+    assert [job.id for job in second] == ids[2:]
+    assert all(job.status == "running" for job in first + second)
+
+
+@pytest.mark.asyncio
+async def test_requeue_expired(clean_jobs):
+    """
+    Проверка, что в очередь возвращаются только задачи с истекшим 
+    сроком, а задачи работающих обработчиков остаются у них.
+    """
+
+    # Arrange
+    stale_id = await AiJobsDAO.add_job("generate", {"prompt": "cat"})
+    live_id = await AiJobsDAO.add_job("generate", {"prompt": "dog"})
+    await AiJobsDAO.claim_jobs(lease=-1)
+    await AiJobsDAO.claim_jobs(lease=300)
+
+    # Act
+    requeued = await AiJobsDAO.requeue_expired()
+
+    # Assert
+    assert requeued is True
+    stale = await AiJobsDAO.find_by_id(stale_id)
+    live = await AiJobsDAO.find_by_id(live_id)
+    assert (stale.status, stale.locked_until) == ("queued", None)
+    assert live.status == "running"
+    assert await AiJobsDAO.requeue_expired() is False
+
+
+@pytest.mark.asyncio
+async def test_worker_extends_lease(clean_jobs):
+    """Проверка, что срок задачи продлевается, пока она выполняется."""
+
+    # Arrange
+    worker = InferenceWorker()
+    worker.lease = 0.3
+    job_id = await AiJobsDAO.add_job("generate", {"prompt": "cat"})
+    leases = []
+
+    def slow_batch(jobs, on_step=None):
+        # Генерация дольше срока задачи
+        time.sleep(0.5)
+        job = asyncio.run_coroutine_threadsafe(
+            AiJobsDAO.find_by_id(job_id), loop
+        ).result()
+        leases.append(job.locked_until)
+        return [to_png(Image.new("RGB", (4, 4)))]
+
+    loop = asyncio.get_running_loop()
+
+    # Act
+    with patch("app.ai.worker.process_batch", side_effect=slow_batch), \
+         patch("app.ai.worker.save_upload", return_value="/uploads/a.png"):
+        await worker.run_once()
+
+    # Assert
+    job = await AiJobsDAO.find_by_id(job_id)
+    assert job.status == "done"
+    assert leases[0] > job.started_at + timedelta(seconds=0.3)
+
+
+@pytest.mark.asyncio
+async def test_worker_progress(clean_jobs):
+    """Проверка, что прогресс генерации сохраняется в задаче."""
+
+    # Arrange
+    worker = InferenceWorker()
+    job_id = await AiJobsDAO.add_job("generate", {"prompt": "cat"})
+
+    def fake_pipe(prompts, on_step, settings, seeds):
+        for step in range(1, 4):
+            on_step(step, 3)
+        return [Image.new("RGB", (8, 8))]
+
+    # Act
+    with patch("app.ai.worker.run_pipe", side_effect=fake_pipe):
+        await worker.run_once()
+
+    # Assert
+    job = await AiJobsDAO.find_status(job_id)
+    assert job.status == "done"
+    assert (job.progress, job.total_steps) == (3, 3)
+
+
+@pytest.mark.asyncio
+async def test_worker_cancel_running(clean_jobs):
+    """Проверка, что отмена останавливает генерацию на следующем шаге."""
+
+    # Arrange
+    worker = InferenceWorker()
+    loop = asyncio.get_running_loop()
+    job_id = await AiJobsDAO.add_job("generate", {"prompt": "cat"})
+    steps = []
+
+    def fake_pipe(prompts, on_step, settings, seeds):
+        on_step(1, 3)
+        steps.append(1)
+        asyncio.run_coroutine_threadsafe(
+            AiJobsDAO.cancel_job(job_id), loop
+        ).result()
+        on_step(2, 3)
+        steps.append(2)
+
+    # Act
+    with patch("app.ai.worker.run_pipe", side_effect=fake_pipe):
+        await worker.run_once()
+
+    # Assert
+    assert steps == [1]
+    job = await AiJobsDAO.find_status(job_id)
+    assert job.status == "cancelled"
+
+
+@pytest.mark.asyncio
+async def test_cancel_queued_job(clean_jobs):
+    """Проверка отмены задачи в очереди и места в очереди."""
+
+    # Arrange
+    first = await AiJobsDAO.add_job("generate", {"prompt": "1"})
+    second = await AiJobsDAO.add_job("generate", {"prompt": "2"})
+    third = await AiJobsDAO.add_job("generate", {"prompt": "3"})
+
+    # Act
+    status = await AiJobsDAO.cancel_job(second)
+
+    # Assert
+    assert status == "cancelled"
+    assert await AiJobsDAO.queue_position(first) == 0
+    assert await AiJobsDAO.queue_position(third) == 1
+    assert await AiJobsDAO.cancel_job(second) is None
+    assert [job.id for job in await AiJobsDAO.claim_jobs(limit=5)] == [
+        first, third
+    ]
+
+
+@pytest.mark.asyncio
+async def test_worker_batch(clean_jobs, uploads):
+    """Проверка, что задачи из очереди выполняются одним пакетом."""
+
+    # Arrange
+    worker = InferenceWorker(max_batch=4)
+    ids = [
+        await AiJobsDAO.add_job("generate", {"prompt": str(n), "mode": None})
+        for n in range(3)
+    ]
+
+    def fake_pipe(prompts, on_step, settings, seeds):
+        on_step(1, 1)
+        return [Image.new("RGB", (8, 8), (int(p), 0, 0)) for p in prompts]
+
+    # Act
+    with patch("app.ai.worker.run_pipe", side_effect=fake_pipe) as mock_pipe:
+        done = await worker.run_once()
+
+    # Assert
+    assert done == 3
+    mock_pipe.assert_called_once()
+    assert mock_pipe.call_args[0][0] == ["0", "1", "2"]
+    for n, job_id in enumerate(ids):
+        job = await AiJobsDAO.find_by_id(job_id)
+        assert job.status == "done"
+        assert job.progress == 1
+        result = read_result(uploads, job.result_url)
+        assert Image.open(BytesIO(result)).getpixel((0, 0)) == (n, 0, 0)
+
+
+@pytest.mark.asyncio
+async def test_worker_batch_same_mode(clean_jobs):
+    """Проверка, что в пакет попадают только задачи с одним режимом."""
+
+    # Arrange
+    worker = InferenceWorker(max_batch=4)
+    for prompt, mode in [("1", "background"), ("2", "character"), ("3", "background")]:
+        await AiJobsDAO.add_job("generate", {"prompt": prompt, "mode": mode})
+
+    def fake_pipe(prompts, on_step, settings, seeds):
+        return [Image.new("RGB", (8, 8)) for _ in prompts]
+
+    # Act
+    with patch("app.ai.worker.run_pipe", side_effect=fake_pipe) as mock_pipe:
+        await worker.run_once()
+        await worker.run_once()
+
+    # Assert
+    assert [call[0][0] for call in mock_pipe.call_args_list] == [
+        ["1", "3"], ["2"]
+    ]
+
+
+@pytest.mark.asyncio
+async def test_worker_batch_window(clean_jobs):
+    """Проверка, что неполный пакет ждет задачи batch_window секунд."""
+
+    # Arrange
+    worker = InferenceWorker(max_batch=2, batch_window=0.2)
+    await AiJobsDAO.add_job("generate", {"prompt": "1", "mode": None})
+
+    async def add_later():
+        await asyncio.sleep(0.05)
+        await AiJobsDAO.add_job("generate", {"prompt": "2", "mode": None})
+
+    def fake_pipe(prompts, on_step, settings, seeds):
+        return [Image.new("RGB", (8, 8)) for _ in prompts]
+
+    # Act
+    with patch("app.ai.worker.run_pipe", side_effect=fake_pipe) as mock_pipe:
+        _, done = await asyncio.gather(add_later(), worker.run_once())
+
+    # Assert
+    assert done == 2
+    assert mock_pipe.call_args[0][0] == ["1", "2"]
+
+
+@pytest.mark.asyncio
+async def test_worker_batch_partial_cancel(clean_jobs):
+    """Проверка, что отмена одной задачи не прерывает остальные."""
+
+    # Arrange
+    worker = InferenceWorker(max_batch=2)
+    loop = asyncio.get_running_loop()
+    first = await AiJobsDAO.add_job("generate", {"prompt": "1", "mode": None})
+    second = await AiJobsDAO.add_job("generate", {"prompt": "2", "mode": None})
+
+    def fake_pipe(prompts, on_step, settings, seeds):
+        asyncio.run_coroutine_threadsafe(
+            AiJobsDAO.cancel_job(first), loop
+        ).result()
+        on_step(1, 2)
+        on_step(2, 2)
+        return [Image.new("RGB", (8, 8)) for _ in prompts]
+
+    # Act
+    with patch("app.ai.worker.run_pipe", side_effect=fake_pipe):
+        await worker.run_once()
+
+    # Assert
+    assert (await AiJobsDAO.find_status(first)).status == "cancelled"
+    job = await AiJobsDAO.find_by_id(second)
+    assert job.status == "done"
+    assert job.result_url is not None
+
+
+@pytest.mark.asyncio
+async def test_worker_saves_to_cache(clean_jobs, cache: ResultCache, uploads):
+    """
+    Проверка, что результат с seed сохраняется в кэш, а повтор 
+    берется из него.
+    """
+
+    # Arrange
+    worker = InferenceWorker()
+    image = Image.new("RGB", (8, 8), "red")
+    params = {"prompt": "cat", "mode": None, "seed": 42}
+    await AiJobsDAO.add_job("generate", params)
+
+    # Act
+    with patch("app.ai.worker.run_pipe", return_value=[image]) as mock_pipe:
+        await worker.run_once()
+        job_id = await AiJobsDAO.add_job("generate", params)
+        await worker.run_once()
+
+    # Assert
+    mock_pipe.assert_called_once()
+    assert mock_pipe.call_args[0][3] == [42]
+    assert cache.get(generate_key(params)) == to_png(image)
+    job = await AiJobsDAO.find_by_id(job_id)
+    assert job.status == "done"
+    assert read_result(uploads, job.result_url) == to_png(image)
+
+
+@pytest.mark.asyncio
+async def test_worker_mode_settings(clean_jobs):
+    """Проверка, что пакет генерируется с шагами и размером своего режима."""
+
+    # Arrange
+    worker = InferenceWorker()
+    await AiJobsDAO.add_job("generate", {"prompt": "1", "mode": "background"})
+    mode_settings = {"background": {"steps": 10, "width": 768}}
+
+    # Act
+    with patch.dict("app.ai.pipeline.AI_DATA", {
+             "steps": 25, "width": 512, "height": 512,
+             "mode_settings": mode_settings,
+         }), \
+         patch("app.ai.worker.run_pipe", 
+               return_value=[Image.new("RGB", (8, 8))]) as mock_pipe:
+        await worker.run_once()
+
+    # Assert
+    assert mock_pipe.call_args[0][2] == {"steps": 10, "width": 768, "height": 512}
+
+
+@pytest.mark.asyncio
+async def test_worker_without_seed_not_cached(clean_jobs, cache: ResultCache):
+    """
+    Проверка, что задачи без seed генерируются заново со случайным 
+    seed и не попадают в кэш.
+    """
+
+    # Arrange
+    worker = InferenceWorker()
+    params = {"prompt": "cat", "mode": None}
+
+    # Act
+    with patch("app.ai.worker.run_pipe", 
+               return_value=[Image.new("RGB", (8, 8))]) as mock_pipe:
+        for _ in range(2):
+            await AiJobsDAO.add_job("generate", params)
+            await worker.run_once()
+
+    # Assert
+    assert mock_pipe.call_count == 2
+    seeds = [call[0][3][0] for call in mock_pipe.call_args_list]
+    assert seeds[0] != seeds[1]
+    assert cache.get(generate_key(params)) is None
@@ -0,0 +1,69 @@
+import pytest
+
+from unittest.mock import patch, AsyncMock
+from pathlib import Path
+from types import SimpleNamespace
+
+from app.constructor import cleenup
+from app.migration.models import Asset
+
+
+SHA = "ab" + "0" * 62
+
+
+@pytest.fixture
+def blobs(tmp_path) -> Path:
+    """Фикстура, подменяющая папки файлов временными."""
+
+    with patch("app.constructor.storage.BLOB_DIR", tmp_path), \
+         patch("app.constructor.storage.TEMP_DIR", tmp_path / ".tmp"):
+        (tmp_path / "ab").mkdir()
+        (tmp_path / "ab" / f"{SHA}.png").write_bytes(b"image")
+        (tmp_path / "ab" / f"{SHA}_320.webp").write_bytes(b"thumbnail")
+        yield tmp_path
+
+
+def blob_files(blobs: Path) -> list[str]:
+    """Возвращает имена всех файлов, включая временные."""
+
+    return sorted(path.name for path in blobs.rglob("*") if path.is_file())
+
+
+@pytest.mark.asyncio
+async def test_cleanup_orphan_blobs(blobs: Path):
+    """Проверка, что файлы удаляются после удаления записей о них."""
+
+    # Arrange
+    rows = [SimpleNamespace(sha256=SHA, ext=".png")]
+
+    # Act
+    with patch("app.constructor.cleenup.AssetsDAO.delete_unused",
+               new_callable=AsyncMock, return_value=rows), \
+         patch("app.constructor.cleenup.AssetsDAO.find_assets",
+               new_callable=AsyncMock, return_value={}):
+        removed = await cleenup.cleanup_orphan_blobs()
+
+    # Assert
+    assert removed == 1
+    assert blob_files(blobs) == []
+
+
+@pytest.mark.asyncio
+async def test_remove_blobs_uploaded_again(blobs: Path):
+    """
+    Проверка, что файл, загруженный заново после удаления записи, 
+    остается на месте.
+    """
+
+    # Arrange
+    rows = [SimpleNamespace(sha256=SHA, ext=".png")]
+    asset = Asset(sha256=SHA, ext=".png")
+
+    # Act
+    with patch("app.constructor.cleenup.AssetsDAO.find_assets",
+               new_callable=AsyncMock, return_value={SHA: asset}):
+        await cleenup.remove_blobs(rows)
+
+    # Assert
+    assert blob_files(blobs) == [f"{SHA}.png", f"{SHA}_320.webp"]
+    assert (blobs / "ab" / f"{SHA}.png").read_bytes() == b"image"
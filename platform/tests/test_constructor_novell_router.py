@@ -0,0 +1,165 @@
+from fastapi.testclient import TestClient
+import pytest
+
+from unittest.mock import patch, AsyncMock
+from datetime import datetime
+
+from app.main import app
+from app.users.auth import create_access_token
+from app.migration.models import Novell
+import app.constructor.novell_router as novell_router
+
+
+client = TestClient(app)
+
+
+@pytest.mark.parametrize("created_at, novel_id", [
+    (datetime(2026, 1, 1, 12, 30, 15, 123456), 1),
+    (datetime(2025, 12, 31), 100500),
+])
+def test_cursor_round_trip(created_at: datetime, novel_id: int):
+    """
+    Проверка, что курсор раскодируется в исходную позицию.
+
+    Args:
+        created_at: дата создания новеллы.
+        novel_id: id новеллы.
+    """
+
+    # Act
+    cursor = novell_router.encode_cursor(created_at, novel_id)
+
+    # Assert
+    assert novell_router.decode_cursor(cursor) == (created_at, novel_id)
+
+
+@pytest.mark.parametrize("cursor", [
+    ("not a cursor"),
+    ("W10="),
+    ("WyJoZWxsbyIsIDFd"),
+    ("WyIyMDI2LTAxLTAxVDAwOjAwOjAwKzAzOjAwIiwgMV0="),
+])
+def test_decode_cursor_invalid(cursor: str):
+    """
+    Проверка, что поврежденный курсор вызывает ValueError.
+
+    Args:
+        cursor: поврежденный курсор.
+    """
+
+    # Act + Assert
+    with pytest.raises(ValueError):
+        novell_router.decode_cursor(cursor)
+
+
+def test_public_novels_cursor_with_timezone():
+    """
+    Проверка, что курсор с датой в часовом поясе отклоняется с 400,
+    а не доходит до запроса к базе данных.
+    """
+
+    # Arrange
+    cursor = "WyIyMDI2LTAxLTAxVDAwOjAwOjAwKzAzOjAwIiwgMV0="
+
+    # Act
+    with patch("app.constructor.novell_router.NovelsDAO.find_page_after",
+               new_callable=AsyncMock) as mock_find:
+        response = client.get(f"/novels/public/?cursor={cursor}")
+
+    # Assert
+    assert response.status_code == 400
+    mock_find.assert_not_called()
+
+
+def test_public_novels_thumbnail():
+    """Проверка, что в списке новелл есть URL уменьшенной копии превью."""
+
+    # Arrange
+    novels = [
+        Novell(id=1, title="a", preview="/uploads/blobs/ab/ab.png",
+               created_at=datetime(2026, 1, 1)),
+        Novell(id=2, title="b", preview=None, created_at=datetime(2026, 1, 1)),
+    ]
+    thumbnails = {"/uploads/blobs/ab/ab.png": "/uploads/blobs/ab/ab_320.webp"}
+
+    # Act
+    with patch("app.constructor.novell_router.NovelsDAO.find_page_after",
+               new_callable=AsyncMock, return_value=novels), \
+         patch("app.constructor.novell_router.variant_urls",
+               new_callable=AsyncMock, return_value=thumbnails) as mock_urls:
+        response = client.get("/novels/public/?cursor=")
+
+    # Assert
+    assert mock_urls.call_args[0][:2] == (["/uploads/blobs/ab/ab.png"], 320)
+    items = response.json()["items"]
+    assert items[0]["preview"] == "/uploads/blobs/ab/ab.png"
+    assert items[0]["thumbnail"] == "/uploads/blobs/ab/ab_320.webp"
+    assert items[1]["thumbnail"] is None
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("", "url(/uploads/blobs/ab/ab.png) center/cover"),
+    ("?width=800", "url(/uploads/blobs/ab/ab_1280.webp) center/cover"),
+])
+def test_novel_data_width(query: str, expected: str):
+    """
+    Проверка, что проигрыватель может запросить изображения нужной ширины.
+
+    Args:
+        query: параметры запроса.
+        expected: ожидаемый фон реплики.
+    """
+
+    # Arrange
+    data = {
+        "dialogData": [{"bg": "url(/uploads/blobs/ab/ab.png) center/cover"}]
+    }
+    novel = Novell(id=1, data=data)
+    urls = {"/uploads/blobs/ab/ab.png": "/uploads/blobs/ab/ab_1280.webp"}
+
+    # Act
+    with patch("app.constructor.novell_router.NovelsDAO.find_by_id",
+               new_callable=AsyncMock, return_value=novel), \
+         patch("app.constructor.novell_router.variant_urls",
+               new_callable=AsyncMock, return_value=urls):
+        response = client.get(f"/novels/game/1/data{query}")
+
+    # Assert
+    assert response.json()["dialogData"][0]["bg"] == expected
+    assert novel.data == data
+
+
+SHA = "ab" + "0" * 62
+
+
+@pytest.mark.parametrize("linked, code", [({SHA}, 200), (set(), 400)])
+def test_add_novel_links_own_files(linked: set, code: int):
+    """
+    Проверка, что новелла сохраняется, только если все ее файлы 
+    загружены автором.
+
+    Args:
+        linked: хэши файлов, на которые добавлены ссылки.
+        code: ожидаемый код ответа.
+    """
+
+    # Arrange
+    user = TestClient(app)
+    user.cookies.set(
+        "users_access_token", create_access_token("a@test.com", user_id=1)
+    )
+    data = {"currentBg": f"/uploads/blobs/ab/{SHA}.png", "dialogData": []}
+
+    # Act
+    with patch("app.constructor.novell_router.NovelsDAO.add_novel",
+               new_callable=AsyncMock, return_value=5), \
+         patch("app.constructor.novell_router.AssetsDAO.link_novel",
+               new_callable=AsyncMock, return_value=linked) as mock_link:
+        response = user.post(
+            "/novels/add_novel/", 
+            json={"title": "a", "data": data, "preview": None},
+        )
+
+    # Assert
+    assert mock_link.call_args[0][:3] == (1, 5, [SHA])
+    assert response.status_code == code
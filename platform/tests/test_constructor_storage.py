@@ -0,0 +1,287 @@
+import pytest
+
+from unittest.mock import patch, AsyncMock
+from pathlib import Path
+import os
+
+from app.constructor import storage
+from app.dao.dao_models import AddedUpload
+from app.migration.models import Asset
+
+
+SHA = "ab" + "0" * 62
+
+
+@pytest.fixture
+def blobs(tmp_path) -> Path:
+    """Фикстура, подменяющая папки файлов временными."""
+
+    with patch("app.constructor.storage.BLOB_DIR", tmp_path), \
+         patch("app.constructor.storage.TEMP_DIR", tmp_path / ".tmp"):
+        yield tmp_path
+
+
+@pytest.mark.parametrize("url, expected", [
+    (f"/uploads/blobs/ab/{SHA}.png", (SHA, ".png")),
+    (f"/uploads/blobs/ab/{SHA}", (SHA, "")),
+    (f"/uploads/blobs/cd/{SHA}.png", None),
+    (f"/uploads/blobs/ab/{SHA}.p/g", None),
+    (f"/uploads/blobs/ab/{SHA.upper()}.png", None),
+    ("/uploads/blobs/ab/abc.png", None),
+    ("/uploads/novels/1/a.png", None),
+    (f"http://localhost:8000/uploads/blobs/ab/{SHA}.png", (SHA, ".png")),
+])
+def test_parse_blob_url(url: str, expected: tuple | None):
+    """
+    Проверка разбора URL файла по хэшу.
+
+    Args:
+        url: URL файла.
+        expected: ожидаемые хэш и расширение.
+    """
+
+    # Act + Assert
+    assert storage.parse_blob_url(url) == expected
+
+
+def test_novel_urls():
+    """Проверка, что собираются URL всех файлов новеллы."""
+
+    # Arrange
+    data = {
+        "currentBg": "/bg.png",
+        "currentAudio": "/music.mp3",
+        "bgImage": "/old_bg.png",
+        "sceneSpritesData": [
+            {"src": "http://localhost:8000/a.png"}, {"src": ""}, "broken"
+        ],
+        "dialogData": [
+            {
+                "bg": "url(/dialog_bg.png) center/cover",
+                "audio": "/voice.mp3",
+                "sprites": [{"src": "/b.png"}, {"src": 1}],
+            },
+            {"bg": None, "audio": None},
+            None,
+        ],
+    }
+
+    # Act + Assert
+    assert storage.novel_urls(data) == {
+        "/bg.png", "/music.mp3", "/old_bg.png", "/a.png", 
+        "/dialog_bg.png", "/voice.mp3", "/b.png",
+    }
+
+
+def test_novel_urls_not_list():
+    """Проверка состояния новеллы неожиданного вида."""
+
+    # Act + Assert
+    assert storage.novel_urls({"sceneSpritesData": "x", "dialogData": 1}) == set()
+
+
+@pytest.mark.asyncio
+async def test_upload_path_blob(blobs: Path):
+    """Проверка, что файл по хэшу находится, если у пользователя есть ссылка."""
+
+    # Arrange
+    path = blobs / "ab" / f"{SHA}.png"
+    path.parent.mkdir()
+    path.write_bytes(b"image")
+
+    # Act
+    with patch("app.constructor.storage.AssetsDAO.find_user_asset",
+               new_callable=AsyncMock,
+               return_value=Asset(sha256=SHA, ext=".png")) as mock_find:
+        found = await storage.upload_path(f"/uploads/blobs/ab/{SHA}.png", 1)
+
+    # Assert
+    mock_find.assert_awaited_once_with(1, SHA)
+    assert found == path
+
+
+@pytest.mark.parametrize("asset", [None, Asset(sha256=SHA, ext=".jpg")])
+@pytest.mark.asyncio
+async def test_upload_path_blob_not_found(blobs: Path, asset: Asset | None):
+    """
+    Проверка, что чужой файл или файл с другим расширением не находится.
+
+    Args:
+        asset: файл, который вернула база данных.
+    """
+
+    # Arrange
+    (blobs / "ab").mkdir()
+    (blobs / "ab" / f"{SHA}.png").write_bytes(b"image")
+
+    # Act + Assert
+    with patch("app.constructor.storage.AssetsDAO.find_user_asset",
+               new_callable=AsyncMock, return_value=asset), \
+         pytest.raises(ValueError):
+        await storage.upload_path(f"/uploads/blobs/ab/{SHA}.png", 1)
+
+
+@pytest.mark.asyncio
+async def test_save_upload_existing_blob(blobs: Path):
+    """Проверка, что существующий файл не перезаписывается."""
+
+    # Arrange
+    with patch("app.constructor.storage.AssetsDAO.add_upload",
+               new_callable=AsyncMock, return_value=AddedUpload(".png")):
+        url = await storage.save_upload(1, b"image")
+        path = blobs / url.removeprefix("/uploads/blobs/")
+        mtime = path.stat().st_mtime_ns
+
+        # Act
+        again = await storage.save_upload(2, b"image")
+
+    # Assert
+    assert again == url
+    assert path.stat().st_mtime_ns == mtime
+    assert list((blobs / ".tmp").iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_publish_discards_records_on_move_error(blobs: Path):
+    """
+    Проверка, что если файл не удалось перенести на место, записи, 
+    добавленные для него, удаляются вместе с временным файлом.
+    """
+
+    # Arrange
+    added = AddedUpload(".png", True, 7)
+    temp = storage.temp_path()
+    temp.write_bytes(b"image")
+
+    # Act
+    with patch("app.constructor.storage.AssetsDAO.add_upload",
+               new_callable=AsyncMock, return_value=added), \
+         patch("app.constructor.storage.AssetsDAO.discard_upload",
+               new_callable=AsyncMock) as mock_discard, \
+         patch("app.constructor.storage.os.replace",
+               side_effect=OSError("No space left on device")), \
+         pytest.raises(OSError):
+        await storage.publish(temp, 1, SHA, ".png", 5)
+
+    # Assert
+    mock_discard.assert_awaited_once_with(SHA, added)
+    assert not temp.exists()
+
+
+class StreamRequest:
+    """Запрос, тело которого приходит заданными частями."""
+
+    def __init__(self, *chunks: bytes):
+        self.chunks = chunks
+
+    async def stream(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+@pytest.mark.asyncio
+async def test_write_chunk(tmp_path: Path):
+    """Проверка, что часть дописывается с переданного смещения."""
+
+    # Arrange
+    path = tmp_path / "part"
+    path.write_bytes(b"abc")
+
+    # Act
+    async with storage.locked_part(path) as file:
+        received = await storage.write_chunk(
+            StreamRequest(b"de", b"f"), file, 3, 10, chunk_size=1
+        )
+
+    # Assert
+    assert received == 6
+    assert path.read_bytes() == b"abcdef"
+
+
+@pytest.mark.asyncio
+async def test_write_chunk_offset_mismatch(tmp_path: Path):
+    """
+    Проверка, что повтор уже записанной части отклоняется и не 
+    дописывает данные второй раз.
+    """
+
+    # Arrange
+    path = tmp_path / "part"
+    path.write_bytes(b"abcdef")
+
+    # Act
+    with pytest.raises(storage.OffsetMismatch) as error:
+        async with storage.locked_part(path) as file:
+            await storage.write_chunk(StreamRequest(b"def"), file, 3, 10)
+
+    # Assert
+    assert error.value.offset == 6
+    assert path.read_bytes() == b"abcdef"
+
+
+@pytest.mark.asyncio
+async def test_locked_part_busy(tmp_path: Path):
+    """
+    Проверка, что заблокированный файл загрузки не открывается вторым
+    запросом, а после снятия блокировки открывается.
+    """
+
+    # Arrange
+    path = tmp_path / "part"
+    path.write_bytes(b"abc")
+
+    # Act
+    async with storage.locked_part(path):
+        with pytest.raises(storage.UploadBusy):
+            async with storage.locked_part(path):
+                pass
+
+    # Assert
+    async with storage.locked_part(path) as file:
+        assert file.read() == b"abc"
+
+
+@pytest.mark.asyncio
+async def test_locked_part_moved(tmp_path: Path):
+    """
+    Проверка, что файл, перенесенный, пока запрос открывал его 
+    (загрузку завершили), считается отсутствующим.
+    """
+
+    # Arrange
+    path = tmp_path / "part"
+    path.write_bytes(b"abc")
+    moved = os.open(path, os.O_RDWR)
+    path.rename(tmp_path / "blob")
+    path.write_bytes(b"")
+
+    # Act + Assert
+    with patch("app.constructor.storage.os.open", return_value=moved), \
+         pytest.raises(FileNotFoundError):
+        storage.open_part(path)
+
+
+@pytest.mark.parametrize("path, found", [
+    ("ab/a.png", True),
+    (".tmp/a.part", False),
+    ("ab/.a.png", False),
+])
+def test_upload_static_files_hidden(tmp_path: Path, path: str, found: bool):
+    """
+    Проверка, что скрытые файлы и папки не отдаются.
+
+    Args:
+        path: путь файла относительно раздаваемой папки.
+        found: должен ли файл отдаваться.
+    """
+
+    # Arrange
+    (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+    (tmp_path / path).write_bytes(b"data")
+    files = storage.UploadStaticFiles(directory=tmp_path)
+
+    # Act
+    full_path, stat = files.lookup_path(path)
+
+    # Assert
+    assert (stat is not None) == found
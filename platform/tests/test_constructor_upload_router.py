@@ -0,0 +1,525 @@
+from fastapi.testclient import TestClient
+import httpx
+import pytest
+
+from unittest.mock import patch, AsyncMock
+from pathlib import Path
+import asyncio
+import hashlib
+
+from app.main import app
+from app.dao.dao_models import AddedUpload
+from app.migration.models import UploadSession
+from app.users.auth import create_access_token
+
+
+client = TestClient(app)
+client.cookies.set(
+    "users_access_token",
+    create_access_token("upload@test.com", user_id=1),
+)
+
+LIMITS = {
+    "max_file_size": 1024,
+    "max_request_size": 2048,
+    "chunk_size": 100,
+}
+
+
+async def stored_ext(sha256, ext, size, user_id) -> AddedUpload:
+    """Заменяет AssetsDAO.add_upload: файл сохраняется с новым расширением."""
+
+    return AddedUpload(ext, True)
+
+
+@pytest.fixture(autouse=True)
+def uploads(tmp_path) -> Path:
+    """
+    Фикстура, подменяющая папку файлов временной, задающая лимиты 
+    и подменяющая добавление файла в базу данных.
+    """
+
+    with patch("app.constructor.storage.BLOB_DIR", tmp_path), \
+         patch("app.constructor.storage.TEMP_DIR", tmp_path / ".tmp"), \
+         patch.dict("app.constructor.upload_router.UPLOAD_DATA", LIMITS), \
+         patch("app.constructor.storage.AssetsDAO.add_upload", 
+               new_callable=AsyncMock, side_effect=stored_ext):
+        yield tmp_path
+
+
+def user_files(uploads: Path) -> list[str]:
+    """Возвращает пути всех сохраненных файлов, включая временные."""
+
+    return sorted(
+        str(path.relative_to(uploads)) 
+        for path in uploads.rglob("*") if path.is_file()
+    )
+
+
+@pytest.mark.parametrize("size", [0, 99, 100, 1024])
+def test_upload_file(uploads: Path, size: int):
+    """
+    Проверка, что файл сохраняется целиком под именем по хэшу.
+
+    Args:
+        size: размер файла.
+    """
+
+    # Arrange
+    data = bytes(range(256)) * 4
+    data = data[:size]
+
+    # Act
+    response = client.post(
+        "/upload/file/",
+        files={"file": ("music.mp3", data, "audio/mpeg")},
+        data={"title": "x"},
+    )
+
+    # Assert
+    assert response.status_code == 200
+    sha256 = hashlib.sha256(data).hexdigest()
+    assert response.json() == {
+        "url": f"/uploads/blobs/{sha256[:2]}/{sha256}.mp3"
+    }
+    assert user_files(uploads) == [f"{sha256[:2]}/{sha256}.mp3"]
+    assert (uploads / sha256[:2] / f"{sha256}.mp3").read_bytes() == data
+
+
+def test_upload_file_deduplicated(uploads: Path):
+    """Проверка, что одинаковый файл хранится один раз с тем же URL."""
+
+    # Act
+    urls = [
+        client.post(
+            "/upload/file/", files={"file": ("a.png", b"image", "image/png")}
+        ).json()["url"]
+        for _ in range(2)
+    ]
+
+    # Assert
+    assert urls[0] == urls[1]
+    assert len(user_files(uploads)) == 1
+
+
+def test_upload_file_cached_forever(uploads: Path):
+    """Проверка, что файл по хэшу отдается с бессрочным кэшированием."""
+
+    # Arrange
+    url = client.post(
+        "/upload/file/", files={"file": ("a.png", b"image", "image/png")}
+    ).json()["url"]
+
+    blobs = next(route.app for route in app.routes if route.name == "blobs")
+
+    # Act
+    with patch.object(blobs, "all_directories", [uploads]):
+        response = client.get(url)
+
+    # Assert
+    assert response.status_code == 200
+    assert response.content == b"image"
+    assert "immutable" in response.headers["cache-control"]
+
+
+def test_upload_file_db_error(uploads: Path):
+    """Проверка, что при ошибке базы данных файл не остается на диске."""
+
+    # Act
+    with patch("app.constructor.storage.AssetsDAO.add_upload", 
+               new_callable=AsyncMock, side_effect=OSError), \
+         pytest.raises(OSError):
+        client.post(
+            "/upload/file/", files={"file": ("a.png", b"image", "image/png")}
+        )
+
+    # Assert
+    assert user_files(uploads) == []
+
+
+def test_upload_file_too_large(uploads: Path):
+    """Проверка, что слишком большой файл не сохраняется."""
+
+    # Act
+    response = client.post(
+        "/upload/file/",
+        files={"file": ("big.png", b"x" * 1025, "image/png")},
+    )
+
+    # Assert
+    assert response.status_code == 413
+    assert user_files(uploads) == []
+
+
+def test_upload_request_too_large(uploads: Path):
+    """Проверка, что запрос больше лимита отклоняется."""
+
+    # Act
+    response = client.post(
+        "/upload/file/",
+        files={"file": ("a.png", b"x", "image/png")},
+        data={"other": "y" * 3000},
+    )
+
+    # Assert
+    assert response.status_code == 413
+    assert user_files(uploads) == []
+
+
+def test_upload_request_too_large_streaming(uploads: Path):
+    """Проверка лимита запроса без заголовка Content-Length."""
+
+    # Arrange
+    boundary = "bound"
+    body = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="other"\r\n\r\n'
+        + "y" * 3000 +
+        f"\r\n--{boundary}--\r\n"
+    ).encode()
+
+    def chunks():
+        for start in range(0, len(body), 500):
+            yield body[start:start + 500]
+
+    # Act
+    response = client.post(
+        "/upload/file/",
+        content=chunks(),
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+    )
+
+    # Assert
+    assert response.status_code == 413
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"data": {"title": "x"}, "files": {"other": ("a.png", b"x")}},
+    {"json": {"file": "x"}},
+])
+def test_upload_file_bad_request(uploads: Path, kwargs: dict):
+    """
+    Проверка запроса без файла или не в формате multipart.
+
+    Args:
+        kwargs: параметры запроса.
+    """
+
+    # Act
+    response = client.post("/upload/file/", **kwargs)
+
+    # Assert
+    assert response.status_code == 400
+    assert user_files(uploads) == []
+
+
+def test_upload_file_strange_extension(uploads: Path):
+    """Проверка, что подозрительное расширение файла отбрасывается."""
+
+    # Act
+    response = client.post(
+        "/upload/file/",
+        files={"file": ("a.p%g", b"x", "image/png")},
+    )
+
+    # Assert
+    assert response.status_code == 200
+    assert "." not in response.json()["url"].rsplit("/", 1)[1]
+
+
+def test_upload_file_extension_lowercase(uploads: Path):
+    """Проверка, что расширение файла приводится к нижнему регистру."""
+
+    # Act
+    response = client.post(
+        "/upload/file/",
+        files={"file": ("a.PNG", b"x", "image/png")},
+    )
+
+    # Assert
+    assert response.json()["url"].endswith(".png")
+
+
+def test_upload_file_not_authorized():
+    """Проверка, что без токена загрузка недоступна."""
+
+    # Act
+    response = TestClient(app).post(
+        "/upload/file/",
+        files={"file": ("a.png", b"x", "image/png")},
+    )
+
+    # Assert
+    assert response.status_code == 401
+
+
+@pytest.fixture
+def sessions() -> dict:
+    """Фикстура, хранящая загрузки по частям в словаре вместо базы данных."""
+
+    stored = {}
+
+    async def add_session(session_id, user_id, size, ext, sha256):
+        stored[session_id] = UploadSession(
+            id=session_id, user_id=user_id, size=size, ext=ext, sha256=sha256
+        )
+
+    async def find_session(session_id, user_id):
+        upload = stored.get(session_id)
+        return upload if upload and upload.user_id == user_id else None
+
+    async def delete_session(session_id):
+        return stored.pop(session_id, None) is not None
+
+    dao = "app.constructor.upload_router.UploadSessionsDAO"
+    with patch(f"{dao}.add_session", side_effect=add_session), \
+         patch(f"{dao}.find_session", side_effect=find_session), \
+         patch(f"{dao}.delete_session", side_effect=delete_session):
+        yield stored
+
+
+def start_session(data: bytes, **kwargs) -> str:
+    """Начинает загрузку по частям и возвращает ее URL."""
+
+    response = client.post(
+        "/upload/sessions/",
+        json={
+            "filename": "music.MP3",
+            "size": len(data),
+            "sha256": hashlib.sha256(data).hexdigest(),
+            **kwargs,
+        },
+    )
+    assert response.status_code == 200
+    return f"/upload/sessions/{response.json()['id']}"
+
+
+def put_chunk(url: str, data: bytes, offset: int):
+    """Передает часть файла с заданного смещения."""
+
+    return client.put(url, content=data, headers={"Upload-Offset": str(offset)})
+
+
+def test_upload_temp_files_not_served(uploads: Path, sessions: dict):
+    """Проверка, что недописанная загрузка по частям не отдается по URL."""
+
+    # Arrange
+    data = b"0123456789"
+    url = start_session(data)
+    put_chunk(url, data[:5], 0)
+    session_id = url.rstrip("/").rsplit("/", 1)[-1]
+    blobs = next(route.app for route in app.routes if route.name == "blobs")
+
+    # Act
+    with patch.object(blobs, "all_directories", [uploads]):
+        response = client.get(f"/uploads/blobs/.tmp/{session_id}.session")
+
+    # Assert
+    assert (uploads / ".tmp" / f"{session_id}.session").is_file()
+    assert response.status_code == 404
+
+
+def test_upload_session(uploads: Path, sessions: dict):
+    """
+    Проверка, что файл, переданный по частям, сохраняется под именем 
+    по хэшу.
+    """
+
+    # Arrange
+    data = bytes(range(256)) * 4
+    sha256 = hashlib.sha256(data).hexdigest()
+    url = start_session(data)
+
+    # Act
+    offsets = [
+        put_chunk(url, data[start:start + 300], start).json()["offset"]
+        for start in range(0, len(data), 300)
+    ]
+    response = client.post(f"{url}/complete")
+
+    # Assert
+    assert offsets == [300, 600, 900, 1024]
+    assert response.status_code == 200
+    assert response.json() == {
+        "url": f"/uploads/blobs/{sha256[:2]}/{sha256}.mp3"
+    }
+    assert user_files(uploads) == [f"{sha256[:2]}/{sha256}.mp3"]
+    assert (uploads / sha256[:2] / f"{sha256}.mp3").read_bytes() == data
+    assert sessions == {}
+
+
+def test_upload_session_resume(uploads: Path, sessions: dict):
+    """Проверка, что после обрыва загрузка продолжается с полученного места."""
+
+    # Arrange
+    data = b"a" * 500 + b"b" * 500
+    url = start_session(data)
+    put_chunk(url, data[:500], 0)
+
+    # Act
+    offset = client.get(url).json()["offset"]
+    repeated = put_chunk(url, data[:500], 0)
+    put_chunk(url, data[offset:], offset)
+    response = client.post(f"{url}/complete")
+
+    # Assert
+    assert offset == 500
+    assert repeated.status_code == 409
+    assert repeated.json()["offset"] == 500
+    assert response.status_code == 200
+    sha256 = hashlib.sha256(data).hexdigest()
+    assert (uploads / sha256[:2] / f"{sha256}.mp3").read_bytes() == data
+
+
+def test_upload_session_incomplete(uploads: Path, sessions: dict):
+    """Проверка, что незаконченную загрузку нельзя завершить."""
+
+    # Arrange
+    url = start_session(b"x" * 100)
+    put_chunk(url, b"x" * 40, 0)
+
+    # Act
+    response = client.post(f"{url}/complete")
+
+    # Assert
+    assert response.status_code == 409
+    assert response.json()["offset"] == 40
+    assert len(sessions) == 1
+
+
+def test_upload_session_hash_mismatch(uploads: Path, sessions: dict):
+    """Проверка, что файл с другим хэшем не сохраняется."""
+
+    # Arrange
+    url = start_session(b"data", sha256=hashlib.sha256(b"other").hexdigest())
+    put_chunk(url, b"data", 0)
+
+    # Act
+    response = client.post(f"{url}/complete")
+
+    # Assert
+    assert response.status_code == 422
+    assert user_files(uploads) == []
+    assert sessions == {}
+
+
+def test_upload_session_chunk_too_large(uploads: Path, sessions: dict):
+    """Проверка, что нельзя передать больше заявленного размера."""
+
+    # Arrange
+    url = start_session(b"x" * 10)
+
+    # Act
+    response = put_chunk(url, b"x" * 11, 0)
+
+    # Assert
+    assert response.status_code == 413
+    assert client.get(url).json()["offset"] <= 10
+
+
+@pytest.mark.asyncio
+async def test_upload_session_overlapping_chunks(uploads: Path, sessions: dict):
+    """
+    Проверка, что часть, пришедшая, пока пишется прежняя часть той же
+    загрузки, сразу получает 409 (busy), а не пишется одновременно.
+    """
+
+    # Arrange
+    data = b"0123456789"
+    url = start_session(data)
+    sending = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow_body():
+        yield data[:3]
+        sending.set()
+        await release.wait()
+        yield data[3:6]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, 
+        base_url="http://test", 
+        cookies=dict(client.cookies),
+    ) as async_client:
+        # Act
+        first = asyncio.create_task(async_client.put(
+            url, content=slow_body(), headers={"Upload-Offset": "0"}
+        ))
+        await sending.wait()
+        second = await async_client.put(
+            url, content=data[:6], headers={"Upload-Offset": "0"}
+        )
+        release.set()
+        first = await first
+
+    # Assert
+    assert second.status_code == 409
+    assert second.json()["busy"] is True
+    assert first.status_code == 200
+    assert first.json() == {"offset": 6}
+    assert put_chunk(url, data[6:], 6).json() == {"offset": 10}
+    assert client.post(f"{url}/complete").status_code == 200
+
+
+def test_upload_session_without_hash(uploads: Path, sessions: dict):
+    """Проверка, что загрузку по частям нельзя начать без хэша файла."""
+
+    # Act
+    response = client.post(
+        "/upload/sessions/", json={"filename": "a.mp3", "size": 10}
+    )
+
+    # Assert
+    assert response.status_code == 422
+    assert sessions == {}
+
+
+def test_upload_session_file_too_large(uploads: Path, sessions: dict):
+    """Проверка, что загрузка файла больше лимита не начинается."""
+
+    # Act
+    response = client.post(
+        "/upload/sessions/", 
+        json={"filename": "a.mp3", "size": 1025, "sha256": "0" * 64},
+    )
+
+    # Assert
+    assert response.status_code == 413
+    assert sessions == {}
+    assert user_files(uploads) == []
+
+
+def test_upload_session_other_user(uploads: Path, sessions: dict):
+    """Проверка, что чужая загрузка не находится."""
+
+    # Arrange
+    url = start_session(b"x")
+    other = TestClient(app)
+    other.cookies.set(
+        "users_access_token", create_access_token("other@test.com", user_id=2)
+    )
+
+    # Act + Assert
+    assert other.get(url).status_code == 404
+    assert other.put(
+        url, content=b"x", headers={"Upload-Offset": "0"}
+    ).status_code == 404
+    assert other.post(f"{url}/complete").status_code == 404
+
+
+def test_upload_session_cancel(uploads: Path, sessions: dict):
+    """Проверка, что отмененная загрузка удаляется вместе с данными."""
+
+    # Arrange
+    url = start_session(b"x" * 10)
+    put_chunk(url, b"x" * 5, 0)
+
+    # Act
+    response = client.delete(url)
+
+    # Assert
+    assert response.status_code == 200
+    assert sessions == {}
+    assert user_files(uploads) == []
+    assert client.get(url).status_code == 404
@@ -0,0 +1,198 @@
+import pytest
+from PIL import Image
+from sqlalchemy import text
+
+from unittest.mock import patch
+from io import BytesIO
+from pathlib import Path
+
+from app.constructor import storage, variants
+from app.dao.dao_models import AssetsDAO, UsersDAO
+from app.database import async_engine
+from app.migration.models import Asset
+
+
+SHA = "ab" + "0" * 62
+
+
+@pytest.fixture
+def blobs(tmp_path) -> Path:
+    """Фикстура, подменяющая папки файлов временными."""
+
+    with patch("app.constructor.storage.BLOB_DIR", tmp_path), \
+         patch("app.constructor.storage.TEMP_DIR", tmp_path / ".tmp"):
+        yield tmp_path
+
+
+@pytest.fixture(scope="function")
+async def user_id():
+    """Фикстура, создающая пользователя и очищающая файлы после теста."""
+
+    user_id = await UsersDAO.add_user("artist", "hash", "artist@test.com")
+    yield user_id
+    async with async_engine.begin() as conn:
+        await conn.execute(
+            text("TRUNCATE users, assets RESTART IDENTITY CASCADE;")
+        )
+
+
+def save_image(blobs: Path, image: Image.Image, ext: str, **kwargs) -> None:
+    """Сохраняет изображение как загруженный файл с хэшем SHA."""
+
+    (blobs / SHA[:2]).mkdir(exist_ok=True)
+    image.save(blobs / SHA[:2] / f"{SHA}{ext}", **kwargs)
+
+
+def test_make_variants(blobs: Path):
+    """Проверка, что делаются копия WebP и уменьшенные копии меньше исходной."""
+
+    # Arrange
+    image = Image.new("RGBA", (1000, 500), (255, 0, 0, 128))
+    save_image(blobs, image, ".png")
+
+    # Act
+    done = variants.make_variants(SHA, ".png", [320, 640, 1280], 80)
+
+    # Assert
+    assert done == [320, 640]
+    with Image.open(variants.variant_path(SHA)) as full:
+        assert full.format == "WEBP"
+        assert full.size == (1000, 500)
+    with Image.open(variants.variant_path(SHA, 320)) as thumbnail:
+        assert thumbnail.size == (320, 160)
+        assert thumbnail.mode == "RGBA"
+    assert not variants.variant_path(SHA, 1280).exists()
+    assert list((blobs / ".tmp").iterdir()) == []
+
+
+def test_make_variants_webp_source(blobs: Path):
+    """Проверка, что для изображения WebP копия исходного размера не нужна."""
+
+    # Arrange
+    save_image(blobs, Image.new("RGB", (400, 400)), ".webp")
+
+    # Act
+    done = variants.make_variants(SHA, ".webp", [320], 80)
+
+    # Assert
+    assert done == [320]
+    assert variants.variant_path(SHA, 320).exists()
+    assert sorted(path.name for path in (blobs / SHA[:2]).iterdir()) == [
+        f"{SHA}.webp", f"{SHA}_320.webp"
+    ]
+
+
+def test_make_variants_animated(blobs: Path):
+    """Проверка, что анимированное изображение не обрабатывается."""
+
+    # Arrange
+    frames = [Image.new("RGB", (400, 400), color) for color in ("red", "blue")]
+    save_image(blobs, frames[0], ".png", save_all=True, append_images=frames[1:])
+
+    # Act + Assert
+    assert variants.make_variants(SHA, ".png", [320], 80) is None
+    assert not variants.variant_path(SHA).exists()
+
+
+@pytest.mark.parametrize("status, ext, width, expected", [
+    ("pending", ".png", 320, f"{SHA}.png"),
+    ("failed", ".png", None, f"{SHA}.png"),
+    ("done", ".png", 300, f"{SHA}_320.webp"),
+    ("done", ".png", 320, f"{SHA}_320.webp"),
+    ("done", ".png", 500, f"{SHA}_640.webp"),
+    ("done", ".png", 2000, f"{SHA}.webp"),
+    ("done", ".png", None, f"{SHA}.webp"),
+    ("done", ".webp", 2000, f"{SHA}.webp"),
+])
+def test_image_url(status: str, ext: str, width: int | None, expected: str):
+    """
+    Проверка выбора копии изображения для ширины.
+
+    Args:
+        status: состояние обработки файла.
+        ext: расширение исходного файла.
+        width: ширина показа.
+        expected: ожидаемое имя файла.
+    """
+
+    # Arrange
+    asset = Asset(
+        sha256=SHA, ext=ext, variants_status=status, variants=[640, 320]
+    )
+
+    # Act + Assert
+    assert variants.image_url(asset, width) == f"/uploads/blobs/ab/{expected}"
+
+
+@pytest.mark.asyncio
+async def test_worker_run_once(blobs: Path, user_id: int):
+    """Проверка, что обработчик делает копии изображений и пропускает остальное."""
+
+    # Arrange
+    image = BytesIO()
+    Image.new("RGB", (700, 350), "green").save(image, "PNG")
+    png = await storage.save_upload(user_id, image.getvalue())
+    mp3 = await storage.save_upload(user_id, b"music", ".mp3")
+    broken = await storage.save_upload(user_id, b"not an image")
+    worker = variants.VariantWorker([320, 640], batch_size=8)
+
+    # Act
+    taken = await worker.run_once()
+
+    # Assert
+    assert taken == 3
+    assert await worker.run_once() == 0
+    urls = await variants.variant_urls([png, mp3, broken, "/other.png"], 400)
+    assert urls == {
+        png: png.replace(".png", "_640.webp"),
+        mp3: mp3,
+        broken: broken,
+    }
+    assets = await AssetsDAO.find_assets(
+        [storage.parse_blob_url(url)[0] for url in (png, mp3, broken)]
+    )
+    assert sorted(asset.variants_status for asset in assets.values()) == [
+        "done", "failed", "skipped"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_worker_missing_file(blobs: Path, user_id: int):
+    """Проверка, что файл, которого еще нет на диске, обрабатывается позже."""
+
+    # Arrange
+    await AssetsDAO.add_upload(SHA, ".png", 10, user_id)
+    worker = variants.VariantWorker([320])
+
+    # Act
+    taken = await worker.run_once()
+
+    # Assert
+    assert taken == 1
+    asset = (await AssetsDAO.find_assets([SHA]))[SHA]
+    assert asset.variants_status == "pending"
+    assert await worker.run_once() == 0
+
+
+@pytest.mark.asyncio
+async def test_worker_missing_file_after_lease(blobs: Path, user_id: int):
+    """
+    Проверка, что файл, которого нет на диске и после окончания lease,
+    отмечается failed, а не обрабатывается снова бесконечно.
+    """
+
+    # Arrange
+    await AssetsDAO.add_upload(SHA, ".png", 10, user_id)
+    async with async_engine.begin() as conn:
+        await conn.execute(text(
+            "UPDATE assets SET created_at = created_at - interval '1 hour'"
+        ))
+    worker = variants.VariantWorker([320])
+
+    # Act
+    taken = await worker.run_once()
+
+    # Assert
+    assert taken == 1
+    asset = (await AssetsDAO.find_assets([SHA]))[SHA]
+    assert asset.variants_status == "failed"
@@ -0,0 +1,145 @@
+import pytest
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.dao.count_cache import TableCountCache
+from app.migration.models import Novell
+
+
+def make_session(*values) -> AsyncMock:
+    """
+    Создает сессию, запросы которой по очереди возвращают values.
+
+    Args:
+        values: значения, которые вернет result.scalar().
+    """
+
+    session = AsyncMock()
+    results = []
+    for value in values:
+        result = MagicMock()
+        result.scalar.return_value = value
+        results.append(result)
+    session.execute = AsyncMock(side_effect=results)
+    return session
+
+
+def test_count_cache_wrong_mode():
+    """Проверка, что неизвестный режим подсчета вызывает ValueError."""
+
+    # Act + Assert
+    with pytest.raises(ValueError):
+        TableCountCache(Novell, mode="wrong")
+
+
+@pytest.mark.asyncio
+async def test_count_cache_hit():
+    """Проверка, что значение берется из кэша до истечения ttl."""
+
+    # Arrange
+    cache = TableCountCache(Novell, ttl=60)
+    session = make_session(10)
+
+    # Act
+    first = await cache.get(session)
+    second = await cache.get(session)
+
+    # Assert
+    assert first == 10
+    assert second == 10
+    session.execute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_count_cache_expired():
+    """Проверка, что значение пересчитывается после истечения ttl."""
+
+    # Arrange
+    cache = TableCountCache(Novell, ttl=60)
+    session = make_session(10, 11)
+
+    # Act
+    with patch("app.dao.count_cache.time.monotonic", return_value=0):
+        first = await cache.get(session)
+    with patch("app.dao.count_cache.time.monotonic", return_value=61):
+        second = await cache.get(session)
+
+    # Assert
+    assert first == 10
+    assert second == 11
+
+
+@pytest.mark.asyncio
+async def test_count_cache_invalidate():
+    """Проверка, что после сброса значение пересчитывается."""
+
+    # Arrange
+    cache = TableCountCache(Novell, ttl=60)
+    session = make_session(10, 11)
+
+    # Act
+    await cache.get(session)
+    cache.invalidate()
+    value = await cache.get(session)
+
+    # Assert
+    assert value == 11
+    assert session.execute.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_count_cache_invalidate_during_count():
+    """Проверка, что значение, подсчитанное до сброса, не сохраняется."""
+
+    # Arrange
+    cache = TableCountCache(Novell, ttl=60)
+    session = make_session(10, 11)
+    count = session.execute.side_effect
+
+    async def execute(*args):
+        # Сброс приходит, пока выполняется запрос подсчета
+        cache.invalidate()
+        return next(count)
+
+    session.execute = AsyncMock(side_effect=execute)
+
+    # Act
+    first = await cache.get(session)
+    second = await cache.get(session)
+
+    # Assert
+    assert first == 10
+    assert second == 11
+
+
+@pytest.mark.asyncio
+async def test_count_cache_estimate():
+    """Проверка режима оценки количества строк."""
+
+    # Arrange
+    cache = TableCountCache(Novell, mode="estimate")
+    session = make_session(1000)
+
+    # Act
+    value = await cache.get(session)
+
+    # Assert
+    assert value == 1000
+    query = str(session.execute.call_args[0][0])
+    assert "pg_class" in query
+
+
+@pytest.mark.asyncio
+async def test_count_cache_estimate_without_statistics():
+    """Проверка, что без статистики используется точный подсчет."""
+
+    # Arrange
+    cache = TableCountCache(Novell, mode="estimate")
+    session = make_session(-1, 5)
+
+    # Act
+    value = await cache.get(session)
+
+    # Assert
+    assert value == 5
+    assert session.execute.await_count == 2
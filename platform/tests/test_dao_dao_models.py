@@ -3,6 +3,7 @@ from sqlalchemy import pool, select, text, insert
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
+from datetime import timedelta
 from os import getenv
 from dotenv import load_dotenv
 
@@ -43,7 +44,7 @@ async def async_session():
         yield session
 
     async with engine.begin() as conn:
-        await conn.execute(text("TRUNCATE users RESTART IDENTITY CASCADE;"))
+        await conn.execute(text("TRUNCATE users, assets RESTART IDENTITY CASCADE;"))
     
     await engine.dispose()
 
@@ -58,7 +59,7 @@ async def test_add_user(async_session):
     password = "12356645"
 
     # Act
-    await dao_models.UsersDAO.add_user(
+    user_id = await dao_models.UsersDAO.add_user(
         username=username,
         email=email,
         password=password,
@@ -69,6 +70,7 @@ async def test_add_user(async_session):
     db_user = result.scalar_one_or_none()
 
     assert db_user is not None
+    assert db_user.id == user_id
     assert db_user.username == username
     assert db_user.email == email
     assert db_user.password == password
@@ -205,17 +207,16 @@ async def test_update_password_for_exist_user(async_session):
 
     # Act
     new_password = "sdfsdfsdf334"
-    flag = await dao_models.UsersDAO.update_user_password(
+    user_id = await dao_models.UsersDAO.update_user_password(
         email=email,
         password=new_password,
     )
 
     # Assert
-    assert flag == True
-
     result = await async_session.execute(select(mig_models.User))
     db_user = result.scalar_one_or_none()
 
+    assert user_id == db_user.id
     assert db_user.password == new_password
 
 
@@ -228,13 +229,13 @@ async def test_update_password_for_not_exist_user(async_session):
 
     # Act
     new_password = "sdfsdfsdf334"
-    flag = await dao_models.UsersDAO.update_user_password(
+    user_id = await dao_models.UsersDAO.update_user_password(
         email=email,
         password=new_password,
     )
 
     # Assert
-    assert flag == False
+    assert user_id is None
 
     result = await async_session.execute(select(mig_models.User))
     db_user = result.scalar_one_or_none()
@@ -372,4 +373,417 @@ async def test_delete_user_sqlalchemyerror():
     with pytest.raises(SQLAlchemyError):
         await dao_models.UsersDAO.delete_user(
             email=email,
-        )
\ No newline at end of file
+        )
+
+@pytest.mark.asyncio
+async def test_add_and_find_user_in_request_session(async_session):
+    """
+    Проверка, что dao-функции с сессией запроса работают в одной транзакции
+    и изменения фиксируются только после коммита.
+    """
+
+    # Arrange
+    username = "xxxxxxxxxxxx"
+    email = "dmdmd@mail.ru"
+    password = "12356645"
+
+    async with dao_models.async_session_maker() as request_session:
+
+        # Act
+        await dao_models.UsersDAO.add_user(
+            username=username,
+            email=email,
+            password=password,
+            session=request_session,
+        )
+        db_user = await dao_models.UsersDAO.find_user(
+            email=email,
+            session=request_session,
+        )
+
+        # Assert
+        assert db_user is not None
+        assert db_user.username == username
+
+        result = await async_session.execute(select(mig_models.User))
+        assert result.scalar_one_or_none() is None
+
+        await request_session.commit()
+
+    result = await async_session.execute(select(mig_models.User))
+    assert result.scalar_one_or_none() is not None
+
+
+def test_novels_select_cards_without_data():
+    """Проверка, что запрос карточек новелл не загружает столбец data."""
+
+    # Act
+    query = str(dao_models.NovelsDAO._select_cards())
+
+    # Assert
+    assert "novels.title" in query
+    assert "novels.preview" in query
+    assert "novels.data" not in query
+
+
+async def add_test_user(async_session) -> int:
+    """
+    Добавляет пользователя для тестов новелл.
+
+    Returns:
+        Id пользователя.
+    """
+
+    query = insert(mig_models.User).values(
+        username="novelist",
+        password="12345678",
+        email="novelist@mail.ru",
+    ).returning(mig_models.User.id)
+    user_id = (await async_session.execute(query)).scalar()
+    await async_session.commit()
+    return user_id
+
+
+@pytest.mark.asyncio
+async def test_add_novel(async_session):
+    """Проверка добавления новеллы и возврата ее id."""
+
+    # Arrange
+    user_id = await add_test_user(async_session)
+    data = {"bgImage": "/uploads/novels/1/bg.png", "dialogData": []}
+
+    # Act
+    novel_id = await dao_models.NovelsDAO.add_novel(
+        user_id=user_id,
+        title="Новелла",
+        data=data,
+        preview=None,
+    )
+
+    # Assert
+    novel = await dao_models.NovelsDAO.find_by_id(novel_id)
+    assert novel is not None
+    assert novel.user_id == user_id
+    assert novel.data == data
+
+
+@pytest.mark.asyncio
+async def test_add_novel_invalidates_count_after_commit(async_session):
+    """
+    Проверка, что кэш количества новелл сбрасывается после фиксации,
+    а не количество, прочитанное до фиксации, остается в кэше.
+    """
+
+    # Arrange
+    user_id = await add_test_user(async_session)
+    cache = dao_models.NovelsDAO.count_cache
+    cache.invalidate()
+
+    # Act
+    async with dao_models.async_session_maker() as session:
+        await dao_models.NovelsDAO.add_novel(
+            user_id=user_id, title="Новелла", data={}, session=session
+        )
+        # Другой запрос читает количество до фиксации
+        before_commit = await cache.get(async_session)
+        await async_session.commit()
+        await session.commit()
+    after_commit = await cache.get(async_session)
+
+    # Assert
+    assert before_commit == 0
+    assert after_commit == 1
+
+
+@pytest.mark.asyncio
+async def test_find_page_after(async_session):
+    """Проверка постраничного вывода новелл по курсору."""
+
+    # Arrange
+    user_id = await add_test_user(async_session)
+    for number in range(5):
+        await dao_models.NovelsDAO.add_novel(
+            user_id=user_id,
+            title=f"Новелла {number}",
+            data={},
+        )
+
+    # Act
+    first = await dao_models.NovelsDAO.find_page_after(3)
+    last = first[-1]
+    second = await dao_models.NovelsDAO.find_page_after(
+        3, 
+        (last.created_at, last.id),
+    )
+
+    # Assert
+    ids = [novel.id for novel in first + second]
+    assert len(first) == 3
+    assert len(second) == 2
+    assert ids == sorted(ids, reverse=True)
+    assert len(set(ids)) == 5
+
+
+@pytest.mark.asyncio
+async def test_find_paginated_all_total(async_session):
+    """Проверка общего количества новелл при выводе через skip и limit."""
+
+    # Arrange
+    user_id = await add_test_user(async_session)
+    dao_models.NovelsDAO.count_cache.invalidate()
+    for number in range(3):
+        await dao_models.NovelsDAO.add_novel(
+            user_id=user_id,
+            title=f"Новелла {number}",
+            data={},
+        )
+
+    # Act
+    novels, total = await dao_models.NovelsDAO.find_paginated_all(1, 10)
+
+    # Assert
+    assert len(novels) == 2
+    assert total == 3
+
+
+@pytest.mark.asyncio
+async def test_find_by_title(async_session):
+    """Проверка поиска новеллы пользователя по названию."""
+
+    # Arrange
+    user_id = await add_test_user(async_session)
+    novel_id = await dao_models.NovelsDAO.add_novel(
+        user_id=user_id,
+        title="Новелла",
+        data={},
+    )
+
+    # Act
+    novel = await dao_models.NovelsDAO.find_by_title(user_id, "Новелла")
+    not_found = await dao_models.NovelsDAO.find_by_title(user_id + 1, "Новелла")
+
+    # Assert
+    assert novel is not None
+    assert novel.id == novel_id
+    assert not_found is None
+
+
+@pytest.mark.asyncio
+async def test_same_title_for_different_users(async_session):
+    """
+    Проверка, что название новеллы уникально только в пределах 
+    пользователя.
+    """
+
+    # Arrange
+    first_id = await add_test_user(async_session)
+    query = insert(mig_models.User).values(
+        username="other",
+        password="12345678",
+        email="other@mail.ru",
+    ).returning(mig_models.User.id)
+    second_id = (await async_session.execute(query)).scalar()
+    await async_session.commit()
+
+    await dao_models.NovelsDAO.add_novel(
+        user_id=first_id, 
+        title="Новелла", 
+        data={},
+    )
+
+    # Act
+    await dao_models.NovelsDAO.add_novel(
+        user_id=second_id,
+        title="Новелла",
+        data={},
+    )
+
+    # Assert
+    with pytest.raises(IntegrityError):
+        await dao_models.NovelsDAO.add_novel(
+            user_id=first_id,
+            title="Новелла",
+            data={},
+        )
+
+
+@pytest.mark.asyncio
+async def test_add_upload_deduplicates(async_session):
+    """Проверка, что одинаковый файл хранится один раз с прежним расширением."""
+
+    # Arrange
+    user_id = await add_test_user(async_session)
+    sha256 = "a" * 64
+
+    # Act
+    first = await dao_models.AssetsDAO.add_upload(sha256, ".png", 3, user_id)
+    second = await dao_models.AssetsDAO.add_upload(sha256, ".jpg", 3, user_id)
+
+    # Assert
+    assert first.ext == second.ext == ".png"
+    assert first.new_asset and not second.new_asset
+    assert first.ref_id is not None and second.ref_id is None
+    assets = await async_session.execute(select(mig_models.Asset))
+    assert len(assets.all()) == 1
+    refs = await async_session.execute(select(mig_models.AssetRef))
+    assert len(refs.all()) == 1
+
+
+@pytest.mark.asyncio
+async def test_discard_upload(async_session):
+    """
+    Проверка, что отменяются только записи, добавленные этим вызовом
+    add_upload, а запись о файле удаляет вызов, который ее добавил.
+    """
+
+    # Arrange
+    user_id = await add_test_user(async_session)
+    other_id = await dao_models.UsersDAO.add_user(
+        "other", "hash", "other@test.com"
+    )
+    sha256 = "a" * 64
+    first = await dao_models.AssetsDAO.add_upload(sha256, ".png", 3, user_id)
+    second = await dao_models.AssetsDAO.add_upload(sha256, ".png", 3, other_id)
+
+    # Act
+    await dao_models.AssetsDAO.discard_upload(sha256, second)
+    kept = await async_session.execute(select(mig_models.Asset.sha256))
+    kept = kept.scalars().all()
+    await dao_models.AssetsDAO.discard_upload(sha256, first)
+
+    # Assert
+    assert kept == [sha256]
+    assets = await async_session.execute(select(mig_models.Asset))
+    assert assets.all() == []
+    refs = await async_session.execute(select(mig_models.AssetRef))
+    assert refs.all() == []
+
+
+@pytest.mark.asyncio
+async def test_find_user_asset(async_session):
+    """Проверка, что файл находится только у пользователя со ссылкой на него."""
+
+    # Arrange
+    user_id = await add_test_user(async_session)
+    sha256 = "b" * 64
+    await dao_models.AssetsDAO.add_upload(sha256, ".png", 3, user_id)
+
+    # Act
+    own = await dao_models.AssetsDAO.find_user_asset(user_id, sha256)
+    other = await dao_models.AssetsDAO.find_user_asset(user_id + 1, sha256)
+
+    # Assert
+    assert own.ext == ".png"
+    assert other is None
+
+
+@pytest.mark.asyncio
+async def test_link_novel_only_own_files(async_session):
+    """Проверка, что новелла ссылается только на файлы своего автора."""
+
+    # Arrange
+    user_id = await add_test_user(async_session)
+    other_id = await dao_models.UsersDAO.add_user(
+        "other", "hash", "other@test.com"
+    )
+    novel_id = await dao_models.NovelsDAO.add_novel(
+        user_id=user_id, title="Новелла", data={}
+    )
+    own, foreign = "c" * 64, "d" * 64
+    await dao_models.AssetsDAO.add_upload(own, ".png", 3, user_id)
+    await dao_models.AssetsDAO.add_upload(foreign, ".png", 3, other_id)
+
+    # Act
+    linked = await dao_models.AssetsDAO.link_novel(
+        user_id, novel_id, [own, foreign, "e" * 64]
+    )
+
+    # Assert
+    assert linked == {own}
+    refs = await async_session.execute(
+        select(mig_models.AssetRef.sha256)
+        .where(mig_models.AssetRef.novel_id == novel_id)
+    )
+    assert refs.scalars().all() == [own]
+
+
+@pytest.mark.asyncio
+async def test_delete_unused(async_session):
+    """
+    Проверка, что удаляются только устаревшие файлы без ссылок новелл
+    и возвращаются строки удаленных файлов.
+    """
+
+    # Arrange
+    user_id = await add_test_user(async_session)
+    novel_id = await dao_models.NovelsDAO.add_novel(
+        user_id=user_id, title="Новелла", data={}
+    )
+    used, unused = "c" * 64, "d" * 64
+    for sha256 in (used, unused):
+        await dao_models.AssetsDAO.add_upload(sha256, ".png", 3, user_id)
+    await dao_models.AssetsDAO.link_novel(
+        user_id, novel_id, [used, "e" * 64]
+    )
+
+    # Act
+    fresh = await dao_models.AssetsDAO.delete_unused(
+        dao_models.utc_now() - timedelta(days=1)
+    )
+    stale = await dao_models.AssetsDAO.delete_unused(
+        dao_models.utc_now() + timedelta(seconds=1)
+    )
+
+    # Assert
+    assert fresh == []
+    assert [(row.sha256, row.ext) for row in stale] == [(unused, ".png")]
+    assets = await async_session.execute(select(mig_models.Asset.sha256))
+    assert assets.scalars().all() == [used]
+    refs = await async_session.execute(select(mig_models.AssetRef.novel_id))
+    assert refs.scalars().all() == [novel_id]
+
+
+@pytest.mark.asyncio
+async def test_upload_sessions(async_session):
+    """Проверка, что загрузка по частям находится только у ее пользователя."""
+
+    # Arrange
+    user_id = await add_test_user(async_session)
+    await dao_models.UploadSessionsDAO.add_session(
+        "a" * 32, user_id, 100, ".mp3", "b" * 64
+    )
+
+    # Act
+    own = await dao_models.UploadSessionsDAO.find_session("a" * 32, user_id)
+    other = await dao_models.UploadSessionsDAO.find_session("a" * 32, user_id + 1)
+    deleted = await dao_models.UploadSessionsDAO.delete_session("a" * 32)
+    again = await dao_models.UploadSessionsDAO.delete_session("a" * 32)
+
+    # Assert
+    assert (own.size, own.ext, own.sha256) == (100, ".mp3", "b" * 64)
+    assert other is None
+    assert deleted is True
+    assert again is False
+
+
+@pytest.mark.asyncio
+async def test_upload_sessions_delete_expired(async_session):
+    """Проверка, что удаляются только устаревшие загрузки по частям."""
+
+    # Arrange
+    user_id = await add_test_user(async_session)
+    await dao_models.UploadSessionsDAO.add_session(
+        "a" * 32, user_id, 1, "", "b" * 64
+    )
+
+    # Act
+    fresh = await dao_models.UploadSessionsDAO.delete_expired(
+        dao_models.utc_now() - timedelta(days=1)
+    )
+    stale = await dao_models.UploadSessionsDAO.delete_expired(
+        dao_models.utc_now() + timedelta(seconds=1)
+    )
+
+    # Assert
+    assert fresh == []
+    assert stale == ["a" * 32]
@@ -1,6 +1,9 @@
 from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from sqlalchemy import pool
+import pytest
 
 from os import getenv
+from unittest.mock import AsyncMock
 from dotenv import load_dotenv
 
 import app.database as database
@@ -40,6 +43,7 @@ def test_get_token_data():
     # Assert
     assert data["secret_key"] == secret_key
     assert data["algorithm"] == algorithm
+    assert data["cache_size"] == int(getenv("TOKEN_CACHE_SIZE", "1024"))
 
 
 def test_get_email_data():
@@ -75,4 +79,132 @@ def test_database_global_variable():
     assert database.EMAIL_DATA["smtp_port"] != None
 
     assert isinstance(database.async_engine, AsyncEngine) == True
-    assert isinstance(database.async_session_maker, async_sessionmaker) == True
\ No newline at end of file
+    assert isinstance(database.async_session_maker, async_sessionmaker) == True
+
+def test_get_pool_data():
+    """Проверка функции, возвращающей настройки пула соединений."""
+
+    # Act
+    data = database.get_pool_data()
+
+    # Assert
+    assert data["pool_mode"] == getenv("DB_POOL_MODE", "queue")
+    assert data["pool_size"] == int(getenv("DB_POOL_SIZE", "10"))
+    assert data["max_overflow"] == int(getenv("DB_MAX_OVERFLOW", "10"))
+    assert data["pool_timeout"] == int(getenv("DB_POOL_TIMEOUT", "30"))
+    assert data["pool_recycle"] == int(getenv("DB_POOL_RECYCLE", "1800"))
+    assert isinstance(data["pool_pre_ping"], bool)
+    assert data["pool_warmup"] == int(getenv("DB_POOL_WARMUP", "5"))
+
+
+def test_get_variants_data(monkeypatch):
+    """Проверка, что ширины уменьшенных копий читаются по возрастанию."""
+
+    # Arrange
+    monkeypatch.setenv("IMAGE_VARIANT_WIDTHS", "1280,320,")
+
+    # Act
+    data = database.get_variants_data()
+
+    # Assert
+    assert data["widths"] == [320, 1280]
+    assert data["quality"] == int(getenv("IMAGE_WEBP_QUALITY", "80"))
+
+
+@pytest.mark.parametrize("pool_mode, pool_class", [
+    ("null", pool.NullPool),
+    ("queue", pool.AsyncAdaptedQueuePool),
+])
+def test_create_database_engine(pool_mode: str, pool_class: type):
+    """
+    Проверка, что движок создается с пулом нужного типа.
+
+    Args:
+        pool_mode: режим пула соединений.
+        pool_class: ожидаемый класс пула.
+    """
+
+    # Arrange
+    pool_data = database.get_pool_data()
+    pool_data["pool_mode"] = pool_mode
+
+    # Act
+    engine = database.create_database_engine(database.DB_URL, pool_data)
+
+    # Assert
+    assert isinstance(engine, AsyncEngine)
+    assert isinstance(engine.pool, pool_class)
+
+
+@pytest.mark.asyncio
+async def test_warmup_pool_null_pool():
+    """Проверка, что прогрев не открывает соединений без пула."""
+
+    # Arrange
+    pool_data = database.get_pool_data()
+    pool_data["pool_mode"] = "null"
+    engine = database.create_database_engine(database.DB_URL, pool_data)
+
+    # Act
+    opened = await database.warmup_pool(engine, 5)
+
+    # Assert
+    assert opened == 0
+
+
+@pytest.mark.asyncio
+async def test_warmup_pool():
+    """Проверка, что прогрев оставляет открытые соединения в пуле."""
+
+    # Arrange
+    pool_data = database.get_pool_data()
+    pool_data["pool_mode"] = "queue"
+    pool_data["pool_size"] = 3
+    engine = database.create_database_engine(database.DB_URL, pool_data)
+
+    # Act
+    opened = await database.warmup_pool(engine, 5)
+
+    # Assert
+    assert opened == 3
+    assert engine.pool.checkedin() == 3
+
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_get_session_commit():
+    """Проверка, что сессия запроса фиксирует транзакцию после запроса."""
+
+    # Arrange
+    dependency = database.get_session()
+    session = await anext(dependency)
+    session.commit = AsyncMock()
+    session.rollback = AsyncMock()
+
+    # Act
+    with pytest.raises(StopAsyncIteration):
+        await anext(dependency)
+
+    # Assert
+    session.commit.assert_awaited_once()
+    session.rollback.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_get_session_rollback():
+    """Проверка, что сессия запроса откатывает транзакцию при ошибке."""
+
+    # Arrange
+    dependency = database.get_session()
+    session = await anext(dependency)
+    session.commit = AsyncMock()
+    session.rollback = AsyncMock()
+
+    # Act
+    with pytest.raises(ValueError):
+        await dependency.athrow(ValueError())
+
+    # Assert
+    session.rollback.assert_awaited_once()
+    session.commit.assert_not_awaited()
@@ -56,6 +56,22 @@ def test_user_class_inheritance():
     assert issubclass(mig_models.User, mig_models.Base)
 
 
+def test_email_outbox_class_init():
+    """Проверка, что класс email_outbox существует."""
+
+    # Act
+    email = mig_models.EmailOutbox(
+        recipient="hello@mail.ru",
+        subject="title",
+        body="text",
+    )
+
+    # Assert
+    assert email.recipient == "hello@mail.ru"
+    assert email.__tablename__ == "email_outbox"
+    assert issubclass(mig_models.EmailOutbox, mig_models.Base)
+
+
 load_dotenv()
 
 
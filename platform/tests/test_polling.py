@@ -0,0 +1,84 @@
+import pytest
+
+import asyncio
+
+from app.polling import PollingWorker
+
+
+class CountingWorker(PollingWorker):
+    """Обработчик, который берет задачи из списка пачек."""
+
+    def __init__(self, batches: list[int], **kwargs):
+        super().__init__(**kwargs)
+        self.batches = batches
+        self.calls = 0
+        self.idle = asyncio.Event()
+
+    async def run_once(self) -> int:
+        self.calls += 1
+        if not self.batches:
+            self.idle.set()
+            return 0
+        return self.batches.pop(0)
+
+
+@pytest.mark.asyncio
+async def test_worker_runs_full_batches_without_waiting():
+    """Проверка, что после полной пачки следующая берется сразу."""
+
+    # Arrange
+    worker = CountingWorker([2, 2, 1], poll_interval=60, batch_size=2)
+
+    # Act
+    worker.start()
+    await asyncio.sleep(0.05)
+    calls = worker.calls
+    worker.batches.append(1)
+    worker.notify()
+    await asyncio.sleep(0.05)
+    await worker.stop()
+
+    # Assert
+    assert calls == 3
+    assert worker.calls == 4
+    assert worker._task is None
+
+
+@pytest.mark.asyncio
+async def test_worker_survives_error():
+    """Проверка, что ошибка пачки не останавливает обработчик."""
+
+    # Arrange
+    worker = CountingWorker([], poll_interval=0.01)
+    errors = [RuntimeError("boom")]
+    run_once = worker.run_once
+
+    async def failing() -> int:
+        if errors:
+            raise errors.pop()
+        return await run_once()
+
+    worker.run_once = failing
+
+    # Act
+    worker.start()
+    await asyncio.wait_for(worker.idle.wait(), timeout=5)
+    await worker.stop()
+
+    # Assert
+    assert errors == []
+
+
+def test_worker_without_run_once():
+    """
+    Проверка, что обработчик без run_once нельзя создать, а не падать
+    в цикле на каждой пачке.
+    """
+
+    # Arrange
+    class BrokenWorker(PollingWorker):
+        pass
+
+    # Act + Assert
+    with pytest.raises(TypeError):
+        BrokenWorker(poll_interval=1)
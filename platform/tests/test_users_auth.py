@@ -7,9 +7,10 @@ from os import getenv
 from dotenv import load_dotenv
 from typing import Literal
 from unittest.mock import AsyncMock, patch
+import asyncio
+import threading
 
 import app.users.auth as auth
-from app.database import EMAIL_DATA
 
 
 load_dotenv()
@@ -201,41 +202,180 @@ def test_verify_password_false(password: str, fake_password: str):
 
 
 @pytest.mark.asyncio
-async def test_send_verification_email():
-    """Проверка корректности функции отправки письма на почту."""
+async def test_password_hash_async():
+    """Проверка асинхронного хэширования и сравнения пароля."""
 
     # Arrange
-    email = "hello@mail.ru"
-    title = "test"
-    text = "Hello"
-    url = "/verify"
-    fake_token = "abc123"
-    user_id = -1
-    correct_link = f"http://localhost:8000{url}?token={fake_token}"
-
-    with patch("app.users.auth.create_access_token", return_value=fake_token):
-        with patch("app.users.auth.SMTP") as mock_smtp:
-            mock_server = AsyncMock()
-            mock_smtp.return_value.__aenter__.return_value = mock_server
-
-            # Act
-            await auth.send_verification_email(
-                email=email,
-                title=title,
-                text=text,
-                url_for_token=url,
-                user_id=user_id
-            )
-
-            # Assert
-            mock_server.login.assert_awaited_once()
-            mock_server.send_message.assert_awaited_once()
-
-            sent_message = mock_server.send_message.call_args[0][0]
-            assert title in sent_message["Subject"]
-            assert email in sent_message["To"]
-            assert sent_message["From"] == EMAIL_DATA["platform_email"]
-
-            payload = sent_message.get_payload()
-            assert text in payload
-            assert correct_link in payload
\ No newline at end of file
+    password = "hello12345"
+
+    # Act
+    password_hash = await auth.get_password_hash_async(password)
+
+    # Assert
+    assert await auth.verify_password_async(password, password_hash) is True
+    assert await auth.verify_password_async("wrong", password_hash) is False
+
+
+@pytest.mark.asyncio
+async def test_hashing_pool_metrics():
+    """Проверка метрик пула хэширования."""
+
+    # Arrange
+    pool = auth.HashingPool(workers=2, max_queue=2)
+
+    # Act
+    results = await asyncio.gather(*(pool.run(pow, 2, n) for n in range(4)))
+
+    # Assert
+    assert results == [1, 2, 4, 8]
+    assert pool.metrics["submitted"] == 4
+    assert pool.metrics["completed"] == 4
+    assert pool.metrics["pending"] == 0
+    assert pool.metrics["max_pending"] == 4
+    assert pool.metrics["rejected"] == 0
+
+    pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_hashing_pool_overload():
+    """Проверка, что задачи сверх workers + max_queue отклоняются."""
+
+    # Arrange
+    pool = auth.HashingPool(workers=1, max_queue=1)
+    release = threading.Event()
+
+    # Act
+    tasks = [asyncio.create_task(pool.run(release.wait)) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    # Assert
+    with pytest.raises(auth.HashingOverloadError):
+        await pool.run(release.wait)
+    assert pool.metrics["rejected"] == 1
+
+    release.set()
+    await asyncio.gather(*tasks)
+    pool.shutdown()
+
+
+def test_decode_token_claims_cached():
+    """Проверка, что повторная расшифровка токена берется из кэша."""
+
+    # Arrange
+    auth.token_cache.clear()
+    token = auth.create_access_token("cache@test.com", 7)
+
+    # Act
+    first = auth.decode_token_claims(token)
+    with patch("app.users.auth.jwt.decode") as mock_decode:
+        second = auth.decode_token_claims(token)
+
+    # Assert
+    mock_decode.assert_not_called()
+    assert first == second
+    assert second["user_id"] == 7
+
+
+def test_verified_token_cache_expired():
+    """Проверка, что истекший токен удаляется из кэша."""
+
+    # Arrange
+    cache = auth.VerifiedTokenCache(max_size=2)
+    expired = datetime.now(timezone.utc).timestamp() - 1
+
+    # Act
+    cache.put("token", {"user_id": 1, "exp": expired})
+
+    # Assert
+    assert cache.get("token") is None
+    assert len(cache) == 0
+
+
+def test_verified_token_cache_lru():
+    """Проверка, что при переполнении удаляется давно не используемый токен."""
+
+    # Arrange
+    cache = auth.VerifiedTokenCache(max_size=2)
+    cache.put("a", {"user_id": 1})
+    cache.put("b", {"user_id": 2})
+
+    # Act
+    cache.get("a")
+    cache.put("c", {"user_id": 3})
+
+    # Assert
+    assert cache.get("a") == {"user_id": 1}
+    assert cache.get("b") is None
+    assert cache.get("c") == {"user_id": 3}
+
+
+def test_get_token_claims():
+    """Проверка зависимости, которая возвращает данные из токена."""
+
+    # Arrange
+    request = AsyncMock()
+    token = auth.create_access_token("claims@test.com", 5)
+    request.cookies = {"users_access_token": token}
+
+    # Act
+    claims = auth.get_token_claims(request)
+
+    # Assert
+    assert claims.user_id == 5
+    assert claims.email == "claims@test.com"
+    assert claims.exp is not None
+
+
+@pytest.mark.parametrize("cookies, message", [
+    ({}, "Пользователь не авторизован."),
+    ({"users_access_token": "bad_token"}, "Ошибка авторизации."),
+])
+def test_get_token_claims_not_authorized(cookies: dict, message: str):
+    """
+    Проверка ошибок зависимости без токена и с битым токеном.
+
+    Args:
+        cookies: cookie запроса.
+        message: ожидаемое сообщение.
+    """
+
+    # Arrange
+    request = AsyncMock()
+    request.cookies = cookies
+
+    # Act / Assert
+    with pytest.raises(auth.NotAuthorizedError) as error:
+        auth.get_token_claims(request)
+    assert error.value.message == message
+
+
+def test_get_token_claims_expired():
+    """Проверка зависимости с истекшим токеном."""
+
+    # Arrange
+    request = AsyncMock()
+    token = jwt.encode(
+        {"user_id": 1, "exp": datetime.now(timezone.utc) - timedelta(minutes=1)},
+        getenv("SECRET_KEY"),
+        getenv("ALGORITHM"),
+    )
+    request.cookies = {"users_access_token": token}
+
+    # Act / Assert
+    with pytest.raises(auth.NotAuthorizedError) as error:
+        auth.get_token_claims(request)
+    assert error.value.message == "Ошибка авторизации."
+
+
+def test_get_api_token_claims_unauthorized():
+    """Проверка, что API-зависимость возвращает 401."""
+
+    # Arrange
+    request = AsyncMock()
+    request.cookies = {}
+
+    # Act / Assert
+    with pytest.raises(auth.HTTPException) as error:
+        auth.get_api_token_claims(request)
+    assert error.value.status_code == 401
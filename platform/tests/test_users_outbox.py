@@ -0,0 +1,192 @@
+import pytest
+from aiosmtplib import SMTPRecipientsRefused
+from sqlalchemy import select, text
+
+from unittest.mock import AsyncMock, patch
+import asyncio
+
+import app.users.outbox as outbox
+from app.users.smtp_pool import SMTPPool
+from app.database import async_engine, async_session_maker, EMAIL_DATA
+from app.dao.dao_models import OutboxDAO, utc_now
+from app.migration.models import EmailOutbox
+
+
+@pytest.fixture(scope="function")
+async def clean_outbox():
+    """Фикстура, очищающая очередь писем до и после теста."""
+
+    async with async_engine.begin() as conn:
+        await conn.execute(text("TRUNCATE email_outbox RESTART IDENTITY;"))
+    yield
+    async with async_engine.begin() as conn:
+        await conn.execute(text("TRUNCATE email_outbox RESTART IDENTITY;"))
+
+
+async def get_emails() -> list[EmailOutbox]:
+    """Возвращает все письма очереди по порядку добавления."""
+
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(EmailOutbox).order_by(EmailOutbox.id)
+        )
+        return list(result.scalars().all())
+
+
+def mock_smtp(mock_class) -> AsyncMock:
+    """Настраивает подмену SMTP и возвращает объект соединения."""
+
+    server = AsyncMock()
+    server.is_connected = True
+    mock_class.return_value = server
+    return server
+
+
+def make_worker(**kwargs) -> outbox.EmailOutboxWorker:
+    """Создает обработчик очереди с отдельным пулом соединений."""
+
+    pool = SMTPPool("localhost", 25, use_tls=False, password="x")
+    return outbox.EmailOutboxWorker(pool=pool, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_enqueue_verification_email(clean_outbox):
+    """Проверка, что письмо верификации попадает в очередь."""
+
+    # Arrange
+    email = "hello@mail.ru"
+    fake_token = "abc123"
+    correct_link = f"http://localhost:8000/verify?token={fake_token}"
+
+    # Act
+    with patch("app.users.outbox.create_access_token", return_value=fake_token):
+        email_id = await outbox.enqueue_verification_email(
+            email=email,
+            title="test",
+            text="Hello",
+            url_for_token="/verify",
+            user_id=-1,
+        )
+
+    # Assert
+    emails = await get_emails()
+    assert [e.id for e in emails] == [email_id]
+    assert emails[0].recipient == email
+    assert emails[0].subject == "test"
+    assert emails[0].body == f"Hello {correct_link}"
+    assert emails[0].status == "pending"
+    assert emails[0].attempts == 0
+
+
+@pytest.mark.asyncio
+async def test_worker_sends_batch_over_one_connection(clean_outbox):
+    """Проверка, что пачка писем отправляется через одно соединение."""
+
+    # Arrange
+    worker = make_worker(batch_size=10)
+    for n in range(3):
+        await OutboxDAO.add_email(f"user{n}@mail.ru", "title", "text")
+
+    # Act
+    with patch("app.users.smtp_pool.SMTP") as mock_class:
+        server = mock_smtp(mock_class)
+        taken = await worker.run_once()
+
+    # Assert
+    assert taken == 3
+    mock_class.assert_called_once()
+    assert server.login.await_count == 1
+    assert server.send_message.await_count == 3
+
+    message = server.send_message.call_args_list[0][0][0]
+    assert message["To"] == "user0@mail.ru"
+    assert message["Subject"] == "title"
+    assert message["From"] == EMAIL_DATA["platform_email"]
+
+    emails = await get_emails()
+    assert all(e.status == "sent" and e.sent_at for e in emails)
+    assert await worker.run_once() == 0
+
+
+@pytest.mark.asyncio
+async def test_worker_retries_with_backoff(clean_outbox):
+    """Проверка, что при недоступном SMTP письмо откладывается."""
+
+    # Arrange
+    worker = make_worker(max_attempts=3, backoff=60)
+    await OutboxDAO.add_email("user@mail.ru", "title", "text")
+    started = utc_now()
+
+    # Act
+    with patch("app.users.smtp_pool.SMTP", side_effect=OSError("refused")):
+        await worker.run_once()
+
+    # Assert
+    email = (await get_emails())[0]
+    assert email.status == "pending"
+    assert email.attempts == 1
+    assert "refused" in email.last_error
+    assert (email.next_attempt_at - started).total_seconds() >= 59
+    assert await worker.run_once() == 0
+
+
+@pytest.mark.asyncio
+async def test_worker_marks_failed(clean_outbox):
+    """Проверка, что после последней попытки письмо отмечается failed."""
+
+    # Arrange
+    worker = make_worker(max_attempts=1)
+    await OutboxDAO.add_email("bad@mail.ru", "title", "text")
+    await OutboxDAO.add_email("good@mail.ru", "title", "text")
+    refused = SMTPRecipientsRefused([])
+
+    # Act
+    with patch("app.users.smtp_pool.SMTP") as mock_class:
+        server = mock_smtp(mock_class)
+        server.send_message.side_effect = [refused, None]
+        await worker.run_once()
+
+    # Assert
+    bad, good = await get_emails()
+    assert bad.status == "failed"
+    assert bad.last_error
+    assert good.status == "sent"
+
+
+def test_retry_delay():
+    """Проверка экспоненциальной задержки повтора."""
+
+    # Arrange
+    worker = outbox.EmailOutboxWorker(backoff=30)
+
+    # Act
+    delays = [worker.retry_delay(n) for n in range(1, 4)]
+
+    # Assert
+    assert delays == [30, 60, 120]
+
+
+@pytest.mark.asyncio
+async def test_worker_survives_unexpected_error():
+    """Проверка, что непредвиденная ошибка не останавливает обработчик."""
+
+    # Arrange
+    worker = make_worker(poll_interval=0.01)
+    calls = asyncio.Event()
+    errors = [ValueError("bad message")]
+
+    async def run_once() -> int:
+        if errors:
+            raise errors.pop()
+        calls.set()
+        return 0
+
+    # Act
+    with patch.object(worker, "run_once", side_effect=run_once):
+        worker.start()
+        await asyncio.wait_for(calls.wait(), timeout=5)
+        await worker.stop()
+
+    # Assert
+    assert errors == []
+    assert worker._task is None
@@ -2,12 +2,16 @@ from fastapi.testclient import TestClient
 from fastapi.responses import RedirectResponse
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from jose.exceptions import ExpiredSignatureError, JWTError
+from sqlalchemy import text
 import pytest 
 
 from unittest.mock import patch, AsyncMock
 
+from app.dao.dao_models import UsersDAO
+from app.database import async_engine
 from app.main import app
 import app.users.router as users_router
+from app.users.auth import TokenClaims
 
 
 client = TestClient(app)
@@ -103,23 +107,29 @@ async def test_register_user_success():
         "confirm_password": "123"}
     request = AsyncMock()
     request.form = AsyncMock(return_value=form_data)
-
-    mock_user = AsyncMock()
-    mock_user.id = 1 
+    session = AsyncMock()
 
     SUserReg_path = "app.users.router.SUserRegister"
     add_user_path = "app.users.router.UsersDAO.add_user"
-    get_pass_hash_path = "app.users.router.get_password_hash"
-    send_ver_email_path = "app.users.router.send_verification_email"
+    get_pass_hash_path = "app.users.router.get_password_hash_async"
+    send_ver_email_path = "app.users.router.enqueue_verification_email"
     redirect_message_path = "app.users.router.redirect_message"
     find_user_path = "app.users.router.UsersDAO.find_user"
 
     with patch(SUserReg_path) as mock_schema, \
-         patch(add_user_path, new_callable=AsyncMock) as mock_add_user, \
-         patch(get_pass_hash_path, return_value="hashed_pw"), \
+         patch(
+            get_pass_hash_path, 
+            new_callable=AsyncMock, 
+            return_value="hashed_pw"
+         ), \
          patch(send_ver_email_path, new_callable=AsyncMock) as mock_email, \
          patch(redirect_message_path) as mock_redirect, \
-         patch(find_user_path, new_callable=AsyncMock, return_value=mock_user):
+         patch(find_user_path, new_callable=AsyncMock) as mock_find_user, \
+         patch(
+            add_user_path, 
+            new_callable=AsyncMock, 
+            return_value=1
+         ) as mock_add_user:
 
         mock_schema.return_value = mock_schema 
         mock_schema.return_value.username = form_data["username"]
@@ -127,7 +137,7 @@ async def test_register_user_success():
         mock_schema.return_value.password = form_data["password"]
 
         # Act
-        await users_router.register_user(request)
+        await users_router.register_user(request, session=session)
 
         # Assert
         mock_redirect.assert_called_once_with(url="/auth/verify-email")
@@ -135,9 +145,12 @@ async def test_register_user_success():
         mock_add_user.assert_awaited_once_with(
             username=form_data["username"],
             email=form_data["email"],
-            password="hashed_pw"
+            password="hashed_pw",
+            session=session,
         )
+        mock_find_user.assert_not_awaited()
         mock_email.assert_awaited_once()
+        assert mock_email.call_args.kwargs["user_id"] == 1
 
 
 @pytest.mark.asyncio
@@ -268,7 +281,7 @@ async def test_auth_user_success():
 
     SUserAuth_path = "app.users.router.SUserAuth"
     find_user_path = "app.users.router.UsersDAO.find_user"
-    verify_pass_path = "app.users.router.verify_password"
+    verify_pass_path = "app.users.router.verify_password_async"
     create_token_path = "app.users.router.create_access_token"
     redirect_message_path = "app.users.router.redirect_message"
 
@@ -277,7 +290,11 @@ async def test_auth_user_success():
     mock_user.password = "hashed_pw"
 
     with patch(SUserAuth_path) as mock_schema, \
-         patch(verify_pass_path, return_value=True) as mock_verify, \
+         patch(
+            verify_pass_path, 
+            new_callable=AsyncMock, 
+            return_value=True
+         ) as mock_verify, \
          patch(create_token_path, return_value="token123") as mock_token, \
          patch(redirect_message_path) as mock_redirect, \
          patch(
@@ -298,7 +315,7 @@ async def test_auth_user_success():
 
         # Assert
         mock_find_user.assert_awaited_once_with(email=form_data["email"])
-        mock_verify.assert_called_once_with("123", "hashed_pw")
+        mock_verify.assert_awaited_once_with("123", "hashed_pw")
         mock_token.assert_called_once_with(
             email=form_data["email"],
             user_id=mock_user.id
@@ -314,6 +331,36 @@ async def test_auth_user_success():
         assert response == mock_response
 
 
+@pytest.mark.asyncio
+async def test_auth_user_releases_connection():
+    """Проверка, что пароль проверяется после возврата соединения в пул."""
+
+    # Arrange
+    await UsersDAO.add_user("login", "hashed_pw", "login@test.com")
+    request = AsyncMock()
+    request.form = AsyncMock(
+        return_value={"email": "login@test.com", "password": "password1"}
+    )
+    checked_out = []
+
+    async def verify(password: str, hashed: str) -> bool:
+        checked_out.append(async_engine.pool.checkedout())
+        return True
+
+    # Act
+    try:
+        with patch("app.users.router.verify_password_async", 
+                   side_effect=verify):
+            response = await users_router.auth_user(request)
+    finally:
+        async with async_engine.begin() as conn:
+            await conn.execute(text("TRUNCATE users RESTART IDENTITY CASCADE;"))
+
+    # Assert
+    assert checked_out == [0]
+    assert response.headers["location"].startswith("/main/")
+
+
 @pytest.mark.asyncio
 async def test_auth_user_validation_error():
     """Ошибка валидации формы."""
@@ -389,14 +436,18 @@ async def test_auth_user_wrong_password():
 
     SUserAuth_path = "app.users.router.SUserAuth"
     find_user_path = "app.users.router.UsersDAO.find_user"
-    verify_pass_path = "app.users.router.verify_password"
+    verify_pass_path = "app.users.router.verify_password_async"
     redirect_message_path = "app.users.router.redirect_message"
 
     mock_user = AsyncMock()
     mock_user.password = "hashed_pw"
 
     with patch(SUserAuth_path) as mock_schema, \
-         patch(verify_pass_path, return_value=False), \
+         patch(
+            verify_pass_path, 
+            new_callable=AsyncMock, 
+            return_value=False
+         ), \
          patch(redirect_message_path) as mock_redirect, \
          patch(find_user_path, new_callable=AsyncMock, return_value=mock_user):
 
@@ -415,6 +466,47 @@ async def test_auth_user_wrong_password():
         )
 
 
+@pytest.mark.asyncio
+async def test_auth_user_hashing_overload():
+    """Очередь на проверку паролей переполнена."""
+
+    # Arrange
+    form_data = {
+        "email": "test@test.com",
+        "password": "123"
+    }
+    request = AsyncMock()
+    request.form = AsyncMock(return_value=form_data)
+
+    SUserAuth_path = "app.users.router.SUserAuth"
+    find_user_path = "app.users.router.UsersDAO.find_user"
+    verify_pass_path = "app.users.router.verify_password_async"
+    redirect_message_path = "app.users.router.redirect_message"
+
+    with patch(SUserAuth_path) as mock_schema, \
+         patch(redirect_message_path) as mock_redirect, \
+         patch(find_user_path, new_callable=AsyncMock), \
+         patch(
+            verify_pass_path, 
+            new_callable=AsyncMock, 
+            side_effect=users_router.HashingOverloadError()
+         ):
+
+        mock_schema.return_value = mock_schema
+        mock_schema.return_value.email = form_data["email"]
+        mock_schema.return_value.password = form_data["password"]
+
+        # Act
+        await users_router.auth_user(request)
+
+        # Assert
+        mock_redirect.assert_called_once_with(
+            url="/auth/login/",
+            message="Сервер перегружен, попробуйте позже.",
+            error=True,
+        )
+
+
 @pytest.mark.asyncio
 async def test_logout_user_success():
     """Проверка выхода пользователя."""
@@ -441,28 +533,23 @@ async def test_logout_user_success():
 @pytest.mark.asyncio
 async def test_delete_user_success():
     """Успешное удаление пользователя."""
-    request = AsyncMock()
-    request.cookies = {"users_access_token": "valid_token"}
+    claims = TokenClaims(user_id=123, email="test@test.com")
+    session = AsyncMock()
 
-    with patch("app.users.router.decode_access_token") as mock_decode, \
-         patch("app.users.router.UsersDAO.delete_user",
+    with patch("app.users.router.UsersDAO.delete_user",
                 new_callable=AsyncMock) as mock_delete, \
          patch("app.users.router.shutil.rmtree") as mock_rmtree, \
          patch("app.users.router.redirect_message") as mock_redirect, \
          patch("pathlib.Path.exists", return_value=True):
 
-        mock_decode.side_effect = [123, "test@test.com"]
         mock_delete.return_value = True
         mock_response = AsyncMock()
         mock_redirect.return_value = mock_response
 
-        response = await users_router.delete_user(request)
+        response = await users_router.delete_user(claims, session=session)
 
-        assert mock_decode.call_count == 2
-        mock_decode.assert_any_call("valid_token")
-        mock_decode.assert_any_call(token="valid_token", for_email=True)
         mock_rmtree.assert_called_once()
-        mock_delete.assert_awaited_once_with("test@test.com")
+        mock_delete.assert_awaited_once_with("test@test.com", session=session)
         mock_redirect.assert_called_once_with(
             url="/auth/login/",
             message="Удаление прошло успешно!",
@@ -477,18 +564,15 @@ async def test_delete_user_success():
 @pytest.mark.asyncio
 async def test_delete_user_not_found():
     """Пользователь не найден при удалении."""
-    request = AsyncMock()
-    request.cookies.get.return_value = "valid_token"
+    claims = TokenClaims(user_id=123, email="test@test.com")
 
-    decode_token_path = "app.users.router.decode_access_token"
     delete_user_path = "app.users.router.UsersDAO.delete_user"
     redirect_message_path = "app.users.router.redirect_message"
 
-    with patch(decode_token_path, return_value="test@test.com"), \
-         patch(delete_user_path, new_callable=AsyncMock, return_value=False), \
+    with patch(delete_user_path, new_callable=AsyncMock, return_value=False), \
          patch(redirect_message_path) as mock_redirect:
 
-        await users_router.delete_user(request)
+        await users_router.delete_user(claims)
 
         mock_redirect.assert_called_once_with(
             url="/auth/login/",
@@ -497,66 +581,43 @@ async def test_delete_user_not_found():
         )
 
 
-@pytest.mark.asyncio
-async def test_delete_user_expired_token():
-    """Истёк срок действия токена."""
-    request = AsyncMock()
-    request.cookies.get.return_value = "expired_token"
-
-    decode_token_path = "app.users.router.decode_access_token"
-    redirect_message_path = "app.users.router.redirect_message"
-
-    with patch(decode_token_path, side_effect=ExpiredSignatureError()), \
-         patch(redirect_message_path) as mock_redirect:
-
-        await users_router.delete_user(request)
-
-        mock_redirect.assert_called_once_with(
-            url="/auth/login/",
-            message="Ошибка авторизации.",
-            error=True,
-        )
+def test_delete_user_not_authorized():
+    """Без cookie пользователь перенаправляется на страницу входа."""
 
+    client.cookies.clear()
+    response = client.post("/auth/del/", follow_redirects=False)
 
-@pytest.mark.asyncio
-async def test_delete_user_invalid_token():
-    """Пользователь не авторизован (битый токен)."""
-    request = AsyncMock()
-    request.cookies.get.return_value = "bad_token"
+    assert response.status_code == 303
+    assert response.headers["location"].startswith("/auth/login/")
+    assert "error=" in response.headers["location"]
 
-    decode_token_path = "app.users.router.decode_access_token"
-    redirect_message_path = "app.users.router.redirect_message"
 
-    with patch(decode_token_path, side_effect=JWTError()), \
-         patch(redirect_message_path) as mock_redirect:
+def test_delete_user_invalid_token():
+    """С битым токеном пользователь перенаправляется на страницу входа."""
 
-        await users_router.delete_user(request)
+    client.cookies.set("users_access_token", "bad_token")
+    response = client.post("/auth/del/", follow_redirects=False)
+    client.cookies.clear()
 
-        mock_redirect.assert_called_once_with(
-            url="/auth/login/",
-            message="Ошибка авторизации.",
-            error=True,
-        )
+    assert response.status_code == 303
+    assert response.headers["location"].startswith("/auth/login/")
 
 
 @pytest.mark.asyncio
 async def test_delete_user_db_error():
     """Ошибка базы данных при удалении."""
-    request = AsyncMock()
-    request.cookies.get.return_value = "valid_token"
+    claims = TokenClaims(user_id=123, email="test@test.com")
 
-    decode_token_path = "app.users.router.decode_access_token"
     delete_user_path = "app.users.router.UsersDAO.delete_user"
     redirect_message_path = "app.users.router.redirect_message"
 
-    with patch(decode_token_path, return_value="test@test.com"), \
-         patch(redirect_message_path) as mock_redirect, \
+    with patch(redirect_message_path) as mock_redirect, \
          patch(
              delete_user_path, 
              new_callable=AsyncMock, 
              side_effect=SQLAlchemyError()):
 
-        await users_router.delete_user(request)
+        await users_router.delete_user(claims)
 
         mock_redirect.assert_called_once_with(
             url="/main/",
@@ -573,6 +634,7 @@ async def test_verify_email_success():
     form_data = {"token": "valid_token"}
     request = AsyncMock()
     request.form = AsyncMock(return_value=form_data)
+    session = AsyncMock()
 
     decode_token_path = "app.users.router.decode_access_token"
     find_user_path = "app.users.router.UsersDAO.find_user"
@@ -601,11 +663,14 @@ async def test_verify_email_success():
         mock_redirect.return_value = mock_response
 
         # Act
-        response = await users_router.verify_email(request)
+        response = await users_router.verify_email(request, session=session)
 
         # Assert
         mock_decode.assert_called_once_with("valid_token", for_email=True)
-        mock_find.assert_awaited_once_with(email="test@test.com")
+        mock_find.assert_awaited_once_with(
+            email="test@test.com",
+            session=session,
+        )
         mock_create_token.assert_called_once_with(
             email="test@test.com",
             user_id=mock_user.id
@@ -711,10 +776,11 @@ async def test_forgot_password_success():
     form_data = {"email": "test@test.com"}
     request = AsyncMock()
     request.form = AsyncMock(return_value=form_data)
+    session = AsyncMock()
 
     SUserForgot_path = "app.users.router.SUserForgotPassword"
     find_user_path = "app.users.router.UsersDAO.find_user"
-    send_email_path = "app.users.router.send_verification_email"
+    send_email_path = "app.users.router.enqueue_verification_email"
     redirect_message_path = "app.users.router.redirect_message"
 
     mock_user = AsyncMock()
@@ -736,17 +802,24 @@ async def test_forgot_password_success():
         mock_redirect.return_value = mock_response
 
         # Act
-        response = await users_router.forgot_password_user(request)
+        response = await users_router.forgot_password_user(
+            request, 
+            session=session,
+        )
 
         # Assert
         mock_schema.assert_called_once()
-        mock_find.assert_awaited_once_with(email=form_data["email"])
+        mock_find.assert_awaited_once_with(
+            email=form_data["email"],
+            session=session,
+        )
         mock_email.assert_awaited_once_with(
             email=form_data["email"],
             title="Смена пароля.",
             text="Перейдите по ссылке, чтобы сменить пароль:",
             url_for_token="/auth/forgot_password/",
             user_id=mock_user.id,
+            session=session,
         )
         mock_redirect.assert_called_once_with(
             url="/auth/forgot_password/",
@@ -820,32 +893,34 @@ async def test_update_password_success():
     }
     request = AsyncMock()
     request.form = AsyncMock(return_value=form_data)
+    session = AsyncMock()
 
     SUserUpdate_path = "app.users.router.SUserUpdatePassword"
     decode_token_path = "app.users.router.decode_access_token"
-    get_hash_path = "app.users.router.get_password_hash"
+    get_hash_path = "app.users.router.get_password_hash_async"
     update_password_path = "app.users.router.UsersDAO.update_user_password"
     redirect_message_path = "app.users.router.redirect_message"
     create_token_path = "app.users.router.create_access_token"
     find_user_path = "app.users.router.UsersDAO.find_user" 
 
-    mock_user = AsyncMock()
-    mock_user.id = 0
-
     with patch(SUserUpdate_path) as mock_schema, \
          patch(
             decode_token_path, 
             return_value="test@test.com"
          ) as mock_decode, \
-         patch(get_hash_path, return_value="hashed_pw") as mock_hash, \
-         patch(update_password_path, new_callable=AsyncMock) as mock_update, \
+         patch(
+            get_hash_path, 
+            new_callable=AsyncMock, 
+            return_value="hashed_pw"
+         ) as mock_hash, \
          patch(redirect_message_path) as mock_redirect, \
+         patch(find_user_path, new_callable=AsyncMock) as mock_find, \
+         patch(create_token_path, return_value="token123") as mock_create, \
          patch(
-            find_user_path,
+            update_password_path, 
             new_callable=AsyncMock,
-            return_value=mock_user
-         ) as mock_find, \
-         patch(create_token_path, return_value="token123") as mock_create:
+            return_value=0
+         ) as mock_update:
 
         mock_schema.return_value = mock_schema
         mock_schema.return_value.token = form_data["token"]
@@ -855,18 +930,22 @@ async def test_update_password_success():
         mock_redirect.return_value = mock_response
 
         # Act
-        response = await users_router.update_password_user(request)
+        response = await users_router.update_password_user(
+            request,
+            session=session,
+        )
 
         # Assert
         mock_schema.assert_called_once()
         mock_decode.assert_called_once_with(token="valid_token", for_email=True)
-        mock_hash.assert_called_once_with(password="newpass")
+        mock_hash.assert_awaited_once_with(password="newpass")
         mock_update.assert_awaited_once_with(
             email="test@test.com", 
-            password="hashed_pw"
+            password="hashed_pw",
+            session=session,
         )
 
-        mock_find.assert_awaited_once_with(email="test@test.com")
+        mock_find.assert_not_awaited()
 
         mock_create.assert_called_once_with(
             email="test@test.com",
@@ -885,6 +964,54 @@ async def test_update_password_success():
         assert response == mock_response
 
 
+@pytest.mark.asyncio
+async def test_update_password_user_not_found():
+    """Пользователь из токена не найден при обновлении пароля."""
+
+    # Arrange
+    form_data = {
+        "token": "valid_token", 
+        "password": "newpass", 
+        "confirm_password": "newpass"
+    }
+    request = AsyncMock()
+    request.form = AsyncMock(return_value=form_data)
+
+    SUserUpdate_path = "app.users.router.SUserUpdatePassword"
+    decode_token_path = "app.users.router.decode_access_token"
+    get_hash_path = "app.users.router.get_password_hash_async"
+    update_password_path = "app.users.router.UsersDAO.update_user_password"
+    redirect_message_path = "app.users.router.redirect_message"
+
+    with patch(SUserUpdate_path) as mock_schema, \
+         patch(decode_token_path, return_value="test@test.com"), \
+         patch(
+            get_hash_path, 
+            new_callable=AsyncMock, 
+            return_value="hashed_pw"
+         ), \
+         patch(redirect_message_path) as mock_redirect, \
+         patch(
+            update_password_path, 
+            new_callable=AsyncMock,
+            return_value=None
+         ):
+
+        mock_schema.return_value = mock_schema
+        mock_schema.return_value.token = form_data["token"]
+        mock_schema.return_value.password = form_data["password"]
+
+        # Act
+        await users_router.update_password_user(request)
+
+        # Assert
+        mock_redirect.assert_called_once_with(
+            url="/auth/login/",
+            message="Пользователь не зарегистрирован.",
+            error=True,
+        )
+
+
 @pytest.mark.asyncio
 async def test_update_password_validation_error():
     """Пароли не совпадают (ValidationError)."""
@@ -985,13 +1112,17 @@ async def test_update_password_db_error():
 
     SUserUpdate_path = "app.users.router.SUserUpdatePassword"
     decode_token_path = "app.users.router.decode_access_token"
-    get_hash_path = "app.users.router.get_password_hash"
+    get_hash_path = "app.users.router.get_password_hash_async"
     update_password_path = "app.users.router.UsersDAO.update_user_password"
     redirect_message_path = "app.users.router.redirect_message"
 
     with patch(SUserUpdate_path) as mock_schema, \
          patch(decode_token_path, return_value="test@test.com"), \
-         patch(get_hash_path, return_value="hashed_pw"), \
+         patch(
+            get_hash_path, 
+            new_callable=AsyncMock, 
+            return_value="hashed_pw"
+         ), \
          patch(
             update_password_path, 
             new_callable=AsyncMock, 
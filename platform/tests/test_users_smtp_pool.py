@@ -0,0 +1,132 @@
+import pytest
+from aiosmtplib import SMTPServerDisconnected
+
+from unittest.mock import AsyncMock, patch
+import asyncio
+
+from app.users.smtp_pool import SMTPPool
+
+
+def make_client() -> AsyncMock:
+    """Создает подмену SMTP-соединения."""
+
+    client = AsyncMock()
+    client.is_connected = True
+    return client
+
+
+def make_pool(**kwargs) -> SMTPPool:
+    """Создает пул для локального сервера."""
+
+    return SMTPPool(
+        "localhost", 25, use_tls=False, username="u", password="x", **kwargs
+    )
+
+
+@pytest.mark.asyncio
+async def test_smtp_pool_reuses_connection():
+    """Проверка, что соединение открывается один раз и переиспользуется."""
+
+    # Arrange
+    pool = make_pool()
+    client = make_client()
+
+    # Act
+    with patch("app.users.smtp_pool.SMTP", return_value=client) as mock_class:
+        for _ in range(3):
+            async with pool.connection() as server:
+                await server.send_message("message")
+
+    # Assert
+    mock_class.assert_called_once()
+    client.connect.assert_awaited_once()
+    client.login.assert_awaited_once_with("u", "x")
+    assert client.send_message.await_count == 3
+    assert pool.metrics == {"connects": 1, "reuses": 2, "discarded": 0}
+
+
+@pytest.mark.asyncio
+async def test_smtp_pool_noop_after_idle():
+    """Проверка, что простоявшее соединение проверяется NOOP."""
+
+    # Arrange
+    pool = make_pool(check_after=0)
+    client = make_client()
+
+    # Act
+    with patch("app.users.smtp_pool.SMTP", return_value=client):
+        async with pool.connection():
+            pass
+        async with pool.connection():
+            pass
+
+    # Assert
+    client.noop.assert_awaited_once()
+    assert pool.metrics["reuses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_smtp_pool_reconnects_broken_connection():
+    """Проверка, что соединение, не прошедшее NOOP, заменяется новым."""
+
+    # Arrange
+    pool = make_pool(check_after=0)
+    broken, fresh = make_client(), make_client()
+    broken.noop.side_effect = SMTPServerDisconnected("closed")
+
+    # Act
+    with patch("app.users.smtp_pool.SMTP", side_effect=[broken, fresh]):
+        async with pool.connection():
+            pass
+        async with pool.connection() as server:
+            pass
+
+    # Assert
+    assert server is fresh
+    assert pool.metrics == {"connects": 2, "reuses": 0, "discarded": 1}
+
+
+@pytest.mark.asyncio
+async def test_smtp_pool_discards_on_error():
+    """Проверка, что при ошибке соединение не возвращается в пул."""
+
+    # Arrange
+    pool = make_pool()
+    client = make_client()
+
+    # Act
+    with patch("app.users.smtp_pool.SMTP", return_value=client):
+        with pytest.raises(SMTPServerDisconnected):
+            async with pool.connection():
+                raise SMTPServerDisconnected("closed")
+
+    # Assert
+    client.quit.assert_awaited_once()
+    assert pool.metrics["discarded"] == 1
+    assert len(pool._idle) == 0
+
+
+@pytest.mark.asyncio
+async def test_smtp_pool_size_limit():
+    """Проверка, что одновременно открыто не больше size соединений."""
+
+    # Arrange
+    pool = make_pool(size=2)
+    active, peak = 0, 0
+
+    async def send() -> None:
+        nonlocal active, peak
+        async with pool.connection():
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    # Act
+    with patch("app.users.smtp_pool.SMTP", side_effect=lambda **_: make_client()):
+        await asyncio.gather(*(send() for _ in range(6)))
+        await pool.close()
+
+    # Assert
+    assert peak == 2
+    assert pool.metrics["connects"] == 2